@@ -0,0 +1,201 @@
+import time
+import logging
+import importlib.util
+from pathlib import Path
+from typing import Callable, Optional
+from tokenizer import quote_identifier
+from db import run_statement, run_update
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS migration_backfills ("
+    "timestamp BIGINT UNSIGNED NOT NULL COMMENT 'Migration timestamp', "
+    "name VARCHAR(100) NOT NULL COMMENT 'Backfill name, unique within the migration', "
+    "watermark BIGINT NOT NULL COMMENT 'Highest key processed so far', "
+    "rows_affected BIGINT UNSIGNED NOT NULL DEFAULT 0, "
+    "completed_at TIMESTAMP NULL COMMENT 'NULL while the backfill is in progress', "
+    "created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+    "updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, "
+    "PRIMARY KEY (timestamp, name)"
+    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci "
+    "COMMENT='Watermarks of chunked data migrations'"
+)
+
+def format_duration(seconds: float) -> str:
+    """Format a duration as e.g. 1h02m, 3m10s or 12s."""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+class Backfill:
+    """
+    Chunked, throttled and resumable data change over a table with an integer primary key.
+
+    The key range is walked with keyset pagination: each chunk covers the next `chunk_size`
+    keys after the watermark, as the half-open range (start, end]. For every chunk either
+    `sql` is executed with the `%(start)s` and `%(end)s` parameters, or `apply(cursor, start, end)`
+    is called. The chunk and the new watermark are committed together, so an interrupted
+    backfill resumes where it stopped. With `target_latency` set, the chunk size adapts so a
+    chunk takes about that many seconds; `sleep` pauses between chunks.
+    """
+
+    def __init__(self, connection, timestamp: str, name: str, table: str,
+                 sql: Optional[str] = None, apply: Optional[Callable] = None, key: str = 'id',
+                 where: Optional[str] = None, chunk_size: int = 1000, min_chunk_size: int = 100,
+                 max_chunk_size: int = 50000, sleep: float = 0.0, target_latency: Optional[float] = None,
+                 progress_interval: float = 10.0):
+        if (sql is None) == (apply is None):
+            raise ValueError(f"Backfill {name} needs exactly one of sql or apply")
+        self.connection = connection
+        self.timestamp = int(timestamp)
+        self.name = name
+        self.table = table
+        self.sql = sql
+        self.apply = apply
+        self.key = key
+        self.where = where
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.sleep = sleep
+        self.target_latency = target_latency
+        self.progress_interval = progress_interval
+
+    def load_watermark(self) -> Optional[tuple]:
+        """Return (watermark, rows_affected, completed) of a previous run, if any."""
+        cursor = self.connection.cursor()
+        cursor.execute(CREATE_TABLE_SQL)
+        cursor.execute(
+            "SELECT watermark, rows_affected, completed_at IS NOT NULL FROM migration_backfills "
+            "WHERE timestamp = %s AND name = %s",
+            (self.timestamp, self.name)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        return row
+
+    def save_watermark(self, cursor, watermark: int, rows: int, completed: bool = False) -> None:
+        """Store progress; called in the same transaction as the chunk it follows."""
+        cursor.execute(
+            "INSERT INTO migration_backfills (timestamp, name, watermark, rows_affected, completed_at) "
+            "VALUES (%s, %s, %s, %s, IF(%s, CURRENT_TIMESTAMP, NULL)) "
+            "ON DUPLICATE KEY UPDATE watermark = VALUES(watermark), rows_affected = VALUES(rows_affected), "
+            "completed_at = VALUES(completed_at)",
+            (self.timestamp, self.name, watermark, rows, completed)
+        )
+
+    def run(self) -> int:
+        """Run (or resume) the backfill and return the total number of affected rows."""
+        table, key = quote_identifier(self.table), quote_identifier(self.key)
+        where = f" AND ({self.where})" if self.where else ""
+        previous = self.load_watermark()
+        if previous and previous[2]:
+            logger.info(f"Backfill {self.name} already completed ({previous[1]} rows); skipping")
+            return int(previous[1])
+        bounds = run_statement(self.connection, f"SELECT MIN({key}), MAX({key}) FROM {table}")[0]
+        if bounds[0] is None:
+            logger.info(f"Backfill {self.name}: {self.table} is empty")
+            cursor = self.connection.cursor()
+            self.save_watermark(cursor, 0, 0, completed=True)
+            cursor.close()
+            self.connection.commit()
+            return 0
+        low, high = int(bounds[0]), int(bounds[1])
+        start = int(previous[0]) if previous else low - 1
+        rows = int(previous[1]) if previous else 0
+        if previous:
+            logger.info(f"Resuming backfill {self.name} from {self.key} > {start} ({rows} rows so far)")
+        origin, began, last_report = start, time.monotonic(), time.monotonic()
+        chunk_size = self.chunk_size
+        while True:
+            boundary = run_statement(
+                self.connection,
+                f"SELECT MAX({key}) FROM (SELECT {key} FROM {table} WHERE {key} > %s{where} "
+                f"ORDER BY {key} LIMIT {int(chunk_size)}) chunk",
+                (start,)
+            )[0]
+            end = boundary[0]
+            if end is None:
+                break
+            end = int(end)
+            chunk_started = time.monotonic()
+            cursor = self.connection.cursor()
+            try:
+                if self.sql is not None:
+                    cursor.execute(self.sql, {'start': start, 'end': end})
+                    affected = max(cursor.rowcount, 0)
+                else:
+                    affected = self.apply(cursor, start, end) or 0
+                rows += affected
+                self.save_watermark(cursor, end, rows)
+            finally:
+                cursor.close()
+            self.connection.commit()
+            start = end
+            elapsed = time.monotonic() - chunk_started
+            if self.target_latency and elapsed > 0:
+                # Move towards the target chunk latency, at most doubling per step
+                scaled = chunk_size * min(2.0, self.target_latency / elapsed)
+                chunk_size = int(max(self.min_chunk_size, min(self.max_chunk_size, scaled)))
+            now = time.monotonic()
+            if now - last_report >= self.progress_interval:
+                done = (start - origin) / max(1, high - origin)
+                rate = rows / max(now - began, 1e-6)
+                eta = (now - began) * (1 - done) / done if done > 0 else 0
+                logger.info(f"Backfill {self.name}: {100 * min(done, 1.0):.1f}% ({self.key} {start}/{high}), "
+                            f"{rows} rows, {rate:.0f} rows/s, chunk {chunk_size}, ETA {format_duration(eta)}")
+                last_report = now
+            if start >= high:
+                break
+            if self.sleep:
+                time.sleep(self.sleep)
+        cursor = self.connection.cursor()
+        self.save_watermark(cursor, start, rows, completed=True)
+        cursor.close()
+        self.connection.commit()
+        logger.info(f"Backfill {self.name} completed: {rows} rows in {format_duration(time.monotonic() - began)}")
+        return rows
+
+class MigrationContext:
+    """
+    Object passed to `run(ctx)` of a migration's up.py/down.py.
+    Exposes the migration's connection, plain statement execution and chunked backfills.
+    """
+
+    def __init__(self, connection, database: str, timestamp: str, name: str, direction: str):
+        self.connection = connection
+        self.database = database
+        self.timestamp = timestamp
+        self.name = name
+        self.direction = direction
+        self.logger = logging.getLogger(f"migration.{timestamp}_{name}")
+
+    def execute(self, sql: str, params: Optional[tuple] = None) -> int:
+        """Execute one statement and return the number of affected rows."""
+        return run_update(self.connection, sql, params)
+
+    def query(self, sql: str, params: Optional[tuple] = None) -> list:
+        """Run a query and return all rows as dictionaries."""
+        return run_statement(self.connection, sql, params, dictionary=True)
+
+    def backfill(self, name: str, table: str, **options) -> int:
+        """Run a resumable chunked backfill; see Backfill for the options."""
+        return Backfill(self.connection, self.timestamp, name, table, **options).run()
+
+    def reset_backfill(self, name: str) -> None:
+        """Forget a backfill's watermark so it runs again (e.g. from down.py)."""
+        self.execute("DELETE FROM migration_backfills WHERE timestamp = %s AND name = %s", (int(self.timestamp), name))
+
+def run_python_migration(path: Path, context: MigrationContext) -> None:
+    """Load a migration's up.py/down.py and call its run(ctx) function."""
+    spec = importlib.util.spec_from_file_location(f"migration_{context.timestamp}_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not callable(getattr(module, 'run', None)):
+        raise ValueError(f"Python migration {path} does not define run(ctx)")
+    module.run(context)
+    context.connection.commit()
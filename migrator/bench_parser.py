@@ -0,0 +1,78 @@
+import io
+import sys
+import time
+import random
+import logging
+import argparse
+from typing import Dict, List, Tuple
+from tokenizer import iter_sql_statements
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+WORDS = ['spam', 'ads', 'toxicity', "it's", 'semi;colon', 'back\\\\slash', 'quote\\"d', '`tick`', '-- not a comment', '/* nor this */']
+
+def generate_script(target_bytes: int, seed: int = 42) -> Tuple[str, int]:
+    """Generate a synthetic seed/backfill migration of roughly target_bytes, returning it with its statement count."""
+    rng = random.Random(seed)
+    parts: List[str] = [
+        "-- Migration: synthetic-benchmark\n",
+        "/*!40101 SET NAMES utf8mb4 */;\n",
+        "CREATE TABLE IF NOT EXISTS `bench;posts` (\n"
+        "    id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY, -- surrogate key\n"
+        "    message TEXT NOT NULL COMMENT 'Message; with ''quotes'''\n"
+        ") ENGINE=InnoDB;\n",
+        "DELIMITER $$\n"
+        "CREATE TRIGGER bench_bi BEFORE INSERT ON `bench;posts` FOR EACH ROW BEGIN\n"
+        "    SET NEW.message = TRIM(NEW.message);\n"
+        "END$$\n"
+        "DELIMITER ;\n",
+    ]
+    statements = 3
+    size = sum(len(p) for p in parts)
+    while size < target_bytes:
+        rows = []
+        for _ in range(rng.randint(1, 50)):
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))).replace("'", "''")
+            rows.append(f"('{text}')")
+        chunk = f"/* batch {statements} */ INSERT INTO `bench;posts` (message) VALUES\n    " + ",\n    ".join(rows) + "; # seeded\n"
+        parts.append(chunk)
+        size += len(chunk)
+        statements += 1
+    return ''.join(parts), statements
+
+def bench(size_mb: float, repeat: int) -> Dict:
+    """Parse a synthetic script of size_mb megabytes and return throughput figures."""
+    script, expected = generate_script(int(size_mb * 1024 * 1024))
+    best = None
+    for _ in range(repeat):
+        # Feed line by line, as apply_migration does with an open file
+        source = io.StringIO(script)
+        start = time.perf_counter()
+        count = sum(1 for _ in iter_sql_statements(source))
+        elapsed = time.perf_counter() - start
+        if count != expected:
+            raise AssertionError(f"Parsed {count} statements, expected {expected}")
+        best = elapsed if best is None else min(best, elapsed)
+    mb = len(script) / (1024 * 1024)
+    return {'size_mb': round(mb, 2), 'statements': expected, 'seconds': round(best, 3), 'mb_per_s': round(mb / best, 2)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="X-Moderator migrator SQL parser benchmark")
+    parser.add_argument('--sizes', type=str, default='4,16', help="Comma-separated script sizes in MB (default: 4,16)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per size; the best time is reported (default: 3)")
+    parser.add_argument('--min-mbps', type=float, default=0.0, help="Fail if throughput drops below this many MB/s")
+    args = parser.parse_args()
+
+    failed = False
+    for size in [float(s) for s in args.sizes.split(',') if s.strip()]:
+        result = bench(size, args.repeat)
+        logger.info(f"{result['size_mb']} MB, {result['statements']} statements: {result['seconds']}s ({result['mb_per_s']} MB/s)")
+        if result['mb_per_s'] < args.min_mbps:
+            logger.error(f"Parser throughput {result['mb_per_s']} MB/s is below the {args.min_mbps} MB/s threshold")
+            failed = True
+    sys.exit(1 if failed else 0)
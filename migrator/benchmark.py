@@ -0,0 +1,277 @@
+import json
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from mysql.connector import Error
+from tabulate import tabulate
+from db import run_statement
+
+logger = logging.getLogger(__name__)
+
+class BenchQuery(NamedTuple):
+    name: str
+    sql: str  # %s placeholders filled from rows of params_sql
+    params_sql: str  # picks realistic parameter values from the data
+    description: str
+
+# Hot queries of the backend, with the indexes they are expected to use
+HOT_QUERIES = [
+    BenchQuery(
+        'flagged_posts',
+        "SELECT id, x_post_id, user_id, created_at FROM posts "
+        "WHERE community_id = %s AND review_status = 1 ORDER BY created_at DESC LIMIT 50",
+        "SELECT community_id FROM posts GROUP BY community_id ORDER BY COUNT(*) DESC LIMIT 10",
+        "Review queue: flagged posts of a community, newest first",
+    ),
+    BenchQuery(
+        'scores_above_threshold',
+        "SELECT s.post_id, s.score FROM post_moderation_scores s "
+        "JOIN moderation_categories c ON c.id = s.category_id "
+        "WHERE s.category_id = %s AND s.is_active = 1 AND s.score >= c.soft_threshold ORDER BY s.score DESC LIMIT 100",
+        "SELECT id FROM moderation_categories WHERE is_active = 1 ORDER BY id LIMIT 10",
+        "Posts whose score in a category crosses its soft threshold",
+    ),
+    BenchQuery(
+        'post_scores',
+        "SELECT s.category_id, s.score, s.confidence, m.model_version FROM post_moderation_scores s "
+        "JOIN moderation_models m ON m.id = s.model_id WHERE s.post_id = %s AND s.is_active = 1",
+        "SELECT post_id FROM post_moderation_scores ORDER BY post_id DESC LIMIT 20",
+        "Scores shown on a post's detail page",
+    ),
+    BenchQuery(
+        'active_bans',
+        "SELECT id, reason, expiry_at FROM user_bans "
+        "WHERE user_id = %s AND community_id = %s AND (expiry_at IS NULL OR expiry_at > NOW())",
+        "SELECT user_id, community_id FROM user_bans ORDER BY id DESC LIMIT 20",
+        "Ban check of a user in a community",
+    ),
+    BenchQuery(
+        'pending_appeals',
+        "SELECT id, user_id, appeal_reason, created_at FROM appeals "
+        "WHERE community_id = %s AND status = 0 ORDER BY created_at LIMIT 50",
+        "SELECT id FROM communities ORDER BY id LIMIT 10",
+        "Appeals waiting for review in a community",
+    ),
+    BenchQuery(
+        'posts_by_content_type',
+        "SELECT COUNT(*) FROM posts WHERE content_type = %s AND community_id = %s",
+        "SELECT content_type, community_id FROM posts GROUP BY content_type, community_id ORDER BY COUNT(*) DESC LIMIT 10",
+        "Media breakdown of a community (idx_posts_content_type_community_id)",
+    ),
+    BenchQuery(
+        'most_negative_scores',
+        "SELECT post_id, category_id, reputation_delta FROM post_moderation_scores "
+        "WHERE reputation_delta < %s ORDER BY reputation_delta LIMIT 100",
+        "SELECT -0.5 UNION ALL SELECT -0.9",
+        "Largest reputation penalties (idx_post_moderation_scores_reputation_delta)",
+    ),
+    BenchQuery(
+        'categories_by_color',
+        "SELECT id, community_id, name FROM moderation_categories WHERE color = %s",
+        "SELECT DISTINCT color FROM moderation_categories LIMIT 10",
+        "Legend lookup by color (idx_moderation_categories_color)",
+    ),
+    BenchQuery(
+        'community_moderation_log',
+        "SELECT id, user_id, target_post_id, action_type, created_at FROM moderation_logs "
+        "WHERE community_id = %s ORDER BY created_at DESC LIMIT 50",
+        "SELECT id FROM communities ORDER BY id LIMIT 10",
+        "Latest moderation actions of a community",
+    ),
+    BenchQuery(
+        'user_posts',
+        "SELECT id, community_id, content_type, moderation_status, created_at FROM posts "
+        "WHERE user_id = %s ORDER BY created_at DESC LIMIT 20",
+        "SELECT user_id FROM posts GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 10",
+        "A user's recent posts",
+    ),
+]
+
+# Cost of an access type, cheapest first; a higher rank after a migration is a plan regression
+ACCESS_RANK = {
+    'system': 0, 'const': 0, 'eq_ref': 1, 'ref': 2, 'fulltext': 2, 'ref_or_null': 3, 'unique_subquery': 3,
+    'index_subquery': 3, 'range': 4, 'index_merge': 4, 'index': 6, 'ALL': 7,
+}
+PLAN_FLAGS = ('filesort', 'temporary_table')
+
+class PlanStep(NamedTuple):
+    table: str
+    access_type: str
+    key: Optional[str]
+    rows: Optional[int]  # optimizer estimate
+
+    def __str__(self) -> str:
+        return f"{self.table}:{self.access_type}" + (f"({self.key})" if self.key else "")
+
+def walk_plan(node) -> Iterator[Tuple[str, object]]:
+    """Yield every (key, value) pair of an EXPLAIN/ANALYZE FORMAT=JSON document."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield key, value
+            yield from walk_plan(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from walk_plan(item)
+
+def plan_steps(plan: Dict) -> List[PlanStep]:
+    """Table accesses of a plan in document order."""
+    return [
+        PlanStep(value['table_name'], value.get('access_type', '?'), value.get('key'), value.get('rows'))
+        for key, value in walk_plan(plan) if key == 'table' and isinstance(value, dict) and 'table_name' in value
+    ]
+
+def plan_flags(plan: Dict) -> List[str]:
+    """Sorts and temporary tables the plan needs."""
+    return sorted({key for key, _ in walk_plan(plan) if key in PLAN_FLAGS})
+
+def rows_examined(analyzed: Dict) -> int:
+    """Rows actually read, from ANALYZE FORMAT=JSON (r_loops x r_rows per table)."""
+    total = 0.0
+    for key, value in walk_plan(analyzed):
+        if key == 'table' and isinstance(value, dict) and 'r_rows' in value:
+            total += float(value.get('r_loops') or 1) * float(value.get('r_rows') or 0)
+    return int(total)
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+class QueryResult(NamedTuple):
+    name: str
+    error: Optional[str] = None
+    samples: int = 0
+    p50: float = 0.0  # milliseconds
+    p95: float = 0.0
+    p99: float = 0.0
+    max: float = 0.0
+    rows_examined: Optional[int] = None
+    plan: List[PlanStep] = []
+    flags: List[str] = []
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable form."""
+        return dict(self._asdict(), plan=[s._asdict() for s in self.plan])
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'QueryResult':
+        """Inverse of to_dict."""
+        return cls(**dict(data, plan=[PlanStep(**s) for s in data.get('plan', [])]))
+
+class Benchmark:
+    """Runs the hot-query catalog against one database and captures plans and latencies."""
+
+    def __init__(self, connection, iterations: int = 50, warmup: int = 3):
+        self.connection = connection
+        self.iterations = max(1, iterations)
+        self.warmup = max(0, warmup)
+
+    def prepare(self) -> None:
+        """Keep the query cache from answering repeated runs."""
+        try:
+            run_statement(self.connection, "SET SESSION query_cache_type = OFF")
+        except Error as e:
+            logger.debug(f"Could not disable the query cache: {e}")
+
+    def document(self, prefix: str, sql: str, params: tuple) -> Optional[Dict]:
+        """Run EXPLAIN or ANALYZE with FORMAT=JSON and parse the result."""
+        rows = run_statement(self.connection, f"{prefix} FORMAT=JSON {sql}", params)
+        return json.loads(rows[0][0]) if rows and rows[0][0] else None
+
+    def measure(self, query: BenchQuery) -> QueryResult:
+        """Time a query over its parameter sets and capture its plan for the first one."""
+        try:
+            params = [tuple(row) for row in run_statement(self.connection, query.params_sql)]
+            if not params:
+                return QueryResult(query.name, error="no parameter values (is the database seeded?)")
+            plan = self.document('EXPLAIN', query.sql, params[0]) or {}
+            try:
+                analyzed = self.document('ANALYZE', query.sql, params[0])
+                examined = rows_examined(analyzed) if analyzed else None
+            except Error as e:
+                logger.debug(f"ANALYZE FORMAT=JSON failed for {query.name}: {e}")
+                examined = None
+            for i in range(self.warmup):
+                run_statement(self.connection, query.sql, params[i % len(params)])
+            timings = []
+            for i in range(self.iterations):
+                started = time.perf_counter()
+                run_statement(self.connection, query.sql, params[i % len(params)])
+                timings.append((time.perf_counter() - started) * 1000)
+        except Error as e:
+            return QueryResult(query.name, error=str(e))
+        return QueryResult(
+            query.name, None, len(timings), percentile(timings, 50), percentile(timings, 95),
+            percentile(timings, 99), max(timings), examined, plan_steps(plan), plan_flags(plan),
+        )
+
+    def run(self, queries: List[BenchQuery] = HOT_QUERIES) -> Dict[str, QueryResult]:
+        """Measure every query of the catalog."""
+        self.prepare()
+        results = {}
+        for query in queries:
+            results[query.name] = self.measure(query)
+            logger.debug(f"Benchmarked {query.name}: {results[query.name]}")
+        return results
+
+def compare(before: Dict[str, QueryResult], after: Dict[str, QueryResult], max_ratio: float = 1.5,
+            min_ms: float = 1.0, min_rows: int = 1000) -> List[str]:
+    """
+    Regressions from `before` to `after`: a query that now fails, a table access that got more
+    expensive or lost its index, a new sort or temporary table, or rows examined or p95 latency
+    growing by more than `max_ratio` (ignoring changes below `min_rows` rows / `min_ms` ms, which are noise).
+    """
+    regressions = []
+    for name, old in before.items():
+        new = after.get(name)
+        if new is None or old.error:
+            continue
+        if new.error:
+            regressions.append(f"{name}: now fails: {new.error}")
+            continue
+        old_steps = {s.table: s for s in old.plan}
+        for step in new.plan:
+            previous = old_steps.get(step.table)
+            if previous is None:
+                continue
+            if ACCESS_RANK.get(step.access_type, 7) > ACCESS_RANK.get(previous.access_type, 7) or (previous.key and not step.key):
+                regressions.append(f"{name}: plan changed from {previous} to {step}")
+        for flag in sorted(set(new.flags) - set(old.flags)):
+            regressions.append(f"{name}: plan now needs a {flag.replace('_', ' ')}")
+        if old.rows_examined is not None and new.rows_examined is not None and \
+                new.rows_examined - old.rows_examined >= min_rows and new.rows_examined > old.rows_examined * max_ratio:
+            regressions.append(f"{name}: rows examined grew from {old.rows_examined} to {new.rows_examined}")
+        if new.p95 - old.p95 >= min_ms and new.p95 > old.p95 * max_ratio:
+            regressions.append(f"{name}: p95 grew from {old.p95:.2f}ms to {new.p95:.2f}ms")
+    return regressions
+
+def print_results(label: str, results: Dict[str, QueryResult]) -> None:
+    """Render one benchmark run as a grid."""
+    print(f"\nQuery benchmark at {label}")
+    rows = [
+        [r.name, '-', '-', '-', '-', r.error] if r.error else
+        [r.name, r.p50, r.p95, r.p99,
+         r.rows_examined if r.rows_examined is not None else '?',
+         ' '.join(str(s) for s in r.plan) + ''.join(f" +{f}" for f in r.flags)]
+        for r in results.values()
+    ]
+    print(tabulate(rows, headers=['Query', 'p50 ms', 'p95 ms', 'p99 ms', 'Rows examined', 'Plan'], tablefmt="grid", floatfmt=".2f"))
+
+def load_results(path: Path) -> Dict[str, Dict[str, QueryResult]]:
+    """Read a file written by write_results: {label: {query: result}}."""
+    data = json.loads(Path(path).read_text())
+    return {label: {name: QueryResult.from_dict(r) for name, r in results.items()} for label, results in data.items()}
+
+def write_results(path: Path, runs: Dict[str, Dict[str, QueryResult]]) -> None:
+    """Save benchmark runs, keyed by schema version, for later comparison."""
+    data = {label: {name: r.to_dict() for name, r in results.items()} for label, results in runs.items()}
+    Path(path).write_text(json.dumps(data, indent=2) + '\n')
+    logger.info(f"Wrote benchmark results to {path}")
+
+def latest(runs: Dict[str, Dict[str, QueryResult]]) -> Dict[str, QueryResult]:
+    """The last run of a results file, the reference for a later comparison."""
+    if not runs:
+        return {}
+    return list(runs.values())[-1]
@@ -0,0 +1,93 @@
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Tuple
+from executor import analyze_statement
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS migration_statements ("
+    "timestamp BIGINT UNSIGNED NOT NULL COMMENT 'Migration timestamp', "
+    "direction VARCHAR(4) NOT NULL COMMENT 'up or down', "
+    "statement_index INT UNSIGNED NOT NULL COMMENT '1-based position of the statement in the script', "
+    "statement_hash CHAR(64) NOT NULL COMMENT 'SHA-256 of the statement text', "
+    "completed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+    "PRIMARY KEY (timestamp, direction, statement_index)"
+    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci "
+    "COMMENT='Completed statements of partially applied migrations'"
+)
+
+def statement_hash(statement: str) -> str:
+    """Return the SHA-256 hex digest identifying a statement."""
+    return hashlib.sha256(statement.encode('utf-8')).hexdigest()
+
+class StatementCheckpoints:
+    """
+    Per-statement progress of one migration script, stored in `migration_statements`.
+    MariaDB DDL auto-commits, so a failed migration can leave earlier statements applied;
+    the checkpoints let a retry or `--resume` continue from the first incomplete statement.
+    Session statements (SET, USE) only affect the connection that ran them, so they are never
+    checkpointed and always run again on resume. Rows are written on the connection that ran
+    the statement, in the same transaction, and are removed once the migration completes.
+    """
+
+    def __init__(self, connection, timestamp: str, direction: str):
+        self.connection = connection
+        self.timestamp = int(timestamp)
+        self.direction = direction
+        self.completed: Dict[int, str] = {}
+
+    def ensure_table(self) -> None:
+        """Create the tracking table if it does not exist."""
+        cursor = self.connection.cursor()
+        cursor.execute(CREATE_TABLE_SQL)
+        cursor.close()
+
+    def load(self) -> Dict[int, str]:
+        """Load the completed statement indexes and hashes of this script."""
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "SELECT statement_index, statement_hash FROM migration_statements WHERE timestamp = %s AND direction = %s",
+            (self.timestamp, self.direction)
+        )
+        self.completed = {int(index): digest for index, digest in cursor.fetchall()}
+        cursor.close()
+        return self.completed
+
+    def is_done(self, index: int, statement: str) -> bool:
+        """
+        Return True if the statement at `index` already completed. Session statements are never
+        done. Raises ValueError if the script was edited after it was partially applied.
+        """
+        if analyze_statement(statement).kind == 'session':
+            return False
+        digest = self.completed.get(index)
+        if digest is None:
+            return False
+        if digest != statement_hash(statement):
+            raise ValueError(
+                f"Statement {index} of migration {self.timestamp} ({self.direction}) changed since it was applied; "
+                f"fix the database manually and clear its rows in migration_statements"
+            )
+        return True
+
+    def record(self, entries: Iterable[Tuple[int, str]], connection=None) -> None:
+        """Record completed statements, given as (index, statement) pairs, in one write; session statements are left out."""
+        rows: List[Tuple] = [
+            (self.timestamp, self.direction, index, statement_hash(statement)) for index, statement in entries
+            if analyze_statement(statement).kind != 'session'
+        ]
+        if not rows:
+            return
+        cursor = (connection or self.connection).cursor()
+        cursor.execute(
+            "INSERT INTO migration_statements (timestamp, direction, statement_index, statement_hash) VALUES "
+            + ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+            + " ON DUPLICATE KEY UPDATE statement_hash = VALUES(statement_hash), completed_at = CURRENT_TIMESTAMP",
+            tuple(value for row in rows for value in row)
+        )
+        cursor.close()
+
+    def clear(self, cursor) -> None:
+        """Remove all checkpoints of this migration (both directions) once it completed."""
+        cursor.execute("DELETE FROM migration_statements WHERE timestamp = %s", (self.timestamp,))
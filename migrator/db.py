@@ -0,0 +1,26 @@
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+def run_statement(connection, statement: str, params: Optional[tuple] = None, dictionary: bool = False) -> List:
+    """Execute a single statement and return its rows (if any)."""
+    cursor = connection.cursor(dictionary=True) if dictionary else connection.cursor()
+    try:
+        logger.debug(f"Executing: {statement}")
+        cursor.execute(statement, params)
+        return cursor.fetchall() if cursor.with_rows else []
+    finally:
+        cursor.close()
+
+def run_update(connection, statement: str, params: Optional[tuple] = None) -> int:
+    """Execute a single statement and return the number of affected rows."""
+    cursor = connection.cursor()
+    try:
+        logger.debug(f"Executing: {statement}")
+        cursor.execute(statement, params)
+        if cursor.with_rows:
+            cursor.fetchall()
+        return max(cursor.rowcount, 0)
+    finally:
+        cursor.close()
@@ -11,6 +11,7 @@ fi
 
 # Initialize variables
 PUBLISH_PORT=""
+SERVE_PORT="8080"
 MIGRATOR_ARGS=""
 
 # Parse arguments, preserving quoted strings
@@ -24,6 +25,21 @@ while [ $# -gt 0 ]; do
             PUBLISH_PORT="$2"
             shift 2
             ;;
+        --serve-port)
+            if [ $# -lt 2 ]; then
+                echo "Error: --serve-port requires a value" >&2
+                exit 1
+            fi
+            # Passed on to the migrator, and the container port to publish
+            SERVE_PORT="$2"
+            MIGRATOR_ARGS="$MIGRATOR_ARGS \"$1\" \"$2\""
+            shift 2
+            ;;
+        --serve-port=*)
+            SERVE_PORT="${1#--serve-port=}"
+            MIGRATOR_ARGS="$MIGRATOR_ARGS \"$1\""
+            shift
+            ;;
         *)
             # Append argument, preserving quotes
             MIGRATOR_ARGS="$MIGRATOR_ARGS \"$1\""
@@ -32,8 +48,10 @@ while [ $# -gt 0 ]; do
     esac
 done
 
+# Only --serve listens on a port (8080 unless --serve-port is given)
+PUBLISH_ARGS=""
 if [ -n "$PUBLISH_PORT" ]; then
-    echo "Note: --publish-port is not applicable for the migrator, ignored" >&2
+    PUBLISH_ARGS="-p $PUBLISH_PORT:$SERVE_PORT"
 fi
 
 # Run the migrator container
@@ -41,6 +59,7 @@ echo "Running migrator with arguments: $MIGRATOR_ARGS"
 # Use sh -c to execute the command with proper argument handling
 docker run --rm -it \
     --network "$NETWORK_NAME" \
+    $PUBLISH_ARGS \
     -v "$(pwd):/mnt" \
     -w /mnt \
     -e DB_HOST="$DB_HOST" \
@@ -0,0 +1,427 @@
+import re
+import time
+import heapq
+import logging
+from queue import Queue
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from mysql.connector import Error
+from tokenizer import unquote_identifier
+
+logger = logging.getLogger(__name__)
+
+IDENTIFIER = r'((?:`(?:[^`]|``)+`|[\w$]+)(?:\s*\.\s*(?:`(?:[^`]|``)+`|[\w$]+))?)'
+
+CREATE_TABLE_RE = re.compile(
+    r'^\s*CREATE\s+(?:OR\s+REPLACE\s+)?(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?' + IDENTIFIER,
+    re.IGNORECASE
+)
+CREATE_INDEX_RE = re.compile(
+    r'^\s*CREATE\s+(?:OR\s+REPLACE\s+)?(?:ONLINE\s+|OFFLINE\s+)?(?:UNIQUE\s+|FULLTEXT\s+|SPATIAL\s+)?INDEX\s+'
+    r'(?:IF\s+NOT\s+EXISTS\s+)?\S+\s+(?:USING\s+\w+\s+)?ON\s+' + IDENTIFIER,
+    re.IGNORECASE
+)
+ALTER_TABLE_RE = re.compile(
+    r'^\s*ALTER\s+(?:ONLINE\s+)?(?:IGNORE\s+)?TABLE\s+(?:IF\s+EXISTS\s+)?' + IDENTIFIER,
+    re.IGNORECASE
+)
+DML_RE = re.compile(
+    r'^\s*(?:INSERT|REPLACE)\s+(?:LOW_PRIORITY\s+|DELAYED\s+|HIGH_PRIORITY\s+)?(?:IGNORE\s+)?(?:INTO\s+)?' + IDENTIFIER +
+    r'|^\s*UPDATE\s+(?:LOW_PRIORITY\s+)?(?:IGNORE\s+)?' + IDENTIFIER +
+    r'|^\s*DELETE\s+(?:LOW_PRIORITY\s+)?(?:QUICK\s+)?(?:IGNORE\s+)?FROM\s+' + IDENTIFIER,
+    re.IGNORECASE
+)
+# Statements that change the state of the session that runs them (SET foreign_key_checks, sql_mode, USE, ...)
+SESSION_RE = re.compile(r'^\s*(?:USE\b|SET\b(?!\s+(?:GLOBAL\b|@@GLOBAL\.|PASSWORD\b)))', re.IGNORECASE)
+REFERENCED_RE = re.compile(r'\b(?:REFERENCES|FROM|JOIN|LIKE)\s+' + IDENTIFIER, re.IGNORECASE)
+
+class StatementInfo:
+    """Tables a statement changes and reads, used to order statements for parallel execution."""
+
+    def __init__(self, kind: str, table: Optional[str] = None, references: Optional[Set[str]] = None):
+        self.kind = kind  # 'ddl', 'dml', 'session' or 'barrier'
+        self.table = table
+        self.references = references or set()
+
+def strip_literals(statement: str) -> str:
+    """Blank out string literals so keywords inside them are not mistaken for table references."""
+    return re.sub(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"", "''", statement)
+
+def analyze_statement(statement: str) -> StatementInfo:
+    """
+    Classify a statement by the table it changes and the tables it depends on.
+    Session statements (SET, USE) and anything else that is not a recognized single-table
+    DDL or DML statement are barriers.
+    """
+    if SESSION_RE.match(statement):
+        return StatementInfo('session')
+    for kind, pattern in (('ddl', CREATE_TABLE_RE), ('ddl', CREATE_INDEX_RE), ('ddl', ALTER_TABLE_RE), ('dml', DML_RE)):
+        match = pattern.match(statement)
+        if match:
+            table = unquote_identifier(next(g for g in match.groups() if g))
+            body = strip_literals(statement[match.end():])
+            references = {unquote_identifier(m.group(1)) for m in REFERENCED_RE.finditer(body)}
+            references.discard(table)
+            return StatementInfo(kind, table, references)
+    return StatementInfo('barrier')
+
+def build_dependencies(statements: List[str]) -> List[Set[int]]:
+    """
+    Return, for every statement, the indexes of earlier statements it must wait for:
+    the previous statement on the same table, the latest statements on every table it
+    references (e.g. foreign key parents) and, for DML, the previous DML statement so that
+    data changes keep their script order. Barriers (session statements included) wait for,
+    and block, everything.
+    """
+    dependencies: List[Set[int]] = []
+    last_by_table: Dict[str, int] = {}
+    last_dml: Optional[int] = None
+    last_barrier: Optional[int] = None
+    since_barrier: Set[int] = set()
+    for i, statement in enumerate(statements):
+        info = analyze_statement(statement)
+        if info.kind in ('barrier', 'session'):
+            deps = set(since_barrier)
+            if last_barrier is not None:
+                deps.add(last_barrier)
+            last_barrier = i
+            since_barrier = set()
+            last_by_table = {}
+            last_dml = None
+            dependencies.append(deps)
+            continue
+        deps = set()
+        if last_barrier is not None:
+            deps.add(last_barrier)
+        for table in {info.table} | info.references:
+            if table in last_by_table:
+                deps.add(last_by_table[table])
+        if info.kind == 'dml' and last_dml is not None:
+            deps.add(last_dml)
+            last_dml = i
+        elif info.kind == 'dml':
+            last_dml = i
+        last_by_table[info.table] = i
+        since_barrier.add(i)
+        dependencies.append(deps)
+    return dependencies
+
+class ParallelExecutor:
+    """
+    Execute a migration's statements over a small pool of connections, running statements
+    whose dependencies have completed concurrently while keeping script order otherwise.
+    Each statement is committed on its own (worker connections use autocommit). Session
+    statements such as `SET foreign_key_checks = 0` are barriers and run on every worker
+    connection, so the statements after them see the setting whichever worker runs them.
+    """
+
+    def __init__(self, connect: Callable, jobs: int, guard=None):
+        self.connect = connect
+        self.jobs = jobs
+        self.guard = guard  # optional LockGuard retrying statements after lock wait timeouts
+        self.connections: Queue = Queue()
+        self.opened = []
+        self.on_success = None
+        self.results: Dict[int, Tuple[float, int, int]] = {}  # 1-based index -> (seconds, rows, warnings)
+
+    def open(self) -> None:
+        """Open one autocommit connection per worker."""
+        for _ in range(self.jobs):
+            connection = self.connect()
+            self.opened.append(connection)
+            self.connections.put(connection)
+
+    def close(self) -> None:
+        """Close all worker connections."""
+        for connection in self.opened:
+            try:
+                if connection.is_connected():
+                    connection.close()
+            except Exception:
+                pass
+        self.opened = []
+
+    def execute_everywhere(self, index: int, statement: str) -> None:
+        """Run a session statement on every worker connection; nothing else runs meanwhile."""
+        start = time.monotonic()
+        for connection in self.opened:
+            cursor = connection.cursor()
+            try:
+                logger.debug(f"[worker] Executing session statement {index + 1} on every connection: {statement}")
+                cursor.execute(statement)
+                if cursor.with_rows:
+                    cursor.fetchall()
+            finally:
+                cursor.close()
+        self.results[index + 1] = (time.monotonic() - start, 0, 0)
+        if self.on_success:
+            self.on_success(index + 1, statement, self.opened[0])
+
+    def execute(self, index: int, statement: str) -> None:
+        """Run one statement on a pooled connection."""
+        if analyze_statement(statement).kind == 'session':
+            self.execute_everywhere(index, statement)
+            return
+        connection = self.connections.get()
+        try:
+            cursor = connection.cursor()
+            try:
+                logger.debug(f"[worker] Executing statement {index + 1}: {statement}")
+                start = time.monotonic()
+                if self.guard:
+                    self.guard.run(lambda: cursor.execute(statement), f"Statement {index + 1}",
+                                   analyze_statement(statement).table)
+                else:
+                    cursor.execute(statement)
+                if cursor.with_rows:
+                    cursor.fetchall()
+                self.results[index + 1] = (time.monotonic() - start, max(cursor.rowcount, 0), cursor.warning_count or 0)
+            finally:
+                cursor.close()
+            if self.on_success:
+                self.on_success(index + 1, statement, connection)
+        finally:
+            self.connections.put(connection)
+
+    def run(self, statements: List[str], done: Optional[Set[int]] = None,
+            on_success: Optional[Callable[[int, str, object], None]] = None) -> None:
+        """
+        Execute all statements, stopping at the first failure and re-raising its error.
+        `done` holds 1-based indexes of statements that already completed (when resuming);
+        `on_success(index, statement, connection)` runs on the worker's connection after each one.
+        """
+        self.on_success = on_success
+        done = done or set()
+        dependencies = build_dependencies(statements)
+        dependents: List[List[int]] = [[] for _ in statements]
+        remaining = [len(deps) for deps in dependencies]
+        for i, deps in enumerate(dependencies):
+            for dep in deps:
+                dependents[dep].append(i)
+        ready = [i for i, count in enumerate(remaining) if count == 0]
+        heapq.heapify(ready)
+
+        def release(i: int) -> None:
+            for dependent in dependents[i]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    heapq.heappush(ready, dependent)
+        failure: Optional[Tuple[int, BaseException]] = None
+        completed = 0
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            running = {}
+            while ready or running:
+                while ready and failure is None and len(running) < self.jobs:
+                    i = heapq.heappop(ready)
+                    if i + 1 in done:
+                        # Completed before; it still orders its dependents behind the statements it waited for
+                        release(i)
+                        continue
+                    running[pool.submit(self.execute, i, statements[i])] = i
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    i = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        if failure is None or i < failure[0]:
+                            failure = (i, error)
+                        continue
+                    completed += 1
+                    release(i)
+        pending = len(statements) - len(done)
+        if failure is not None:
+            index, error = failure
+            logger.error(f"Statement {index + 1} failed after {completed}/{pending} statements completed: {error}")
+            raise error
+        logger.info(f"Executed {completed} statements with {self.jobs} parallel connections")
+
+INSERT_VALUES_RE = re.compile(
+    r'^\s*((?:INSERT|REPLACE)\s+(?:IGNORE\s+)?(?:INTO\s+)?' + IDENTIFIER + r'\s*(?:\([^()]*\))?\s*VALUES?)\s*(\(.*?)\s*;?\s*$',
+    re.IGNORECASE | re.DOTALL
+)
+NOT_MERGEABLE_RE = re.compile(r'\b(?:ON\s+DUPLICATE|RETURNING|SELECT)\b', re.IGNORECASE)
+# LAST_INSERT_ID(), @@identity and user variables see the ids of the INSERT before them
+INSERT_ID_RE = re.compile(r'\bLAST_INSERT_ID\b|@', re.IGNORECASE)
+
+def uses_insert_id(statement: str) -> bool:
+    """Whether a statement reads LAST_INSERT_ID(), @@identity or a user variable."""
+    return bool(INSERT_ID_RE.search(strip_literals(statement)))
+
+def split_insert_values(statement: str) -> Optional[Tuple[str, str]]:
+    """
+    Split a plain `INSERT INTO t (cols) VALUES (...), (...)` into its prefix and row list.
+    Returns None for inserts that cannot be merged with others (ON DUPLICATE KEY, SELECT,
+    LAST_INSERT_ID(), ...).
+    """
+    match = INSERT_VALUES_RE.match(statement)
+    if not match:
+        return None
+    values = match.group(3)
+    stripped = strip_literals(values)
+    if not stripped.endswith(')') or NOT_MERGEABLE_RE.search(stripped) or INSERT_ID_RE.search(stripped):
+        return None
+    return ' '.join(match.group(1).split()), values
+
+class Batch:
+    """A run of consecutive statements sent to the server in one round trip."""
+
+    def __init__(self):
+        self.indexes: List[int] = []  # 1-based positions of the statements in the script
+        self.statements: List[str] = []
+        self.queries: List[str] = []  # executable SQL, with compatible INSERTs merged
+        self.members: List[List[int]] = []  # offsets into statements covered by each query
+        self.size = 0
+        self.insert_prefix: Optional[str] = None
+        self.insert_values: List[str] = []
+
+    @property
+    def first(self) -> int:
+        return self.indexes[0]
+
+    @property
+    def single(self) -> bool:
+        return len(self.statements) == 1 and self.insert_prefix is None
+
+    def close_insert(self) -> None:
+        """Finish the multi-row INSERT being assembled, if any."""
+        if self.insert_prefix is not None:
+            self.queries.append(f"{self.insert_prefix} " + ',\n'.join(self.insert_values))
+            self.insert_prefix = None
+            self.insert_values = []
+
+    def isolate_insert(self) -> None:
+        """
+        Close the multi-row INSERT being assembled with its last row as an INSERT of its own.
+        After a multi-row INSERT, LAST_INSERT_ID() is the id of its first row, so a statement
+        reading it must follow the single INSERT it followed in the script.
+        """
+        if self.insert_prefix is not None and len(self.insert_values) > 1:
+            prefix, values = self.insert_prefix, self.insert_values.pop()
+            offset = self.members[-1].pop()
+            self.close_insert()
+            self.queries.append(f"{prefix} {values}")
+            self.members.append([offset])
+        self.close_insert()
+
+    def add(self, index: int, statement: str) -> None:
+        """Append a DML statement, merging it into the current multi-row INSERT when compatible."""
+        offset = len(self.statements)
+        self.indexes.append(index)
+        self.statements.append(statement)
+        self.size += len(statement)
+        parts = split_insert_values(statement)
+        if parts and parts[0] == self.insert_prefix:
+            self.insert_values.append(parts[1])
+            self.members[-1].append(offset)
+            return
+        self.close_insert()
+        if parts:
+            self.insert_prefix, self.insert_values = parts[0], [parts[1]]
+        else:
+            self.queries.append(statement.rstrip().rstrip(';'))
+        self.members.append([offset])
+
+    def finish(self) -> 'Batch':
+        self.close_insert()
+        return self
+
+def coalesce_batches(statements: Iterable[Tuple[int, str]], batch_size: int, max_bytes: int = 1024 * 1024) -> Iterator[Batch]:
+    """
+    Group consecutive (index, statement) pairs of INSERT/UPDATE/DELETE/REPLACE statements into
+    batches of at most `batch_size` statements and about `max_bytes` of SQL. Any other statement
+    forms a batch of its own. Batches are produced lazily so large scripts stay streamed.
+    """
+    batch: Optional[Batch] = None
+    for index, statement in statements:
+        if batch is not None and uses_insert_id(statement):
+            batch.isolate_insert()
+        if analyze_statement(statement).kind != 'dml':
+            if batch is not None:
+                yield batch.finish()
+                batch = None
+            single = Batch()
+            single.indexes.append(index)
+            single.statements.append(statement)
+            single.queries.append(statement)
+            single.members.append([0])
+            yield single
+            continue
+        if batch is not None and (len(batch.statements) >= batch_size or batch.size + len(statement) > max_bytes):
+            yield batch.finish()
+            batch = None
+        if batch is None:
+            batch = Batch()
+        batch.add(index, statement)
+    if batch is not None:
+        yield batch.finish()
+
+class BatchExecutor:
+    """
+    Execute DML batches as one multi-statement round trip each, reporting per-batch results.
+    If a batch fails, the failed query and everything after it in the batch are re-run one
+    statement at a time through `execute_single`, as without batching (InnoDB rolls back a failed
+    statement as a whole), so the error is attributed to the exact statement and nothing is
+    applied twice. `on_success` gets the statements that ran in the batch's round trip, as soon
+    as it returns.
+    """
+
+    def __init__(self, connection, execute_single: Callable[[int, str], None],
+                 on_success: Optional[Callable[[List[Tuple[int, str]]], None]] = None):
+        self.connection = connection
+        self.execute_single = execute_single
+        self.on_success = on_success
+        self.batches = 0
+        self.statements = 0
+        self.rows = 0
+        self.warnings = 0
+        self.completed = 0
+
+    def run_query(self, cursor, sql: str) -> int:
+        """
+        Execute one or more ';'-separated statements and return the total affected rows.
+        `self.completed` counts the statements that succeeded, which locates a failure.
+        """
+        self.completed = 0
+        cursor.execute(sql)
+        rows = max(cursor.rowcount, 0)
+        self.warnings += cursor.warning_count or 0
+        self.completed = 1
+        while cursor.nextset():
+            rows += max(cursor.rowcount, 0)
+            self.warnings += cursor.warning_count or 0
+            self.completed += 1
+        return rows
+
+    def execute(self, batch: Batch) -> None:
+        """Execute a batch, stopping at the first failing statement."""
+        self.batches += 1
+        self.statements += len(batch.statements)
+        if batch.single:
+            self.execute_single(batch.first, batch.statements[0])
+            return
+        start = time.monotonic()
+        cursor = self.connection.cursor()
+        try:
+            try:
+                rows = self.run_query(cursor, ';\n'.join(batch.queries))
+            except Error as e:
+                completed = self.completed
+                applied = sum(len(members) for members in batch.members[:completed])
+                failed = batch.indexes[batch.members[completed][0]]
+                logger.warning(f"Batch {self.batches} failed near statement {failed} ({e}); "
+                               f"re-running the rest of the batch statement by statement")
+                if self.on_success and applied:
+                    self.on_success(list(zip(batch.indexes[:applied], batch.statements[:applied])))
+                for offset in range(applied, len(batch.statements)):
+                    self.execute_single(batch.indexes[offset], batch.statements[offset])
+                return
+            self.rows += rows
+            if self.on_success:
+                self.on_success(list(zip(batch.indexes, batch.statements)))
+            last = batch.indexes[-1]
+            logger.info(f"Batch {self.batches}: statements {batch.first}-{last} as {len(batch.queries)} queries, "
+                        f"{rows} rows affected in {time.monotonic() - start:.3f}s")
+        finally:
+            cursor.close()
@@ -0,0 +1,144 @@
+import difflib
+import hashlib
+import logging
+from typing import Dict, List, NamedTuple, Set, Tuple
+from schema_model import Column, ForeignKey, Index, SchemaModel, Table
+from partitions import PARTITIONED_TABLES
+
+logger = logging.getLogger(__name__)
+
+# Created by the migrator itself at runtime rather than by migrations
+IGNORED_TABLES = {'migration_statements', 'migration_backfills'}
+
+def ignored(table: str) -> bool:
+    """Bookkeeping tables and leftover _<table>_new/_old tables of online schema changes."""
+    return table in IGNORED_TABLES or table.startswith('_')
+
+def canonical_lines(tables: Dict[str, Table]) -> List[str]:
+    """
+    One line per column (in table order), index (by name) and foreign key (by definition, since
+    online schema changes rename constraints), for every table sorted by name.
+    """
+    lines = []
+    for name in sorted(t for t in tables if not ignored(t)):
+        table = tables[name]
+        for column in table.columns.values():
+            lines.append(f"{name} column {column.name} {column.type}"
+                         f"{'' if column.nullable else ' not null'}{' auto_increment' if column.auto_increment else ''}")
+        for index in sorted(table.indexes.values(), key=lambda i: (not i.primary, i.name)):
+            columns = ', '.join(f"{c}({n})" if n else c for c, n in index.columns)
+            lines.append(f"{name} index {index.name} {'unique ' if index.unique else ''}{index.kind.lower()} ({columns})")
+        lines.extend(sorted(
+            f"{name} foreign key ({', '.join(fk.columns)}) references {fk.ref_table} ({', '.join(fk.ref_columns)}) "
+            f"on delete {fk.on_delete.lower()} on update {fk.on_update.lower()}"
+            for fk in table.foreign_keys.values()
+        ))
+    return lines
+
+def fingerprint(lines: List[str]) -> str:
+    """SHA-256 of the canonical form."""
+    return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()
+
+def query(connection, sql: str, database: str) -> List[tuple]:
+    """Run an information_schema query for one database."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql, (database,))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def load_live_schema(connection, database: str) -> Tuple[Dict[str, Table], Set[str]]:
+    """Read tables, columns, indexes and foreign keys in four bulk queries; also returns the partitioned tables."""
+    tables: Dict[str, Table] = {}
+    for table, column, column_type, nullable, extra in query(
+        connection,
+        "SELECT c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, c.IS_NULLABLE, c.EXTRA FROM information_schema.COLUMNS c "
+        "JOIN information_schema.TABLES t ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME "
+        "WHERE c.TABLE_SCHEMA = %s AND t.TABLE_TYPE = 'BASE TABLE' ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION",
+        database
+    ):
+        tables.setdefault(table, Table(table)).columns[column] = Column(
+            column, column_type, nullable == 'YES', 'auto_increment' in (extra or '').lower()
+        )
+    for table, name, non_unique, index_type, column, sub_part in query(
+        connection,
+        "SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, INDEX_TYPE, COLUMN_NAME, SUB_PART FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX",
+        database
+    ):
+        if table not in tables:
+            continue
+        indexes = tables[table].indexes
+        if name not in indexes:
+            indexes[name] = Index(name, [], not int(non_unique), index_type)
+        indexes[name].columns.append((column, int(sub_part) if sub_part else None))
+    for table, name, column, ref_table, ref_column, on_update, on_delete in query(
+        connection,
+        "SELECT kcu.TABLE_NAME, kcu.CONSTRAINT_NAME, kcu.COLUMN_NAME, kcu.REFERENCED_TABLE_NAME, "
+        "kcu.REFERENCED_COLUMN_NAME, rc.UPDATE_RULE, rc.DELETE_RULE "
+        "FROM information_schema.KEY_COLUMN_USAGE kcu "
+        "JOIN information_schema.REFERENTIAL_CONSTRAINTS rc ON rc.CONSTRAINT_SCHEMA = kcu.CONSTRAINT_SCHEMA "
+        "AND rc.CONSTRAINT_NAME = kcu.CONSTRAINT_NAME AND rc.TABLE_NAME = kcu.TABLE_NAME "
+        "WHERE kcu.TABLE_SCHEMA = %s AND kcu.REFERENCED_TABLE_NAME IS NOT NULL "
+        "ORDER BY kcu.TABLE_NAME, kcu.CONSTRAINT_NAME, kcu.ORDINAL_POSITION",
+        database
+    ):
+        if table not in tables:
+            continue
+        keys = tables[table].foreign_keys
+        if name not in keys:
+            keys[name] = ForeignKey(name, [], ref_table, [], on_delete, on_update)
+        keys[name].columns.append(column)
+        keys[name].ref_columns.append(ref_column)
+    partitioned = {row[0] for row in query(
+        connection,
+        "SELECT DISTINCT TABLE_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = %s AND PARTITION_NAME IS NOT NULL",
+        database
+    )}
+    return tables, partitioned
+
+def expected_tables(model: SchemaModel, partitioned: Set[str]) -> Dict[str, Table]:
+    """
+    The migrations' schema with the changes --partitions makes applied to the tables that are
+    partitioned: the partitioning column joins the primary key and foreign keys are dropped.
+    The model is modified in place.
+    """
+    for name, column in PARTITIONED_TABLES.items():
+        table = model.tables.get(name)
+        if name not in partitioned or not table:
+            continue
+        primary = table.indexes.get('PRIMARY')
+        if primary and column not in primary.column_names:
+            table.add_index(Index('PRIMARY', primary.columns + [(column, None)], True))
+        table.foreign_keys = {}
+        for index in table.indexes.values():
+            index.implicit = False
+    return model.tables
+
+def live_fingerprint(connection, database: str) -> str:
+    """Fingerprint of a database's schema as it is."""
+    tables, _ = load_live_schema(connection, database)
+    return fingerprint(canonical_lines(tables))
+
+class SchemaCheck(NamedTuple):
+    expected: str  # fingerprint of the schema the applied migrations produce
+    actual: str  # fingerprint of the live schema
+    diff: List[str]  # unified diff from expected to actual canonical lines
+
+    @property
+    def matches(self) -> bool:
+        """True when the live schema is the one the migrations describe."""
+        return self.expected == self.actual
+
+def check_schema(connection, database: str, model: SchemaModel) -> SchemaCheck:
+    """Compare the live schema with the model of the applied migrations."""
+    live, partitioned = load_live_schema(connection, database)
+    leftovers = sorted(t for t in live if t.startswith('_'))
+    if leftovers:
+        logger.warning(f"Leftover online schema change tables (not fingerprinted): {', '.join(leftovers)}")
+    expected_lines = canonical_lines(expected_tables(model, partitioned))
+    actual_lines = canonical_lines(live)
+    diff = list(difflib.unified_diff(expected_lines, actual_lines, 'migrations', database, n=1, lineterm=''))
+    return SchemaCheck(fingerprint(expected_lines), fingerprint(actual_lines), diff)
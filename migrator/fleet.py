@@ -0,0 +1,207 @@
+import os
+import re
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+from tabulate import tabulate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLEET_JOBS = 4
+DEFAULT_PER_HOST = 2
+DEFAULT_MAX_FAILURE_RATE = 0.1
+DEFAULT_LOG_DIR = Path('fleet-logs')
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+UNSAFE_NAME_RE = re.compile(r'[^A-Za-z0-9_.-]')
+TARGET_KEYS = {'name', 'host', 'port', 'user', 'password_env', 'database', 'canary'}
+
+OK, FAILED, SKIPPED = 'ok', 'failed', 'skipped'
+
+class Target(NamedTuple):
+    name: str
+    db_config: Dict
+    canary: bool
+
+    @property
+    def host(self) -> str:
+        """Server of the target, the unit of the per-host concurrency cap."""
+        return f"{self.db_config['host']}:{self.db_config['port']}"
+
+class TargetResult(NamedTuple):
+    name: str
+    host: str
+    database: str
+    status: str  # ok, failed or skipped
+    before: Optional[str]  # schema version before the run
+    after: Optional[str]
+    migrations: int  # migrations the run applied or attempted
+    seconds: float
+    error: Optional[str]
+    log: Optional[str]
+
+def read_inventory(path: Path, defaults: Dict) -> List[Target]:
+    """
+    Parse an inventory file: one target per line as `key=value` words (name, host, port, user,
+    password_env, database) plus an optional bare `canary`; `#` starts a comment. Missing keys
+    come from `defaults`, the connection settings of the environment. Passwords are not stored
+    in the file: `password_env=VAR` reads the target's password from the environment.
+    """
+    targets: List[Target] = []
+    with open(path, 'r') as f:
+        for number, line in enumerate(f, 1):
+            words = line.split('#', 1)[0].split()
+            if not words:
+                continue
+            options = dict(word.partition('=')[::2] for word in words)
+            unknown = set(options) - TARGET_KEYS
+            if unknown:
+                raise ValueError(f"{path}:{number}: unknown keys {', '.join(sorted(unknown))}")
+            config = dict(defaults)
+            for key in ('host', 'user', 'database'):
+                if options.get(key):
+                    config[key] = options[key]
+            if options.get('port'):
+                config['port'] = int(options['port'])
+            if options.get('password_env'):
+                if options['password_env'] not in os.environ:
+                    raise ValueError(f"{path}:{number}: environment variable {options['password_env']} is not set")
+                config['password'] = os.environ[options['password_env']]
+            name = options.get('name') or f"{config['database']}@{config['host']}"
+            targets.append(Target(name, config, 'canary' in options))
+    names = [t.name for t in targets]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"{path}: duplicate targets {', '.join(duplicates)}")
+    return targets
+
+def log_path(directory: Path, name: str, suffix: str) -> Path:
+    """Per-target file in the log directory."""
+    return directory / f"{UNSAFE_NAME_RE.sub('_', name)}{suffix}"
+
+def migrate_target(migrator, target: Target, directory: str, run_options: Dict) -> TargetResult:
+    """
+    Worker: run `migrator` (configured for `target`) with its log in the target's own file
+    instead of the shared console, and its run report next to it.
+    """
+    log = log_path(Path(directory), target.name, '.log')
+    handler = logging.FileHandler(log)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root = logging.getLogger()
+    console, root.handlers = root.handlers, [handler]
+    started = time.monotonic()
+    before = after = error = None
+    try:
+        before = migrator.schema_version()
+        migrator.run(**run_options, report_path=str(log_path(Path(directory), target.name, '.json')))
+        after = migrator.schema_version()
+        status = OK
+    except Exception as e:
+        logger.exception(f"Migrating {target.name} failed")
+        status, error = FAILED, str(e)
+    finally:
+        migrator.close()
+        root.handlers = console
+        handler.close()
+    return TargetResult(target.name, target.host, target.db_config['database'], status, before, after,
+                        len(migrator.report.migrations), time.monotonic() - started, error, str(log))
+
+class Fleet:
+    """
+    Migrate many databases, one per tenant, with the same migrations. Targets run in worker
+    processes, at most `jobs` at once and at most `per_host` on one server. Canaries go first:
+    the other targets only start once every canary succeeded. When more than `max_failure_rate`
+    of all targets failed, no further targets start; the running ones finish.
+    """
+
+    def __init__(self, migrator, targets: List[Target], jobs: int = DEFAULT_FLEET_JOBS, per_host: int = DEFAULT_PER_HOST,
+                 max_failure_rate: float = DEFAULT_MAX_FAILURE_RATE, log_dir: Path = DEFAULT_LOG_DIR):
+        self.migrator = migrator
+        self.targets = targets
+        self.jobs = max(1, jobs)
+        self.per_host = max(1, per_host)
+        self.failure_budget = int(max_failure_rate * len(targets))
+        self.log_dir = log_dir
+
+    def stages(self, canaries: int = 1) -> List[List[Target]]:
+        """Canary targets (those marked `canary`, else the first `canaries`), then the rest."""
+        marked = [t for t in self.targets if t.canary] or self.targets[:canaries]
+        rest = [t for t in self.targets if t not in marked]
+        return [stage for stage in (marked, rest) if stage]
+
+    def run_stage(self, pool: ProcessPoolExecutor, stage: List[Target], run_options: Dict,
+                  results: Dict[str, TargetResult]) -> bool:
+        """Run the targets of a stage under the caps; returns False once the failure budget is exceeded."""
+        queue = list(stage)
+        running: Dict = {}
+        hosts: Dict[str, int] = {}
+        stopped = False
+        while queue or running:
+            if not stopped:
+                for target in list(queue):
+                    if len(running) >= self.jobs:
+                        break
+                    if hosts.get(target.host, 0) < self.per_host:
+                        queue.remove(target)
+                        hosts[target.host] = hosts.get(target.host, 0) + 1
+                        migrator = self.migrator.target_migrator(**target.db_config)
+                        running[pool.submit(migrate_target, migrator, target, str(self.log_dir), run_options)] = target
+                        logger.info(f"Started {target.name} ({target.host}/{target.db_config['database']})")
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                target = running.pop(future)
+                hosts[target.host] -= 1
+                try:
+                    result = future.result()
+                except Exception as e:  # the worker process died
+                    result = TargetResult(target.name, target.host, target.db_config['database'], FAILED,
+                                          None, None, 0, 0.0, str(e), None)
+                results[target.name] = result
+                if result.status == OK:
+                    logger.info(f"{result.name}: {result.before or '-'} -> {result.after or '-'} in {result.seconds:.1f}s")
+                else:
+                    logger.error(f"{result.name} failed: {result.error} (log: {result.log})")
+                failures = sum(r.status == FAILED for r in results.values())
+                if failures > self.failure_budget and not stopped:
+                    logger.error(f"{failures} of {len(self.targets)} targets failed, more than the budget of "
+                                 f"{self.failure_budget}; not starting the remaining ones")
+                    stopped = True
+        return not stopped
+
+    def run(self, run_options: Dict, canaries: int = 1) -> List[TargetResult]:
+        """Migrate every target and return the results in inventory order, skipped targets included."""
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        results: Dict[str, TargetResult] = {}
+        stages = self.stages(canaries)
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            for number, stage in enumerate(stages):
+                if number == 0 and len(stages) > 1:
+                    logger.info(f"Migrating {len(stage)} canaries: {', '.join(t.name for t in stage)}")
+                elif number:
+                    logger.info(f"Migrating {len(stage)} targets with {self.jobs} workers, at most {self.per_host} per host")
+                if not self.run_stage(pool, stage, run_options, results):
+                    break
+                if number == 0 and len(stages) > 1 and any(results[t.name].status != OK for t in stage):
+                    logger.error("A canary failed; not migrating the other targets")
+                    break
+        return [
+            results.get(t.name) or TargetResult(t.name, t.host, t.db_config['database'], SKIPPED, None, None, 0, 0.0, None, None)
+            for t in self.targets
+        ]
+
+def print_summary(results: List[TargetResult]) -> None:
+    """Aggregated status table of a fan-out run."""
+    rows = [
+        {
+            'Target': r.name, 'Host': r.host, 'Database': r.database, 'Status': r.status.upper(),
+            'Before': r.before or '-', 'After': r.after or '-', 'Migrations': r.migrations,
+            'Seconds': f"{r.seconds:.1f}", 'Error': (r.error or '')[:80], 'Log': r.log or '-',
+        }
+        for r in results
+    ]
+    print(tabulate(rows, headers="keys", tablefmt="grid"))
+    counts = {s: sum(r.status == s for r in results) for s in (OK, FAILED, SKIPPED)}
+    print(f"Targets: {len(results)}, OK: {counts[OK]}, Failed: {counts[FAILED]}, Skipped: {counts[SKIPPED]}")
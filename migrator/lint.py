@@ -0,0 +1,97 @@
+import logging
+from pathlib import Path
+from typing import List, NamedTuple, Set
+from schema_model import Index, SchemaModel, Table
+
+logger = logging.getLogger(__name__)
+
+class Finding(NamedTuple):
+    code: str  # duplicate-index, redundant-index or unindexed-foreign-key
+    table: str
+    subject: str  # index or foreign key name
+    message: str
+
+    @property
+    def key(self) -> str:
+        """Stable identifier used in the baseline file."""
+        return f"{self.code}:{self.table}:{self.subject}"
+
+def index_rank(index: Index) -> int:
+    """Which of two equivalent indexes to keep: primary over unique over plain."""
+    return 2 if index.primary else 1 if index.unique else 0
+
+def describe(index: Index) -> str:
+    """Index name and columns for messages."""
+    columns = ', '.join(f"{c}({n})" if n else c for c, n in index.columns)
+    return f"{index.name} ({columns})"
+
+def find_redundant_indexes(table: Table) -> List[Finding]:
+    """
+    Indexes another index already serves: an identical column list (duplicate) or a left
+    prefix of a longer index (redundant). Unique indexes are never reported as prefixes, since
+    they enforce a constraint the longer index does not.
+    """
+    findings = []
+    indexes = [i for i in table.indexes.values() if i.kind == 'BTREE' and not i.implicit]
+    reported = set()
+    for position, index in enumerate(indexes):
+        for other_position, other in enumerate(indexes):
+            if other is index or other.name in reported:
+                continue
+            if index.columns == other.columns:
+                # Keep the stronger index, or the earlier one of equal rank
+                if (index_rank(index), -position) < (index_rank(other), -other_position):
+                    findings.append(Finding(
+                        'duplicate-index', table.name, index.name,
+                        f"{table.name}.{describe(index)} duplicates {describe(other)}"
+                    ))
+                    reported.add(index.name)
+                    break
+            elif not index.unique and len(index.columns) < len(other.columns) and \
+                    other.columns[:len(index.columns)] == index.columns:
+                findings.append(Finding(
+                    'redundant-index', table.name, index.name,
+                    f"{table.name}.{describe(index)} is a prefix of {describe(other)}"
+                ))
+                reported.add(index.name)
+                break
+    return findings
+
+def find_unindexed_foreign_keys(table: Table) -> List[Finding]:
+    """Foreign keys whose columns do not lead any declared index (InnoDB adds a hidden one)."""
+    findings = []
+    for fk in table.foreign_keys.values():
+        if not table.covering_index(fk.columns, explicit_only=True):
+            findings.append(Finding(
+                'unindexed-foreign-key', table.name, fk.name,
+                f"{table.name}.{fk.name} ({', '.join(fk.columns)}) -> {fk.ref_table} has no declared leading index"
+            ))
+    return findings
+
+def lint(model: SchemaModel) -> List[Finding]:
+    """All findings for the modelled schema, ordered by table then code."""
+    findings = []
+    for table in model.tables.values():
+        findings.extend(find_redundant_indexes(table))
+        findings.extend(find_unindexed_foreign_keys(table))
+    return findings
+
+def load_lint_baseline(path: Path) -> Set[str]:
+    """Finding keys accepted in the baseline file; blank lines and # comments are ignored."""
+    if not path.exists():
+        return set()
+    keys = set()
+    for line in path.read_text().splitlines():
+        line = line.split('#', 1)[0].strip()
+        if line:
+            keys.add(line)
+    return keys
+
+def write_lint_baseline(path: Path, findings: List[Finding]) -> None:
+    """Record the current findings as accepted."""
+    lines = [
+        "# Accepted --lint findings; --lint fails only on findings not listed here.",
+        "# Regenerate with: python migrator.py --lint --update-lint-baseline",
+    ]
+    lines.extend(sorted(f.key for f in findings))
+    path.write_text('\n'.join(lines) + '\n')
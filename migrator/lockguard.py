@@ -0,0 +1,135 @@
+import time
+import random
+import logging
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, TypeVar
+from mysql.connector import Error
+from db import run_statement
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+LOCK_WAIT_TIMEOUT = 1205  # ER_LOCK_WAIT_TIMEOUT: metadata lock (lock_wait_timeout) or row lock (innodb_lock_wait_timeout)
+STATEMENT_TIMEOUT = 1969  # ER_STATEMENT_TIMEOUT: max_statement_time exceeded
+UNKNOWN_TABLE = 1109  # information_schema.METADATA_LOCK_INFO needs the metadata_lock_info plugin
+
+class LockPolicy(NamedTuple):
+    lock_wait_timeout: int = 5  # seconds a statement may wait for a metadata (or row) lock
+    retries: int = 5  # attempts per statement before giving up
+    max_statement_time: float = 0.0  # seconds a statement may run, 0 for no limit
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+class LockGuard:
+    """
+    Keeps migration statements from queueing behind long backend transactions.
+
+    A DDL statement waiting for a metadata lock blocks every later query on the table, so the
+    session's `lock_wait_timeout` (and `innodb_lock_wait_timeout`) is lowered: a statement that
+    cannot get its locks quickly fails with ER_LOCK_WAIT_TIMEOUT instead of stalling the table.
+    The blocking connections are logged, and the statement alone is retried after a jittered
+    exponential backoff. A lock wait timeout rolls back only the failed statement, so earlier
+    uncommitted statements of the migration are kept. Deadlocks roll back the whole transaction
+    and are left to the caller.
+    """
+
+    def __init__(self, connection, database: str, policy: LockPolicy = LockPolicy()):
+        self.connection = connection
+        self.database = database
+        self.policy = policy
+        self.retried = 0
+        self.lock = threading.Lock()  # parallel workers share the connection used for lookups
+
+    def configure(self, connection=None) -> None:
+        """Apply the timeouts to a session (the guarded connection by default)."""
+        statement = "SET SESSION lock_wait_timeout = %s, innodb_lock_wait_timeout = %s"
+        params = [max(1, self.policy.lock_wait_timeout)] * 2
+        if self.policy.max_statement_time:
+            statement += ", max_statement_time = %s"
+            params.append(self.policy.max_statement_time)
+        cursor = (connection or self.connection).cursor()
+        try:
+            cursor.execute(statement, tuple(params))
+        finally:
+            cursor.close()
+
+    def reset(self) -> None:
+        """Restore the server defaults of the guarded session."""
+        try:
+            run_statement(self.connection, "SET SESSION lock_wait_timeout = DEFAULT, innodb_lock_wait_timeout = DEFAULT, "
+                                           "max_statement_time = DEFAULT")
+        except Error as e:
+            logger.debug(f"Could not reset session timeouts: {e}")
+
+    def blockers(self, table: Optional[str]) -> List[Dict]:
+        """
+        Connections holding metadata locks on `table` (with the metadata_lock_info plugin), or else
+        the connections with open InnoDB transactions, oldest first.
+        """
+        if table:
+            try:
+                return run_statement(
+                    self.connection,
+                    "SELECT p.ID AS id, p.USER AS user, p.HOST AS host, p.COMMAND AS command, p.TIME AS time, "
+                    "p.STATE AS state, LEFT(p.INFO, 200) AS query, l.LOCK_MODE AS lock_mode "
+                    "FROM information_schema.METADATA_LOCK_INFO l "
+                    "JOIN information_schema.PROCESSLIST p ON p.ID = l.THREAD_ID "
+                    "WHERE l.TABLE_SCHEMA = %s AND l.TABLE_NAME = %s AND l.THREAD_ID <> CONNECTION_ID() "
+                    "ORDER BY p.TIME DESC",
+                    (self.database, table),
+                    dictionary=True
+                )
+            except Error as e:
+                if e.errno != UNKNOWN_TABLE:
+                    raise
+        return run_statement(
+            self.connection,
+            "SELECT p.ID AS id, p.USER AS user, p.HOST AS host, p.COMMAND AS command, p.TIME AS time, "
+            "p.STATE AS state, LEFT(COALESCE(p.INFO, t.trx_query), 200) AS query, t.trx_started AS trx_started "
+            "FROM information_schema.INNODB_TRX t "
+            "JOIN information_schema.PROCESSLIST p ON p.ID = t.trx_mysql_thread_id "
+            "WHERE p.ID <> CONNECTION_ID() ORDER BY t.trx_started LIMIT 10",
+            dictionary=True
+        )
+
+    def log_blockers(self, table: Optional[str]) -> None:
+        """Log who holds the locks the statement waited for."""
+        try:
+            with self.lock:
+                blockers = self.blockers(table)
+        except Error as e:
+            logger.warning(f"Could not look up blocking connections: {e}")
+            return
+        if not blockers:
+            logger.warning("No blocking connection found; the lock was released before it could be inspected")
+            return
+        for b in blockers:
+            held = f"holds {b['lock_mode']}" if b.get('lock_mode') else f"transaction open since {b.get('trx_started')}"
+            logger.warning(f"Blocking connection {b['id']} ({b['user']}@{b['host']}, {b['command']} for {b['time']}s, "
+                           f"{held}): {b['query'] or b['state'] or 'idle'}")
+
+    def run(self, operation: Callable[[], T], description: str, table: Optional[str] = None) -> T:
+        """Run `operation`, retrying it after lock wait timeouts with jittered exponential backoff."""
+        attempts = max(1, self.policy.retries)
+        attempt = 1
+        while True:
+            try:
+                return operation()
+            except Error as e:
+                if e.errno == STATEMENT_TIMEOUT:
+                    logger.error(f"{description} exceeded max_statement_time={self.policy.max_statement_time}s")
+                    raise
+                if e.errno != LOCK_WAIT_TIMEOUT:
+                    raise
+                logger.warning(f"{description} timed out waiting {self.policy.lock_wait_timeout}s for a lock"
+                               f"{f' on {table}' if table else ''} (attempt {attempt}/{attempts})")
+                self.log_blockers(table)
+                if attempt >= attempts:
+                    raise
+                delay = min(self.policy.max_delay, self.policy.base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                logger.info(f"Retrying in {delay:.1f}s")
+                time.sleep(delay)
+                with self.lock:
+                    self.retried += 1
+                attempt += 1
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Session counters sampled around each statement. Innodb_rows_* are server-wide in MariaDB,
+# so their deltas also include whatever else the server did meanwhile.
+STATUS_QUERY = (
+    "SHOW SESSION STATUS WHERE Variable_name LIKE 'Handler\\_%' OR Variable_name LIKE 'Innodb\\_rows\\_%'"
+)
+TOP_STATEMENTS = 10  # slowest statements per migration exported to Prometheus
+
+class StatementMetrics(NamedTuple):
+    number: int  # 1-based position in the script; the first statement for a batch
+    last: int  # last statement covered (== number unless batched)
+    sql: str  # first 200 characters, whitespace collapsed
+    mode: str  # serial, online, batch or parallel
+    seconds: float
+    rows: int
+    warnings: int
+    status: Dict[str, int]  # non-zero Handler_*/Innodb_rows_* deltas
+
+def preview(statement: str, length: int = 200) -> str:
+    """Single-line prefix of a statement for reports."""
+    text = ' '.join(statement.split())
+    return text if len(text) <= length else text[:length - 3] + '...'
+
+class StatementProfiler:
+    """
+    Measures statements on one connection: wall time plus the deltas of the Handler_* and
+    Innodb_rows_* status counters. Reading SHOW STATUS bumps some Handler counters itself;
+    that overhead is measured once by `calibrate()` and subtracted from every delta.
+    """
+
+    def __init__(self, connection, collect_status: bool = True):
+        self.connection = connection
+        self.collect_status = collect_status
+        self.overhead: Dict[str, int] = {}
+
+    def snapshot(self) -> Dict[str, int]:
+        """Current values of the sampled counters."""
+        if not self.collect_status:
+            return {}
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(STATUS_QUERY)
+            return {name: int(value) for name, value in cursor.fetchall() if str(value).lstrip('-').isdigit()}
+        finally:
+            cursor.close()
+
+    def calibrate(self) -> None:
+        """Measure what one SHOW STATUS adds to the counters."""
+        first = self.snapshot()
+        second = self.snapshot()
+        self.overhead = {k: v - first.get(k, 0) for k, v in second.items() if v - first.get(k, 0) > 0}
+
+    def begin(self) -> Tuple[float, Dict[str, int]]:
+        """Start measuring; returns a token for `end()`."""
+        return time.monotonic(), self.snapshot()
+
+    def end(self, token: Tuple[float, Dict[str, int]], number: int, statement: str, rows: int, warnings: int,
+            mode: str = 'serial', last: Optional[int] = None) -> StatementMetrics:
+        """Finish measuring the statement(s) started with `begin()`."""
+        started, before = token
+        seconds = time.monotonic() - started
+        after = self.snapshot()
+        status = {}
+        for name, value in after.items():
+            delta = value - before.get(name, 0) - self.overhead.get(name, 0)
+            if delta > 0:
+                status[name] = delta
+        return StatementMetrics(number, last or number, preview(statement), mode, seconds, max(rows, 0), max(warnings, 0), status)
+
+class MigrationMetrics:
+    """Statement metrics and totals of one migration run in one direction."""
+
+    def __init__(self, timestamp: str, name: str, direction: str):
+        self.timestamp = timestamp
+        self.name = name
+        self.direction = direction
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.monotonic()
+        self.seconds: Optional[float] = None
+        self.python_seconds = 0.0
+        self.success = False
+        self.error: Optional[str] = None
+        self.statements: List[StatementMetrics] = []
+
+    @property
+    def key(self) -> str:
+        """Migration identifier used in reports."""
+        return f"{self.timestamp}_{self.name}"
+
+    def add(self, metrics: StatementMetrics) -> None:
+        """Record one statement (or batch)."""
+        self.statements.append(metrics)
+
+    def finish(self, success: bool, error: Optional[str] = None) -> None:
+        """Stop the clock."""
+        self.seconds = time.monotonic() - self.started
+        self.success = success
+        self.error = error
+
+    def totals(self) -> Dict[str, int]:
+        """Sum of rows, warnings and status deltas over all statements."""
+        totals = {'rows': 0, 'warnings': 0}
+        for s in self.statements:
+            totals['rows'] += s.rows
+            totals['warnings'] += s.warnings
+            for name, value in s.status.items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    @property
+    def statement_count(self) -> int:
+        """Statements executed, counting every statement of a batch."""
+        return sum(s.last - s.number + 1 for s in self.statements)
+
+    def slowest(self, count: int = TOP_STATEMENTS) -> List[StatementMetrics]:
+        """The statements that took longest."""
+        return sorted(self.statements, key=lambda s: s.seconds, reverse=True)[:count]
+
+    def summary(self) -> str:
+        """One-line description for the log."""
+        totals = self.totals()
+        text = (f"{self.statement_count} statements, {totals['rows']} rows affected, {totals['warnings']} warnings"
+                f"{f', Python {self.python_seconds:.1f}s' if self.python_seconds else ''}")
+        slowest = self.slowest(1)
+        if slowest and slowest[0].seconds >= 0.01:
+            text += f"; slowest #{slowest[0].number} {slowest[0].seconds:.2f}s: {preview(slowest[0].sql, 60)}"
+        return text
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable form."""
+        return {
+            'migration': self.key,
+            'timestamp': self.timestamp,
+            'name': self.name,
+            'direction': self.direction,
+            'started_at': self.started_at.isoformat(),
+            'seconds': round(self.seconds, 6) if self.seconds is not None else None,
+            'python_seconds': round(self.python_seconds, 6),
+            'success': self.success,
+            'error': self.error,
+            'totals': self.totals(),
+            'statements': [dict(s._asdict(), seconds=round(s.seconds, 6)) for s in self.statements],
+        }
+
+def escape_label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def write_atomically(path: Path, text: str) -> None:
+    """Write via a temporary file and rename, so readers (e.g. node_exporter) never see a partial file."""
+    path = Path(path)
+    if path.parent and not path.parent.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+class RunReport:
+    """All migrations of one migrator run, written as a JSON report and a Prometheus textfile."""
+
+    def __init__(self, database: str):
+        self.database = database
+        self.started_at = datetime.now(timezone.utc)
+        self.migrations: List[MigrationMetrics] = []
+
+    def start(self, timestamp: str, name: str, direction: str) -> MigrationMetrics:
+        """Begin recording a migration."""
+        metrics = MigrationMetrics(timestamp, name, direction)
+        self.migrations.append(metrics)
+        return metrics
+
+    def latest(self) -> List[MigrationMetrics]:
+        """The last attempt of each migration and direction, in the order they were first run."""
+        return list({(m.key, m.direction): m for m in self.migrations}.values())
+
+    @property
+    def success(self) -> bool:
+        """True if the last attempt of every recorded migration completed (retries replace failed attempts)."""
+        return all(m.success for m in self.latest())
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable form."""
+        return {
+            'database': self.database,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': datetime.now(timezone.utc).isoformat(),
+            'success': self.success,
+            'migrations': [m.to_dict() for m in self.migrations],
+        }
+
+    def write_json(self, path: Path) -> None:
+        """Write the full report with every statement."""
+        write_atomically(path, json.dumps(self.to_dict(), indent=2, default=str) + '\n')
+        logger.info(f"Wrote run report to {path}")
+
+    def prometheus(self) -> str:
+        """
+        Render per-migration totals and the slowest statements in the Prometheus text format.
+        Only the last attempt of a retried migration is exported, so every series appears once.
+        """
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[Tuple[Dict[str, str], float]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{escape_label(str(v))}"' for k, v in labels.items())
+                number = str(value) if isinstance(value, int) else repr(float(value))
+                lines.append(f"{name}{{{label_text}}} {number}" if label_text else f"{name} {number}")
+
+        base = [({'database': self.database, 'migration': m.key, 'direction': m.direction}, m) for m in self.latest()]
+        metric('migrator_last_run_timestamp_seconds', 'gauge', 'Start time of the last migrator run.',
+               [({'database': self.database}, self.started_at.timestamp())])
+        metric('migrator_last_run_success', 'gauge', 'Whether every migration of the last run completed (1) or not (0).',
+               [({'database': self.database}, 1 if self.success else 0)])
+        metric('migrator_migration_duration_seconds', 'gauge', 'Wall time of a migration, SQL and Python.',
+               [(labels, m.seconds or 0) for labels, m in base])
+        metric('migrator_migration_success', 'gauge', 'Whether the migration completed (1) or failed (0).',
+               [(labels, 1 if m.success else 0) for labels, m in base])
+        metric('migrator_migration_statements', 'gauge', 'Statements executed by a migration.',
+               [(labels, m.statement_count) for labels, m in base])
+        metric('migrator_migration_rows_affected', 'gauge', 'Rows affected by the statements of a migration.',
+               [(labels, m.totals()['rows']) for labels, m in base])
+        metric('migrator_migration_warnings', 'gauge', 'Warnings raised by the statements of a migration.',
+               [(labels, m.totals()['warnings']) for labels, m in base])
+        metric('migrator_migration_status_delta', 'gauge', 'Change of Handler_*/Innodb_rows_* status counters during a migration.',
+               [(dict(labels, variable=name), value) for labels, m in base
+                for name, value in sorted(m.totals().items()) if name not in ('rows', 'warnings')])
+        metric('migrator_statement_duration_seconds', 'gauge', f'Wall time of the {TOP_STATEMENTS} slowest statements of a migration.',
+               [(dict(labels, statement=str(s.number)), s.seconds) for labels, m in base for s in m.slowest()])
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: Path) -> None:
+        """Write the textfile for node_exporter's textfile collector."""
+        write_atomically(path, self.prometheus())
+        logger.info(f"Wrote Prometheus metrics to {path}")
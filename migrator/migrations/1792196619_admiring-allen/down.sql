@@ -0,0 +1,8 @@
+-- Migration: admiring-allen
+-- Created On: 2026-10-17 00:23:39
+--
+-- DO NOT EDIT THIS FILE AFTER COMMIT
+-- CREATE A NEW MIGRATION INSTEAD
+--
+
+ALTER TABLE migrations DROP COLUMN duration_ms;
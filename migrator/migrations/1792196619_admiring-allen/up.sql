@@ -0,0 +1,10 @@
+-- Migration: admiring-allen
+-- Created On: 2026-10-17 00:23:39
+--
+-- DO NOT EDIT THIS FILE AFTER COMMIT
+-- CREATE A NEW MIGRATION INSTEAD
+--
+
+-- Wall time of each migration's last up run, written by the migrator
+ALTER TABLE migrations
+    ADD COLUMN duration_ms BIGINT UNSIGNED NULL COMMENT 'Duration of the last up run in milliseconds (SQL and Python)' AFTER applied_at;
@@ -0,0 +1,20 @@
+-- Migration: admiring-almeida
+-- Created On: 2026-10-17 00:47:59
+--
+-- DO NOT EDIT THIS FILE AFTER COMMIT
+-- CREATE A NEW MIGRATION INSTEAD
+--
+
+ALTER TABLE post_moderation_scores
+    ADD INDEX idx_post_moderation_scores_category_id (category_id),
+    DROP INDEX idx_post_moderation_scores_category_id_created_at,
+    DROP INDEX idx_post_moderation_scores_updated_at;
+ALTER TABLE posts
+    ADD INDEX idx_posts_community_id (community_id),
+    DROP INDEX idx_posts_community_id_created_at,
+    DROP INDEX idx_posts_updated_at;
+
+DROP TABLE IF EXISTS rollup_watermarks;
+DROP TABLE IF EXISTS moderation_action_rollups;
+DROP TABLE IF EXISTS moderation_score_rollups;
+DROP TABLE IF EXISTS post_rollups;
@@ -0,0 +1,78 @@
+-- Migration: admiring-almeida
+-- Created On: 2026-10-17 00:47:59
+--
+-- DO NOT EDIT THIS FILE AFTER COMMIT
+-- CREATE A NEW MIGRATION INSTEAD
+--
+
+-- Rollup tables for the dashboard statistics, filled and kept current by `migrator.py --refresh-rollups`.
+-- Days are UTC days of the source rows' created_at. The rollups hold derived data only: --rebuild-rollups
+-- recomputes them from the base tables and --check-rollups compares the two.
+
+-- Table: post_rollups
+-- Purpose: Posts per community and day, with their review and moderation status.
+-- Source: posts, re-aggregated per (community, day) for posts whose updated_at passed the watermark.
+CREATE TABLE IF NOT EXISTS post_rollups (
+    community_id BIGINT UNSIGNED NOT NULL,
+    day DATE NOT NULL COMMENT 'UTC day of posts.created_at',
+    post_count INT UNSIGNED NOT NULL DEFAULT 0,
+    reply_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'Posts with a parent_post_id',
+    flagged_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'review_status = 1 (FLAGGED)',
+    reviewed_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'review_status = 2 (REVIEWED)',
+    approved_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'moderation_status = 1 (APPROVED)',
+    hidden_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'moderation_status = 2 (HIDDEN)',
+    deleted_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'moderation_status = 3 (DELETED)',
+    PRIMARY KEY (community_id, day),
+    FOREIGN KEY (community_id) REFERENCES communities(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Table: moderation_score_rollups
+-- Purpose: Active moderation scores per community, category and day; averages are sum / score_count.
+-- Source: post_moderation_scores (is_active = 1), re-aggregated per (category, day) for scores whose updated_at passed the watermark.
+CREATE TABLE IF NOT EXISTS moderation_score_rollups (
+    community_id BIGINT UNSIGNED NOT NULL COMMENT 'moderation_categories.community_id of the category',
+    category_id BIGINT UNSIGNED NOT NULL,
+    day DATE NOT NULL COMMENT 'UTC day of post_moderation_scores.created_at',
+    score_count INT UNSIGNED NOT NULL DEFAULT 0,
+    human_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'Scores set by a user (created_by IS NOT NULL)',
+    score_sum DOUBLE NOT NULL DEFAULT 0,
+    confidence_sum DOUBLE NOT NULL DEFAULT 0,
+    reputation_delta_sum DOUBLE NOT NULL DEFAULT 0,
+    PRIMARY KEY (community_id, category_id, day),
+    INDEX idx_moderation_score_rollups_category_id (category_id),
+    FOREIGN KEY (community_id) REFERENCES communities(id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES moderation_categories(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Table: moderation_action_rollups
+-- Purpose: Moderation actions per community, action type and day.
+-- Source: moderation_logs, which is append-only: new rows past the id watermark are added to the counts.
+-- Notes: No foreign key, so counts outlive the log rows that --prune and partition rotation remove; community_id 0 holds global actions.
+CREATE TABLE IF NOT EXISTS moderation_action_rollups (
+    community_id BIGINT UNSIGNED NOT NULL DEFAULT 0 COMMENT '0 for global actions (moderation_logs.community_id IS NULL)',
+    action_type VARCHAR(30) NOT NULL,
+    day DATE NOT NULL COMMENT 'UTC day of moderation_logs.created_at',
+    action_count INT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY (community_id, action_type, day)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Table: rollup_watermarks
+-- Purpose: How far each rollup table has been brought up to date.
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    name VARCHAR(64) NOT NULL PRIMARY KEY COMMENT 'Rollup table',
+    watermark_at TIMESTAMP NULL COMMENT 'Source rows updated up to this time are rolled up (mutable sources)',
+    watermark_id BIGINT UNSIGNED NULL COMMENT 'Source rows up to this id are rolled up (append-only sources)',
+    refreshed_at TIMESTAMP NULL,
+    rebuilt_at TIMESTAMP NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Incremental refreshes find changed rows by updated_at and re-aggregate a (community or category, day)
+-- group by range; the (group, created_at) indexes replace the single-column ones they start with.
+ALTER TABLE posts
+    ADD INDEX idx_posts_updated_at (updated_at),
+    ADD INDEX idx_posts_community_id_created_at (community_id, created_at),
+    DROP INDEX idx_posts_community_id;
+ALTER TABLE post_moderation_scores
+    ADD INDEX idx_post_moderation_scores_updated_at (updated_at),
+    ADD INDEX idx_post_moderation_scores_category_id_created_at (category_id, created_at),
+    DROP INDEX idx_post_moderation_scores_category_id;
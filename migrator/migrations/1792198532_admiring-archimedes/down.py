@@ -0,0 +1,10 @@
+# Migration: admiring-archimedes
+# Created On: 2026-10-17 00:55:32
+#
+# DO NOT EDIT THIS FILE AFTER COMMIT
+# CREATE A NEW MIGRATION INSTEAD
+#
+
+def run(ctx):
+    """Forget the backfill so applying the migration again fills model_id again."""
+    ctx.reset_backfill('model_id')
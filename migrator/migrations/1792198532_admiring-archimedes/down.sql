@@ -0,0 +1,21 @@
+-- Migration: admiring-archimedes
+-- Created On: 2026-10-17 00:55:32
+--
+-- DO NOT EDIT THIS FILE AFTER COMMIT
+-- CREATE A NEW MIGRATION INSTEAD
+--
+
+-- migrator:serial
+DROP VIEW IF EXISTS post_moderation_scores_compat;
+DROP TRIGGER IF EXISTS post_moderation_scores_model_upd;
+DROP TRIGGER IF EXISTS post_moderation_scores_model_ins;
+
+ALTER TABLE post_moderation_scores
+    DROP FOREIGN KEY IF EXISTS fk_post_moderation_scores_model_id,
+    DROP FOREIGN KEY IF EXISTS _fk_post_moderation_scores_model_id,
+    DROP INDEX idx_post_moderation_scores_model_id,
+    DROP COLUMN model_id,
+    ALTER COLUMN model_type DROP DEFAULT,
+    ALTER COLUMN model_version DROP DEFAULT;
+
+DROP TABLE IF EXISTS moderation_models;
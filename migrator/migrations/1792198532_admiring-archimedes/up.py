@@ -0,0 +1,34 @@
+# Migration: admiring-archimedes
+# Created On: 2026-10-17 00:55:32
+#
+# DO NOT EDIT THIS FILE AFTER COMMIT
+# CREATE A NEW MIGRATION INSTEAD
+#
+
+MATCH = ("m.model_type = s.model_type COLLATE utf8mb4_bin "
+         "AND m.model_version = s.model_version COLLATE utf8mb4_bin")
+
+def fill_chunk(cursor, start, end):
+    """Register the chunk's unseen models, then point its rows at them, keeping updated_at."""
+    cursor.execute(
+        "INSERT IGNORE INTO moderation_models (model_type, model_version) "
+        "SELECT DISTINCT s.model_type, s.model_version FROM post_moderation_scores s "
+        f"LEFT JOIN moderation_models m ON {MATCH} "
+        "WHERE s.id > %s AND s.id <= %s AND s.model_id IS NULL AND m.id IS NULL",
+        (start, end)
+    )
+    cursor.execute(
+        f"UPDATE post_moderation_scores s JOIN moderation_models m ON {MATCH} "
+        "SET s.model_id = m.id, s.updated_at = s.updated_at "
+        "WHERE s.id > %s AND s.id <= %s AND s.model_id IS NULL",
+        (start, end)
+    )
+    return max(cursor.rowcount, 0)
+
+def run(ctx):
+    """Backfill model_id of the rows written before the triggers existed."""
+    ctx.backfill('model_id', 'post_moderation_scores', apply=fill_chunk, where='model_id IS NULL',
+                 chunk_size=5000, max_chunk_size=20000, target_latency=0.5)
+    missing = ctx.query("SELECT COUNT(*) AS count FROM post_moderation_scores WHERE model_id IS NULL")[0]['count']
+    if missing:
+        raise RuntimeError(f"{missing} post_moderation_scores rows still have no model_id")
@@ -0,0 +1,83 @@
+-- Migration: admiring-archimedes
+-- Created On: 2026-10-17 00:55:32
+--
+-- DO NOT EDIT THIS FILE AFTER COMMIT
+-- CREATE A NEW MIGRATION INSTEAD
+--
+
+-- migrator:serial
+-- Moves the model strings of post_moderation_scores into the moderation_models lookup table, first step.
+-- This migration adds a nullable model_id, keeps it and the strings in sync with triggers while old and
+-- new writers overlap, and backfills existing rows in chunks (up.py). The follow-up migration
+-- (admiring-austin) makes model_id NOT NULL, rebuilds the unique key on it and drops the strings online.
+-- Deploy readers on post_moderation_scores_compat and writers on model_id between the two.
+
+-- Table: moderation_models
+-- Purpose: One row per scoring model; post_moderation_scores references it by a 2-byte id.
+-- Notes: Binary collation so distinct spellings keep distinct ids and read back exactly as written.
+CREATE TABLE IF NOT EXISTS moderation_models (
+    id SMALLINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    model_type VARCHAR(20) COLLATE utf8mb4_bin NOT NULL COMMENT 'ML model type (e.g., grok, custom)',
+    model_version VARCHAR(50) COLLATE utf8mb4_bin NOT NULL COMMENT 'ML model version (e.g., grok-beta)',
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE idx_moderation_models_model_type_model_version (model_type, model_version)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Writers that already set model_id may omit the strings; the triggers fill them in
+ALTER TABLE post_moderation_scores
+    ALTER COLUMN model_type SET DEFAULT '',
+    ALTER COLUMN model_version SET DEFAULT '';
+
+-- With foreign_key_checks disabled the foreign key is added in place; the new column is all NULL.
+-- The constraint is named so down.sql can drop it (online changes toggle a leading underscore on it).
+SET foreign_key_checks = 0;
+ALTER TABLE post_moderation_scores
+    ADD COLUMN model_id SMALLINT UNSIGNED NULL COMMENT 'Scoring model (moderation_models.id)' AFTER context_notes,
+    ADD INDEX idx_post_moderation_scores_model_id (model_id),
+    ADD CONSTRAINT fk_post_moderation_scores_model_id FOREIGN KEY (model_id) REFERENCES moderation_models(id);
+SET foreign_key_checks = 1;
+
+-- Until the strings are dropped, rows written with only the strings get their model_id (registering new
+-- models on first use) and rows written with only model_id get the strings.
+DELIMITER $$
+CREATE TRIGGER post_moderation_scores_model_ins BEFORE INSERT ON post_moderation_scores FOR EACH ROW
+BEGIN
+    IF NEW.model_id IS NULL THEN
+        SET NEW.model_id = (SELECT id FROM moderation_models
+                            WHERE model_type = NEW.model_type COLLATE utf8mb4_bin AND model_version = NEW.model_version COLLATE utf8mb4_bin);
+        IF NEW.model_id IS NULL THEN
+            INSERT IGNORE INTO moderation_models (model_type, model_version) VALUES (NEW.model_type, NEW.model_version);
+            SET NEW.model_id = (SELECT id FROM moderation_models
+                                WHERE model_type = NEW.model_type COLLATE utf8mb4_bin AND model_version = NEW.model_version COLLATE utf8mb4_bin);
+        END IF;
+    ELSEIF NEW.model_version = '' THEN
+        SELECT model_type, model_version INTO NEW.model_type, NEW.model_version FROM moderation_models WHERE id = NEW.model_id;
+    END IF;
+END$$
+CREATE TRIGGER post_moderation_scores_model_upd BEFORE UPDATE ON post_moderation_scores FOR EACH ROW
+BEGIN
+    IF NOT (NEW.model_type <=> OLD.model_type AND NEW.model_version <=> OLD.model_version) THEN
+        IF NEW.model_id <=> OLD.model_id THEN
+            SET NEW.model_id = (SELECT id FROM moderation_models
+                                WHERE model_type = NEW.model_type COLLATE utf8mb4_bin AND model_version = NEW.model_version COLLATE utf8mb4_bin);
+            IF NEW.model_id IS NULL THEN
+                INSERT IGNORE INTO moderation_models (model_type, model_version) VALUES (NEW.model_type, NEW.model_version);
+                SET NEW.model_id = (SELECT id FROM moderation_models
+                                    WHERE model_type = NEW.model_type COLLATE utf8mb4_bin AND model_version = NEW.model_version COLLATE utf8mb4_bin);
+            END IF;
+        END IF;
+    ELSEIF OLD.model_id IS NOT NULL AND NEW.model_id IS NOT NULL AND NEW.model_id <> OLD.model_id THEN
+        SELECT model_type, model_version INTO NEW.model_type, NEW.model_version FROM moderation_models WHERE id = NEW.model_id;
+    END IF;
+END$$
+DELIMITER ;
+
+-- View: post_moderation_scores_compat
+-- Purpose: post_moderation_scores with its original columns, for readers not yet joining moderation_models.
+-- Notes: Complete once up.py has backfilled model_id; unaffected by the follow-up migration.
+CREATE OR REPLACE VIEW post_moderation_scores_compat AS
+SELECT s.id, s.post_id, s.category_id, s.score, s.confidence, s.reputation_delta, s.context_notes,
+       m.model_type, m.model_version, s.training_label, s.created_by, s.last_updated_by, s.is_active,
+       s.created_at, s.updated_at
+FROM post_moderation_scores s
+JOIN moderation_models m ON m.id = s.model_id;
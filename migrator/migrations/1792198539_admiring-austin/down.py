@@ -0,0 +1,39 @@
+# Migration: admiring-austin
+# Created On: 2026-10-17 00:55:39
+#
+# DO NOT EDIT THIS FILE AFTER COMMIT
+# CREATE A NEW MIGRATION INSTEAD
+#
+
+from pathlib import Path
+from tokenizer import iter_sql_statements
+
+# The sync triggers of the previous migration, recreated for as long as the strings are back
+TRIGGERS_SCRIPT = Path(__file__).resolve().parent.parent / '1792198532_admiring-archimedes' / 'up.sql'
+
+def run(ctx):
+    """Add the strings back, refill them from moderation_models in chunks, then restore their keys."""
+    ctx.execute(
+        "ALTER TABLE post_moderation_scores "
+        "ADD COLUMN IF NOT EXISTS model_type VARCHAR(20) NOT NULL DEFAULT '' COMMENT 'ML model type (e.g., grok, custom)' AFTER model_id, "
+        "ADD COLUMN IF NOT EXISTS model_version VARCHAR(50) NOT NULL DEFAULT '' COMMENT 'ML model version (e.g., grok-beta)' AFTER model_type"
+    )
+    with open(TRIGGERS_SCRIPT, 'r') as f:
+        for statement in iter_sql_statements(f):
+            if statement.lstrip().upper().startswith('CREATE TRIGGER'):
+                ctx.execute(statement.replace('CREATE TRIGGER', 'CREATE OR REPLACE TRIGGER', 1))
+    ctx.backfill(
+        'model_strings', 'post_moderation_scores',
+        sql="UPDATE post_moderation_scores s JOIN moderation_models m ON m.id = s.model_id "
+            "SET s.model_type = m.model_type, s.model_version = m.model_version, s.updated_at = s.updated_at "
+            "WHERE s.id > %(start)s AND s.id <= %(end)s AND s.model_version = ''",
+        where="model_version = ''", chunk_size=5000, max_chunk_size=20000, target_latency=0.5
+    )
+    ctx.execute(
+        "ALTER TABLE post_moderation_scores "
+        "MODIFY model_id SMALLINT UNSIGNED NULL COMMENT 'Scoring model (moderation_models.id)', "
+        "DROP INDEX idx_post_moderation_scores_post_id_category_id_model_id, "
+        "ADD UNIQUE post_id (post_id, category_id, model_version) COMMENT 'One score per post per category per model', "
+        "ADD INDEX idx_post_moderation_scores_model_type (model_type)"
+    )
+    ctx.reset_backfill('model_strings')
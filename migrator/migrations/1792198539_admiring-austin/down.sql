@@ -0,0 +1,9 @@
+-- Migration: admiring-austin
+-- Created On: 2026-10-17 00:55:39
+--
+-- DO NOT EDIT THIS FILE AFTER COMMIT
+-- CREATE A NEW MIGRATION INSTEAD
+--
+
+-- Reverted by down.py: the strings have to be refilled between adding their columns back and
+-- restoring the unique key on model_version.
@@ -0,0 +1,23 @@
+-- Migration: admiring-austin
+-- Created On: 2026-10-17 00:55:39
+--
+-- DO NOT EDIT THIS FILE AFTER COMMIT
+-- CREATE A NEW MIGRATION INSTEAD
+--
+
+-- migrator:online tables=post_moderation_scores
+-- Second step of moving the model strings into moderation_models (see admiring-archimedes): every row
+-- has a model_id now, so the strings and their index go and the unique key is rebuilt on the id.
+-- Applied online, on a shadow copy; writers must set model_id and readers of the strings must use
+-- post_moderation_scores_compat before this runs.
+ALTER TABLE post_moderation_scores
+    MODIFY model_id SMALLINT UNSIGNED NOT NULL COMMENT 'Scoring model (moderation_models.id)',
+    DROP INDEX post_id,
+    ADD UNIQUE idx_post_moderation_scores_post_id_category_id_model_id (post_id, category_id, model_id) COMMENT 'One score per post per category per model',
+    DROP INDEX idx_post_moderation_scores_model_type,
+    DROP COLUMN model_type,
+    DROP COLUMN model_version;
+
+-- The sync triggers went with the previous table; these only matter if it was kept
+DROP TRIGGER IF EXISTS post_moderation_scores_model_upd;
+DROP TRIGGER IF EXISTS post_moderation_scores_model_ins;
@@ -1,15 +1,39 @@
 import os
 import re
+import sys
 import time
 import logging
 import argparse
-from typing import List, Dict, Optional
-from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime, timezone
 from mysql.connector import Error, connect
 from retrying import retry
 from pathlib import Path
 from names import ADJECTIVES, LAST_NAMES
 from tabulate import tabulate
+from tokenizer import iter_sql_statements, quote_identifier, read_directives
+from online import OnlineSchemaChange, parse_alter_table
+from executor import BatchExecutor, ParallelExecutor, analyze_statement, coalesce_batches
+from checkpoints import StatementCheckpoints
+from backfill import MigrationContext, format_duration, run_python_migration
+from partitions import PARTITIONED_TABLES, PartitionManager
+from prune import PRUNE_TARGETS, Pruner
+from rollups import ROLLUP_LAG, ROLLUPS, RollupRefresher
+from output import FORMATS, READ_QUERY_PREFIXES, Progress, RowWriter, print_table
+from shell import DEFAULT_POOL_SIZE, Session
+from service import DEFAULT_PORT, serve
+from fleet import DEFAULT_FLEET_JOBS, DEFAULT_LOG_DIR, DEFAULT_MAX_FAILURE_RATE, DEFAULT_PER_HOST, Fleet, print_summary, read_inventory
+from transfer import Exporter, Importer
+from synthetic import MODEL_COLUMNS, SCORE_MODEL, TABLES as SYNTHETIC_TABLES, Plan, SyntheticDataset
+from schema_model import SchemaModel
+from fingerprint import check_schema, live_fingerprint
+from rehearsal import DEFAULT_SAMPLE_ROWS, ScratchSchema, extrapolate
+from squash import SchemaDump, baseline_path, find_baseline, write_baseline
+from lint import lint, load_lint_baseline, write_lint_baseline
+from preflight import DEFAULT_MAX_COPY_ROWS, Assessment, Preflight, TableSize
+from lockguard import LockGuard, LockPolicy
+from benchmark import Benchmark, compare, latest, load_results, print_results, write_results
+from metrics import MigrationMetrics, RunReport, StatementMetrics, StatementProfiler, preview
 
 # Configure logging
 logging.basicConfig(
@@ -19,116 +43,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def strip_sql_comments(sql: str) -> str:
-    """Remove SQL comments (-- and /* */) while preserving SQL structure."""
-    result = []
-    i = 0
-    in_single_quote = False
-    in_double_quote = False
-    in_line_comment = False
-    in_multi_comment = False
-
-    while i < len(sql):
-        char = sql[i]
-
-        # Handle string literals
-        if char == "'" and not in_double_quote and not in_line_comment and not in_multi_comment:
-            in_single_quote = not in_single_quote
-            result.append(char)
-            i += 1
-            continue
-        if char == '"' and not in_single_quote and not in_line_comment and not in_multi_comment:
-            in_double_quote = not in_double_quote
-            result.append(char)
-            i += 1
-            continue
-
-        # Skip if inside a string
-        if in_single_quote or in_double_quote:
-            result.append(char)
-            i += 1
-            continue
-
-        # Handle line comments (--)
-        if char == '-' and i + 1 < len(sql) and sql[i + 1] == '-' and not in_multi_comment:
-            in_line_comment = True
-            i += 2
-            continue
-        if in_line_comment and char == '\n':
-            in_line_comment = False
-            result.append(char)
-            i += 1
-            continue
-        if in_line_comment:
-            i += 1
-            continue
-
-        # Handle multi-line comments (/* */)
-        if char == '/' and i + 1 < len(sql) and sql[i + 1] == '*' and not in_line_comment:
-            in_multi_comment = True
-            i += 2
-            continue
-        if in_multi_comment and char == '*' and i + 1 < len(sql) and sql[i + 1] == '/':
-            in_multi_comment = False
-            i += 2
-            continue
-        if in_multi_comment:
-            i += 1
-            continue
-
-        # Append non-comment characters
-        result.append(char)
-        i += 1
-
-    cleaned_sql = ''.join(result)
-    # Remove empty lines but preserve newlines within statements
-    lines = [line for line in cleaned_sql.splitlines() if line.strip()]
-    cleaned_sql = '\n'.join(lines)
-    logger.debug(f"Cleaned SQL:\n{cleaned_sql}")
-    return cleaned_sql.strip()
-
-def split_sql_statements(sql: str) -> List[str]:
-    """Split SQL into statements, preserving semicolons and respecting quoted strings."""
-    statements = []
-    current = []
-    in_single_quote = False
-    in_double_quote = False
-    i = 0
-
-    while i < len(sql):
-        char = sql[i]
-
-        # Handle string literals
-        if char == "'" and not in_double_quote:
-            in_single_quote = not in_single_quote
-            current.append(char)
-            i += 1
-            continue
-        if char == '"' and not in_single_quote:
-            in_double_quote = not in_double_quote
-            current.append(char)
-            i += 1
-            continue
-
-        # Handle semicolons outside quotes
-        if char == ';' and not in_single_quote and not in_double_quote:
-            current.append(char)  # Include the semicolon in the statement
-            statement = ''.join(current).strip()
-            if statement:
-                statements.append(statement)
-            current = []
-            i += 1
-            continue
-
-        current.append(char)
-        i += 1
-
-    # Add final statement if any
-    statement = ''.join(current).strip()
-    if statement:
-        statements.append(statement)
-
-    return statements
+LINT_BASELINE = Path('lint-baseline.txt')
+TABLE_MAX_ROWS = 1000  # larger results need a streaming --format
+STREAM_FETCH_SIZE = 1000
+
+class MigrationState:
+    """
+    Snapshot of everything a command needs to plan migrations: the migration directories on
+    disk, the applied rows of the migrations table and whether the schema has any tables.
+    Built once per command and refreshed only after a migration is applied.
+    """
+
+    def __init__(self, available: List[Dict], applied: List[Dict], table_count: int, has_migrations_table: bool):
+        self.available = available
+        self.applied = applied
+        self.table_count = table_count
+        self.has_migrations_table = has_migrations_table
+
+    @property
+    def migrations(self) -> List[Dict]:
+        """All available migrations with their status."""
+        applied_dict = {f"{m['timestamp']}_{m['name']}": m for m in self.applied}
+        migrations = []
+        for mig in self.available:
+            key = f"{mig['timestamp']}_{mig['name']}"
+            status = applied_dict.get(key, {}).get('status', 0)  # 0=PENDING
+            applied_at = applied_dict.get(key, {}).get('applied_at')
+            migrations.append({
+                'timestamp': mig['timestamp'],
+                'name': mig['name'],
+                'status': ['PENDING', 'APPLIED', 'FAILED'][status],
+                'applied_at': applied_at
+            })
+        return migrations
 
 class Migrator:
     def __init__(self):
@@ -140,7 +87,11 @@ class Migrator:
             'database': os.getenv('DB_NAME', 'xmod')
         }
         self.migrations_dir = Path('migrations')
+        self.baselines_dir = Path('baselines')
         self.connection = None
+        self.state: Optional[MigrationState] = None
+        self.resume_pending = set()  # (timestamp, direction) of failed attempts that retries resume
+        self.report = RunReport(self.db_config['database'])
 
     @retry(stop_max_attempt_number=3, wait_exponential_multiplier=1000, wait_exponential_max=10000)
     def connect(self) -> None:
@@ -158,6 +109,7 @@ class Migrator:
             self.connection.close()
             logger.info("Database connection closed")
             self.connection = None
+        self.state = None
 
     def ensure_connected(self) -> bool:
         """Ensure database connection is established."""
@@ -170,83 +122,92 @@ class Migrator:
                 return False
         return True
 
-    def get_applied_migrations(self) -> List[Dict]:
-        """Retrieve applied migrations from the migrations table."""
-        if not self.ensure_connected():
-            logger.debug("No database connection; assuming no applied migrations")
-            return []
-        try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute("SELECT timestamp, name, status, applied_at FROM migrations WHERE status = 1 ORDER BY timestamp")
-            migrations = cursor.fetchall()
-            cursor.close()
-            return migrations
-        except Error as e:
-            if e.errno == 1146:  # Table doesn't exist
-                logger.debug("Migrations table does not exist; no applied migrations")
-                return []
-            logger.error(f"Error retrieving applied migrations: {e}")
-            return []
-
-    def check_tables_exist(self) -> bool:
-        """Check if any tables exist in the database."""
+    def query_state(self) -> Tuple[int, bool, List[Dict]]:
+        """
+        Fetch the table count, presence of the migrations table and the applied migrations
+        in a single round trip. Returns (0, False, []) without a database connection.
+        """
         if not self.ensure_connected():
-            logger.debug("No database connection; assuming no tables exist")
-            return False
+            logger.debug("No database connection; assuming no tables and no applied migrations")
+            return 0, False, []
+        cursor = self.connection.cursor(dictionary=True)
         try:
-            cursor = self.connection.cursor()
             cursor.execute(
-                "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = %s",
+                "SELECT COUNT(*) AS table_count, COALESCE(SUM(table_name = 'migrations'), 0) AS has_migrations "
+                "FROM information_schema.tables WHERE table_schema = %s; "
+                "SELECT timestamp, name, status, applied_at FROM migrations WHERE status = 1 ORDER BY timestamp",
                 (self.db_config['database'],)
             )
-            count = cursor.fetchone()[0]
-            cursor.close()
-            logger.info(f"Found {count} tables in database")
-            return count > 0
+            summary = cursor.fetchone()
+            cursor.fetchall()
+            table_count, has_migrations = int(summary['table_count']), bool(summary['has_migrations'])
+            applied = []
+            try:
+                if cursor.nextset():
+                    applied = cursor.fetchall()
+            except Error as e:
+                if e.errno != 1146:  # Table doesn't exist
+                    raise
+                logger.debug("Migrations table does not exist; no applied migrations")
+            return table_count, has_migrations, applied
         except Error as e:
-            logger.error(f"Error checking table existence: {e}")
-            return False
+            logger.error(f"Error loading migration state: {e}")
+            return 0, False, []
+        finally:
+            cursor.close()
+
+    def load_state(self) -> MigrationState:
+        """Return the migration state snapshot, building it on first use."""
+        if self.state is None:
+            available = self.list_available_migrations()
+            table_count, has_migrations_table, applied = self.query_state()
+            self.state = MigrationState(available, applied, table_count, has_migrations_table)
+        return self.state
+
+    def refresh_state(self) -> None:
+        """Re-read the database part of the snapshot after a migration was applied."""
+        if self.state is None:
+            return
+        table_count, has_migrations_table, applied = self.query_state()
+        self.state.table_count = table_count
+        self.state.has_migrations_table = has_migrations_table
+        self.state.applied = applied
+
+    def get_applied_migrations(self) -> List[Dict]:
+        """Retrieve applied migrations from the migrations table."""
+        return self.load_state().applied
+
+    def check_tables_exist(self) -> bool:
+        """Check if any tables exist in the database."""
+        count = self.load_state().table_count
+        logger.info(f"Found {count} tables in database")
+        return count > 0
 
     def validate_schema(self, full_validation: bool = False) -> bool:
-        """Validate schema integrity (tables, foreign keys)."""
+        """
+        Validate the schema: without `full_validation` only that the migrations table exists;
+        with it, that the fingerprint of the live tables, columns, indexes and foreign keys
+        matches the one the applied migrations produce (a diff is logged on mismatch).
+        """
+        if not full_validation:
+            return self.load_state().has_migrations_table
         if not self.ensure_connected():
             logger.debug("No database connection; schema validation skipped")
             return False
         try:
-            cursor = self.connection.cursor()
-            if not full_validation:
-                cursor.execute(
-                    "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = %s AND table_name = 'migrations'",
-                    (self.db_config['database'],)
-                )
-                count = cursor.fetchone()[0]
-                cursor.close()
-                return count == 1
-            else:
-                cursor.execute(
-                    "SELECT COUNT(*) FROM information_schema.table_constraints "
-                    "WHERE constraint_type = 'FOREIGN KEY' AND table_schema = %s",
-                    (self.db_config['database'],)
-                )
-                fk_count = cursor.fetchone()[0]
-                cursor.execute(
-                    "SELECT COUNT(*) FROM information_schema.tables "
-                    "WHERE table_schema = %s AND table_name IN (%s)",
-                    (self.db_config['database'], ','.join([
-                        'migrations', 'users', 'community_members', 'posts', 'post_embeddings',
-                        'post_moderation_categories', 'user_bans', 'user_warnings',
-                        'notifications', 'oauth_sessions', 'moderation_actions',
-                        'appeals', 'user_reputation_logs', 'logs', 'moderation_categories',
-                        'user_notes', 'settings', 'community_settings'
-                    ]))
-                )
-                table_count = cursor.fetchone()[0]
-                cursor.close()
-                logger.info(f"Schema validation: {fk_count} foreign keys, {table_count}/18 expected tables")
-                return fk_count > 0 and table_count == 18
+            version = self.schema_version()
+            result = check_schema(self.connection, self.db_config['database'], self.schema_model(version))
         except Error as e:
             logger.error(f"Error validating schema: {e}")
             return False
+        if result.matches:
+            logger.info(f"Schema matches migrations up to {version}: fingerprint {result.actual}")
+            return True
+        logger.error(f"Schema drift: expected fingerprint {result.expected} (migrations up to {version}), "
+                     f"found {result.actual}")
+        for line in result.diff:
+            logger.error(line)
+        return False
 
     def check_data_loss(self, script_path: Path) -> bool:
         """Check if a migration script contains data-loss operations."""
@@ -272,8 +233,8 @@ class Migrator:
         logger.warning(f"No unused migration names available; using fallback: migration-{timestamp}")
         return f"migration-{timestamp}"
 
-    def create_migration(self, non_interactive: bool = False) -> None:
-        """Create a new migration with an automatically assigned name."""
+    def create_migration(self, non_interactive: bool = False, python: bool = False) -> None:
+        """Create a new migration with an automatically assigned name, optionally with up.py/down.py."""
         name = self.get_next_migration_name()
         timestamp = str(int(time.time()))
         migration_dir = self.migrations_dir / f"{timestamp}_{name}"
@@ -296,7 +257,18 @@ class Migrator:
         )
         up_path.write_text(template)
         down_path.write_text(template)
-        logger.info(f"Created migration: {migration_dir} with up.sql and down.sql")
+        if python:
+            python_template = template.replace('-- ', '# ').replace('--\n', '#\n') + (
+                "\n"
+                "def run(ctx):\n"
+                "    \"\"\"Called after the SQL script going up and before it going down.\"\"\"\n"
+                "    # ctx.backfill('name', 'table', sql=\"UPDATE table SET ... WHERE id > %(start)s AND id <= %(end)s\")\n"
+                "    pass\n"
+            )
+            (migration_dir / 'up.py').write_text(python_template)
+            (migration_dir / 'down.py').write_text(python_template)
+        self.state = None
+        logger.info(f"Created migration: {migration_dir} with up.sql and down.sql" + (" plus up.py and down.py" if python else ""))
 
     def list_available_migrations(self) -> List[Dict]:
         """List all valid migration directories from the filesystem."""
@@ -309,41 +281,347 @@ class Migrator:
                 match = re.match(r'^(\d+)_([a-z0-9-]+)$', d.name)
                 if match:
                     timestamp, name = match.groups()
-                    up_file = d / 'up.sql'
-                    down_file = d / 'down.sql'
-                    if up_file.exists() and down_file.exists():
+                    has_up = (d / 'up.sql').exists() or (d / 'up.py').exists()
+                    has_down = (d / 'down.sql').exists() or (d / 'down.py').exists()
+                    if has_up and has_down:
                         available.append({'timestamp': timestamp, 'name': name})
                     else:
-                        logger.warning(f"Skipping migration {d.name}: missing up.sql or down.sql")
+                        logger.warning(f"Skipping migration {d.name}: missing up.sql/up.py or down.sql/down.py")
                 else:
                     logger.debug(f"Skipping directory {d.name}: does not match timestamp_adj-last pattern")
         return sorted(available, key=lambda x: int(x['timestamp']))
 
+    def schema_model(self, upto: Optional[str] = None) -> SchemaModel:
+        """Replay the up.sql scripts (up to and including timestamp `upto`) into an offline schema model."""
+        paths = []
+        for mig in self.list_available_migrations():
+            if upto and int(mig['timestamp']) > int(upto):
+                break
+            migration_dir = self.migrations_dir / f"{mig['timestamp']}_{mig['name']}"
+            if (migration_dir / 'up.py').exists():
+                logger.debug(f"Schema model does not see changes made by {migration_dir / 'up.py'}")
+            if (migration_dir / 'up.sql').exists():
+                paths.append(migration_dir / 'up.sql')
+        model = SchemaModel.from_scripts(paths)
+        if model.skipped:
+            logger.debug(f"Schema model skipped {model.skipped} unrecognized statements")
+        return model
+
+    def lint(self, baseline: Path = LINT_BASELINE, update_baseline: bool = False) -> bool:
+        """
+        Check the schema the migrations produce for duplicate and prefix-redundant indexes and
+        foreign keys without a declared index. Returns False if there are findings not in the baseline.
+        """
+        findings = lint(self.schema_model())
+        if update_baseline:
+            write_lint_baseline(baseline, findings)
+            logger.info(f"Wrote {len(findings)} findings to {baseline}")
+            return True
+        accepted = load_lint_baseline(baseline)
+        new = [f for f in findings if f.key not in accepted]
+        for finding in findings:
+            marker = 'NEW' if finding in new else 'baseline'
+            print(f"[{marker}] {finding.key}: {finding.message}")
+        fixed = accepted - {f.key for f in findings}
+        if fixed:
+            logger.info(f"{len(fixed)} baseline findings no longer occur; run --update-lint-baseline to drop them")
+        logger.info(f"Lint: {len(findings)} findings, {len(new)} new")
+        return not new
+
+    def table_sizes(self) -> Dict[str, TableSize]:
+        """Estimated row count and data/index length of every table, from information_schema.TABLES."""
+        if not self.ensure_connected():
+            raise RuntimeError("Database connection failed")
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(
+                "SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'",
+                (self.db_config['database'],)
+            )
+            return {name: TableSize(int(rows or 0), int(data or 0), int(index or 0)) for name, rows, data, index in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    def assess_migrations(self, to_apply: List[Tuple[str, str]], current: int, max_copy_rows: int = DEFAULT_MAX_COPY_ROWS,
+                          allow_copy: bool = False) -> List[Assessment]:
+        """Classify the statements of the up.sql scripts in `to_apply`, starting from the schema at version `current`."""
+        model = self.schema_model(upto=str(current)) if current else SchemaModel()
+        preflight = Preflight(model, self.table_sizes(), max_copy_rows, allow_copy)
+        assessments = []
+        for timestamp, name in to_apply:
+            script_path = self.migrations_dir / f"{timestamp}_{name}" / 'up.sql'
+            if script_path.exists():
+                assessments.extend(preflight.assess_script(script_path, f"{timestamp}_{name}"))
+        return assessments
+
+    def print_assessments(self, assessments: List[Assessment]) -> None:
+        """Print the preflight report as a grid."""
+        table_data = [{
+            'Migration': a.migration,
+            '#': a.number,
+            'Table': a.table or '',
+            'Operation': a.operation,
+            'Algorithm': a.cost.algorithm,
+            'Lock': a.cost.lock,
+            'Rows': a.size.rows,
+            'Size (MB)': f"{(a.size.data_length + a.size.index_length) / 1048576:.1f}",
+            'Estimate': format_duration(a.seconds) if a.seconds else '-',
+            'Note': ('BLOCKED: ' if a.blocked else '') + a.cost.note,
+        } for a in assessments]
+        print(tabulate(table_data, headers="keys", tablefmt="grid"))
+
+    def check_assessments(self, assessments: List[Assessment], max_copy_rows: int, report: bool = False) -> None:
+        """Warn about costly statements and refuse to continue if any COPY is blocked."""
+        blocked = [a for a in assessments if a.blocked]
+        if report or blocked:
+            self.print_assessments(assessments)
+        for a in assessments:
+            if not a.blocked and a.size.rows and (a.cost.algorithm == 'COPY' or a.cost.lock in ('SHARED', 'EXCLUSIVE')):
+                logger.warning(f"{a.migration} statement {a.number}: {a.operation} on {a.table} is {a.cost.algorithm} "
+                               f"with LOCK={a.cost.lock} (~{a.size.rows} rows, est. {format_duration(a.seconds)})")
+        total = sum(a.seconds for a in assessments)
+        logger.info(f"Preflight: {len(assessments)} statements, estimated {format_duration(total)}, {len(blocked)} blocked")
+        if blocked:
+            raise ValueError(
+                f"{len(blocked)} statements would copy tables with more than {max_copy_rows} rows; use online mode "
+                f"(-- migrator:online), add '-- migrator:allow-copy' to the script or rerun with --allow-copy"
+            )
+
+    def pending_migrations(self, target_version: Optional[str] = None) -> Tuple[int, List[Tuple[str, str]]]:
+        """The applied version and the (timestamp, name) of the migrations up to the target or latest."""
+        migrations = self.list_migrations()
+        applied = [int(m['timestamp']) for m in migrations if m['status'] == 'APPLIED']
+        current = max(applied + [0])
+        target = None
+        if target_version:
+            resolved = self.resolve_version(target_version)
+            if not resolved:
+                raise ValueError(f"Version {target_version} not found")
+            target = int(resolved['timestamp'])
+        to_apply = [(m['timestamp'], m['name']) for m in sorted(migrations, key=lambda m: int(m['timestamp']))
+                    if int(m['timestamp']) > current and (target is None or int(m['timestamp']) <= target)]
+        return current, to_apply
+
+    def preflight(self, target_version: Optional[str] = None, max_copy_rows: int = DEFAULT_MAX_COPY_ROWS,
+                  allow_copy: bool = False) -> List[Assessment]:
+        """Report how the pending up migrations (to the target or latest) will execute, without applying them."""
+        current, to_apply = self.pending_migrations(target_version)
+        if not to_apply:
+            logger.info("No pending migrations")
+            return []
+        assessments = self.assess_migrations(to_apply, current, max_copy_rows, allow_copy)
+        self.check_assessments(assessments, max_copy_rows, report=True)
+        return assessments
+
+    def benchmark(self, target_version: Optional[str] = None, apply: bool = False, iterations: int = 50,
+                  output: Optional[str] = None, baseline: Optional[str] = None, max_ratio: float = 1.5) -> bool:
+        """
+        Run the hot-query benchmark at the current version and compare it with `baseline`. With `apply`,
+        the pending up migrations (to the target or latest) are applied one at a time and the benchmark
+        reruns after each; meant for a seeded scratch database. Returns False on any regression.
+        """
+        if not self.ensure_connected():
+            logger.error("Cannot run the benchmark: no database connection")
+            raise RuntimeError("Database connection failed")
+        bench = Benchmark(self.connection, iterations)
+        label = self.schema_version() or 'empty'
+        runs = {label: bench.run()}
+        print_results(label, runs[label])
+        regressions = []
+        if baseline:
+            reference = latest(load_results(Path(baseline)))
+            regressions.extend(f"against {baseline}: {r}" for r in compare(reference, runs[label], max_ratio))
+        if apply:
+            _, to_apply = self.pending_migrations(target_version)
+            for timestamp, name in to_apply:
+                previous = runs[label]
+                self.apply_migration(timestamp, name, 'up')
+                label = f"{timestamp}_{name}"
+                runs[label] = bench.run()
+                print_results(label, runs[label])
+                regressions.extend(f"after {label}: {r}" for r in compare(previous, runs[label], max_ratio))
+        if output:
+            write_results(Path(output), runs)
+        for regression in regressions:
+            logger.error(f"Benchmark regression {regression}")
+        if not regressions:
+            logger.info(f"No query regressions across {len(runs)} benchmark runs")
+        return not regressions
+
+    def target_migrator(self, **config) -> 'Migrator':
+        """A migrator for another database, with the same migrations and `config` overriding the connection settings."""
+        target = Migrator()
+        target.db_config = dict(self.db_config, **config)
+        target.migrations_dir = self.migrations_dir
+        target.baselines_dir = self.baselines_dir
+        target.report = RunReport(target.db_config['database'])
+        return target
+
+    def scratch_migrator(self, database: str) -> 'Migrator':
+        """A migrator for another database on the same server, with the same migrations."""
+        return self.target_migrator(database=database)
+
+    def fan_out(self, inventory: str, target_version: Optional[str] = None, dry_run: bool = False, ignore_warnings: bool = False,
+                fleet_jobs: int = DEFAULT_FLEET_JOBS, per_host: int = DEFAULT_PER_HOST, canaries: int = 1,
+                max_failure_rate: float = DEFAULT_MAX_FAILURE_RATE, log_dir: Path = DEFAULT_LOG_DIR, **run_options) -> bool:
+        """
+        Run migrations to the target version or latest on every database of an inventory file and
+        print a status table. Data-loss confirmations cannot be answered per worker, so the down
+        scripts that would ask are confirmed once up front. Returns False unless every target succeeded.
+        """
+        targets = read_inventory(Path(inventory), self.db_config)
+        if not targets:
+            logger.error(f"No targets in {inventory}")
+            return False
+        if target_version:
+            available = self.list_available_migrations()
+            target = next((m for m in available if target_version in (m['timestamp'], m['name'])), None)
+            if not target:
+                raise ValueError(f"Version {target_version} not found")
+            target_version = target['timestamp']
+            down_scripts = [self.migrations_dir / f"{m['timestamp']}_{m['name']}" / 'down.sql'
+                            for m in available if int(m['timestamp']) > int(target_version)]
+            lossy = [p.parent.name for p in down_scripts if p.exists() and self.check_data_loss(p)]
+            if lossy and not ignore_warnings and not dry_run:
+                logger.warning(f"Targets above {target_version} may roll back data-loss migrations: {', '.join(lossy)}")
+                if input(f"Proceed on {len(targets)} databases? (y/n): ").strip().lower() != 'y':
+                    logger.info("Fan-out aborted by user")
+                    return False
+                ignore_warnings = True
+        logger.info(f"Migrating {len(targets)} databases from {inventory}; logs in {log_dir}")
+        fleet = Fleet(self, targets, fleet_jobs, per_host, max_failure_rate, log_dir)
+        results = fleet.run(dict(run_options, target_version=target_version, dry_run=dry_run, ignore_warnings=ignore_warnings), canaries)
+        print_summary(results)
+        return all(r.status == 'ok' for r in results)
+
+    def rehearse(self, target_version: Optional[str] = None, sample_rows: Optional[int] = DEFAULT_SAMPLE_ROWS, jobs: int = 1,
+                 batch_size: int = 0, lock_policy: LockPolicy = LockPolicy(), report_path: Optional[str] = None) -> bool:
+        """
+        Apply the pending up migrations (to the target or latest) to a scratch copy of the schema on
+        the same server, holding up to `sample_rows` rows (None for all) of each table they touch,
+        and report each statement's measured time extrapolated to production row counts. The
+        scratch database is dropped afterwards. Returns False if a migration failed.
+        """
+        if not self.ensure_connected():
+            logger.error("Cannot rehearse: no database connection")
+            raise RuntimeError("Database connection failed")
+        _, to_apply = self.pending_migrations(target_version)
+        if not to_apply:
+            logger.info("No pending migrations")
+            return True
+        statement_tables: Dict[str, List[Optional[str]]] = {}
+        samples: Dict[str, Optional[int]] = {'migrations': None}
+        for timestamp, name in to_apply:
+            script_path = self.migrations_dir / f"{timestamp}_{name}" / 'up.sql'
+            if not script_path.exists():
+                continue
+            with open(script_path, 'r') as f:
+                infos = [analyze_statement(statement) for statement in iter_sql_statements(f)]
+            statement_tables[f"{timestamp}_{name}"] = [info.table for info in infos]
+            for info in infos:
+                for table in filter(None, [info.table, *info.references]):
+                    samples.setdefault(table, sample_rows)
+        production = {name: size.rows for name, size in self.table_sizes().items()}
+        schema = ScratchSchema(self.connection, self.db_config['database'])
+        scratch = self.scratch_migrator(schema.name)
+        success = True
+        try:
+            sampled = schema.create(samples)
+            for table, limit in samples.items():
+                if limit is None and table in sampled:
+                    production[table] = sampled[table]  # exact count rather than the TABLE_ROWS estimate
+            for timestamp, name in to_apply:
+                try:
+                    scratch.apply_migration(timestamp, name, 'up', ignore_warnings=True, jobs=jobs,
+                                            batch_size=batch_size, lock_policy=lock_policy)
+                except Exception as e:
+                    logger.error(f"Rehearsal of {timestamp}_{name} failed: {e}")
+                    success = False
+                    break
+        finally:
+            scratch.close()
+            try:
+                schema.drop()
+            finally:
+                scratch.write_report(report_path)
+        results = extrapolate(scratch.report.migrations, statement_tables, sampled, production)
+        print(tabulate([{
+            'Migration': r.migration,
+            '#': '' if r.mode == 'python' else r.number if r.last == r.number else f"{r.number}-{r.last}",
+            'Table': r.table or '',
+            'Mode': r.mode,
+            'Sample rows': r.sample_rows,
+            'Rows': r.rows,
+            'Measured': f"{r.seconds:.3f}s",
+            'Estimate': format_duration(r.estimate) if r.estimate >= 1 else f"{r.estimate:.3f}s",
+            'Statement': preview(r.sql, 60),
+        } for r in results], headers="keys", tablefmt="grid"))
+        logger.info(f"Rehearsal: {len(results)} statements, {sum(r.seconds for r in results):.2f}s measured on the sample, "
+                    f"estimated {format_duration(sum(r.estimate for r in results))} at production size")
+        return success
+
+    def squash(self, upto: str) -> Path:
+        """
+        Apply the migrations up to `upto` to an empty scratch database, dump the result as one
+        baseline script (final table definitions, seed rows and views) and check that loading it
+        into a second scratch database yields the same schema fingerprint. Both scratch databases
+        are dropped afterwards. Returns the baseline path.
+        """
+        if not self.ensure_connected():
+            logger.error("Cannot squash: no database connection")
+            raise RuntimeError("Database connection failed")
+        target = self.resolve_version(upto)
+        if not target:
+            raise ValueError(f"Version {upto} not found")
+        covered = [(m['timestamp'], m['name']) for m in self.list_available_migrations()
+                   if int(m['timestamp']) <= int(target['timestamp'])]
+        database = self.db_config['database']
+        source = ScratchSchema(self.connection, database, f"{database}_squash"[:64])
+        check = ScratchSchema(self.connection, database, f"{database}_squash_check"[:64])
+        path = baseline_path(self.baselines_dir, target['timestamp'])
+        try:
+            source.create_empty()
+            scratch = self.scratch_migrator(source.name)
+            try:
+                for timestamp, name in covered:
+                    scratch.apply_migration(timestamp, name, 'up', ignore_warnings=True)
+                statements = SchemaDump(scratch.connection, source.name).statements()
+                expected = live_fingerprint(scratch.connection, source.name)
+            finally:
+                scratch.close()
+            write_baseline(path, statements, covered)
+            check.create_empty()
+            loaded = self.scratch_migrator(check.name)
+            try:
+                loaded.apply_baseline(path, [{'timestamp': t, 'name': n} for t, n in covered])
+                actual = live_fingerprint(loaded.connection, check.name)
+            finally:
+                loaded.close()
+        finally:
+            check.drop()
+            source.drop()
+        if actual != expected:
+            path.unlink()
+            raise ValueError(f"Baseline does not reproduce the migrated schema (fingerprint {actual} "
+                             f"instead of {expected}); removed {path}")
+        logger.info(f"Baseline {path} reproduces the schema of {len(covered)} migrations (fingerprint {expected})")
+        return path
+
     def list_migrations(self) -> List[Dict]:
         """List all migrations with their status."""
         try:
-            available = self.list_available_migrations()
-            applied = self.get_applied_migrations()
-            applied_dict = {f"{m['timestamp']}_{m['name']}": m for m in applied}
-            migrations = []
-            for mig in available:
-                key = f"{mig['timestamp']}_{mig['name']}"
-                status = applied_dict.get(key, {}).get('status', 0)  # 0=PENDING
-                applied_at = applied_dict.get(key, {}).get('applied_at')
-                migrations.append({
-                    'timestamp': mig['timestamp'],
-                    'name': mig['name'],
-                    'status': ['PENDING', 'APPLIED', 'FAILED'][status],
-                    'applied_at': applied_at
-                })
-            return migrations
+            return self.load_state().migrations
         except Exception as e:
             logger.error(f"Failed to list migrations: {e}")
             return []
 
-    def get_status(self) -> Dict:
-        """Get the current migration status."""
-        migrations = self.list_migrations()
+    def get_status(self, applied: Optional[List[Dict]] = None) -> Dict:
+        """Get the current migration status, from the given applied rows of the migrations table if any."""
+        if applied is None:
+            migrations = self.list_migrations()
+        else:
+            migrations = MigrationState(self.list_available_migrations(), applied, 0, True).migrations
         applied = [m for m in migrations if m['status'] == 'APPLIED']
         current = max(applied, key=lambda m: int(m['timestamp'])) if applied else None
         ahead = [m for m in migrations if m['status'] == 'PENDING' and (not current or int(m['timestamp']) > int(current['timestamp']))]
@@ -363,50 +641,204 @@ class Migrator:
                 return m
         return None
 
+    def get_online_alter(self, statement: str, options: Optional[Dict[str, str]]) -> Optional[OnlineSchemaChange]:
+        """
+        Return an online schema change for an ALTER TABLE statement when the script opted in with
+        `-- migrator:online [tables=a,b] [chunk_size=N] [chunk_time=S] [sleep=S] [max_threads_running=N] [keep_old_table]`.
+        """
+        if options is None:
+            return None
+        parsed = parse_alter_table(statement)
+        if not parsed:
+            return None
+        table, alter_clause = parsed
+        tables = [t.strip() for t in options.get('tables', '').split(',') if t.strip()]
+        if tables and table not in tables:
+            return None
+        return OnlineSchemaChange(
+            self.connection, self.db_config['database'], table, alter_clause,
+            chunk_size=int(options.get('chunk_size') or 1000),
+            chunk_time=float(options.get('chunk_time') or 0.5),
+            sleep=float(options.get('sleep') or 0),
+            max_threads_running=int(options.get('max_threads_running') or 50),
+            keep_old_table='keep_old_table' in options
+        )
+
+    def execute_parallel(self, script_path: Path, jobs: int, checkpoints: StatementCheckpoints, metrics: MigrationMetrics,
+                         guard: LockGuard) -> bool:
+        """
+        Execute a script's statements concurrently over `jobs` connections, ordered by the tables
+        they touch. Returns False (so the caller falls back to serial execution) if the worker
+        connections cannot be opened.
+        """
+        def connect_worker():
+            connection = connect(**self.db_config, autocommit=True)
+            guard.configure(connection)
+            return connection
+        executor = ParallelExecutor(connect_worker, jobs, guard)
+        try:
+            executor.open()
+        except Error as e:
+            logger.warning(f"Could not open {jobs} connections for parallel execution ({e}); falling back to serial")
+            executor.close()
+            return False
+        try:
+            with open(script_path, 'r') as f:
+                statements = list(iter_sql_statements(f))
+            done = {i for i, statement in enumerate(statements, 1) if checkpoints.is_done(i, statement)}
+            try:
+                executor.run(
+                    statements, done,
+                    on_success=lambda i, statement, connection: checkpoints.record([(i, statement)], connection)
+                )
+            finally:
+                # Worker connections report time, rows and warnings; status counters are per session
+                for i, (seconds, rows, warnings) in sorted(executor.results.items()):
+                    metrics.add(StatementMetrics(i, i, preview(statements[i - 1]), 'parallel', seconds, rows, warnings, {}))
+            return True
+        finally:
+            executor.close()
+
+    def execute_sql_script(self, script_path: Path, timestamp: str, name: str, direction: str, jobs: int = 1, batch_size: int = 0, resume: bool = False,
+                           metrics: Optional[MigrationMetrics] = None, lock_policy: LockPolicy = LockPolicy()) -> StatementCheckpoints:
+        """
+        Execute the statements of a migration's SQL script, checkpointing each completed one.
+        Retries of a failed attempt and `resume=True` skip the statements that already completed;
+        session statements (SET, USE) are not checkpointed and run again.
+        Each statement's time, rows, warnings and status counter deltas are added to `metrics`.
+        Statements wait at most `lock_policy.lock_wait_timeout` for locks and are retried on their own.
+        """
+        metrics = metrics or MigrationMetrics(timestamp, name, direction)
+        with open(script_path, 'r') as f:
+            directives = read_directives(f)
+        online = directives.get('online')
+        checkpoints = StatementCheckpoints(self.connection, timestamp, direction)
+        checkpoints.ensure_table()
+        completed = checkpoints.load()
+        if completed and not (resume or (timestamp, direction) in self.resume_pending):
+            raise ValueError(
+                f"Migration {timestamp}_{name} ({direction}) was partially applied "
+                f"({len(completed)} statements completed); rerun with --resume to continue"
+            )
+        if completed:
+            logger.info(f"Resuming {timestamp}_{name} ({direction}): skipping {len(completed)} completed statements")
+        # Online changes share the main connection and '-- migrator:serial' opts a script out
+        parallel = jobs > 1 and online is None and 'serial' not in directives
+        guard = LockGuard(self.connection, self.db_config['database'], lock_policy)
+        if batch_size == 0 and parallel and self.execute_parallel(script_path, jobs, checkpoints, metrics, guard):
+            return checkpoints
+        guard.configure()
+        profiler = StatementProfiler(self.connection)
+        profiler.calibrate()
+        cursor = self.connection.cursor()
+
+        def execute(i: int, statement: str) -> None:
+            logger.debug(f"Executing statement {i} for {timestamp}_{name} ({direction}): {statement}")
+            online_alter = self.get_online_alter(statement, online)
+            info = analyze_statement(statement)
+            token = profiler.begin()
+            if online_alter:
+                online_alter.run()
+                metrics.add(profiler.end(token, i, statement, 0, 0, 'online'))
+            else:
+                guard.run(lambda: cursor.execute(statement), f"Statement {i} of {timestamp}_{name} ({direction})",
+                          info.table)
+                metrics.add(profiler.end(token, i, statement, cursor.rowcount, cursor.warning_count or 0))
+            checkpoints.record([(i, statement)])
+            if info.kind != 'dml':
+                # DDL has already committed itself; persist its checkpoint as well
+                self.connection.commit()
+        try:
+            with open(script_path, 'r') as f:
+                # Statements are executed as they are parsed; the script is never fully buffered
+                statements = (
+                    (i, statement) for i, statement in enumerate(iter_sql_statements(f), 1)
+                    if not checkpoints.is_done(i, statement)
+                )
+                if batch_size > 0:
+                    started = {}
+
+                    def batch_done(entries: List[Tuple[int, str]]) -> None:
+                        # Runs right after the round trip, before any statement-by-statement fallback
+                        checkpoints.record(entries)
+                        metrics.add(profiler.end(started['token'], entries[0][0], entries[0][1], batches.rows - started['rows'],
+                                                 batches.warnings - started['warnings'], 'batch', entries[-1][0]))
+                    batches = BatchExecutor(self.connection, execute, on_success=batch_done)
+                    for batch in coalesce_batches(statements, batch_size):
+                        if not batch.single:
+                            started.update(token=profiler.begin(), rows=batches.rows, warnings=batches.warnings)
+                        batches.execute(batch)
+                    logger.info(f"Executed {batches.statements} statements in {batches.batches} batches, "
+                                f"{batches.rows} rows affected")
+                else:
+                    for i, statement in statements:
+                        execute(i, statement)
+        finally:
+            cursor.close()
+            guard.reset()
+            if guard.retried:
+                logger.info(f"{timestamp}_{name}: {guard.retried} statement retries after lock wait timeouts")
+        return checkpoints
+
     @retry(stop_max_attempt_number=3, wait_exponential_multiplier=1000, wait_exponential_max=10000)
-    def apply_migration(self, timestamp: str, name: str, direction: str, dry_run: bool = False, ignore_warnings: bool = False) -> None:
-        """Apply a migration and update its status."""
+    def apply_migration(self, timestamp: str, name: str, direction: str, dry_run: bool = False, ignore_warnings: bool = False, jobs: int = 1, batch_size: int = 0, resume: bool = False,
+                        lock_policy: LockPolicy = LockPolicy()) -> None:
+        """
+        Apply a migration and update its status.
+        A migration has an SQL script, a Python script or both. Going up the SQL script runs
+        before the Python one (schema first, then data); going down the order is reversed.
+        """
         if not self.ensure_connected():
             logger.error("Cannot apply migration: no database connection")
             raise RuntimeError("Database connection failed")
         migration_dir = self.migrations_dir / f"{timestamp}_{name}"
         script_path = migration_dir / f"{direction}.sql"
-        if not script_path.exists():
+        python_path = migration_dir / f"{direction}.py"
+        if not script_path.exists() and not python_path.exists():
             logger.error(f"Script not found: {script_path}")
             raise FileNotFoundError(f"Script not found: {script_path}")
+        metrics: Optional[MigrationMetrics] = None
         try:
-            with open(script_path, 'r') as f:
-                sql = f.read()
-            if not sql.strip():
+            has_sql = False
+            if script_path.exists():
+                with open(script_path, 'r') as f:
+                    has_sql = any(line.strip() for line in f)
+            has_python = python_path.exists()
+            if not has_sql and not has_python:
                 logger.info(f"Script {script_path} is empty; skipping execution")
                 return
-            # Remove comments and split statements
-            sql_clean = strip_sql_comments(sql)
-            logger.debug(f"Cleaned SQL for {timestamp}_{name} ({direction}):\n{sql_clean}")
-            statements = split_sql_statements(sql_clean)
             if dry_run:
                 logger.info(f"Dry run: Would apply {direction} migration {timestamp}_{name}")
-                for i, stmt in enumerate(statements, 1):
-                    logger.info(f"Statement {i}: {stmt}")
+                if has_sql:
+                    with open(script_path, 'r') as f:
+                        online = read_directives(f).get('online')
+                    with open(script_path, 'r') as f:
+                        for i, stmt in enumerate(iter_sql_statements(f), 1):
+                            mode = " (online)" if self.get_online_alter(stmt, online) else ""
+                            logger.info(f"Statement {i}{mode}: {stmt}")
+                if has_python:
+                    logger.info(f"Would run Python migration {python_path}")
                 return
-            if direction == 'down' and self.check_data_loss(script_path) and not ignore_warnings:
+            if direction == 'down' and has_sql and self.check_data_loss(script_path) and not ignore_warnings:
                 logger.warning(f"Potential data loss detected in {script_path}")
                 if not ignore_warnings:
                     confirm = input("This migration may cause data loss. Proceed? (y/n): ").strip().lower()
                     if confirm != 'y':
                         logger.info("Migration aborted by user")
                         return
+            checkpoints = None
+            metrics = self.report.start(timestamp, name, direction)
+            if has_python and direction == 'down':
+                self.run_python_script(python_path, timestamp, name, direction, metrics)
+            if has_sql:
+                checkpoints = self.execute_sql_script(script_path, timestamp, name, direction, jobs, batch_size, resume, metrics, lock_policy)
+            if has_python and direction == 'up':
+                self.run_python_script(python_path, timestamp, name, direction, metrics)
             cursor = self.connection.cursor()
-            for i, statement in enumerate(statements, 1):
-                logger.debug(f"Executing statement {i} for {timestamp}_{name} ({direction}): {statement}")
-                cursor.execute(statement)
+            if checkpoints:
+                checkpoints.clear(cursor)
             if direction == 'up':
-                cursor.execute(
-                    "INSERT INTO migrations (timestamp, name, status, applied_at) "
-                    "VALUES (%s, %s, %s, %s) "
-                    "ON DUPLICATE KEY UPDATE status = %s, applied_at = %s",
-                    (int(timestamp), name, 1, datetime.now(), 1, datetime.now())
-                )
+                self.record_applied(cursor, timestamp, name, time.monotonic() - metrics.started)
             else:
                 cursor.execute(
                     "UPDATE migrations SET status = %s, applied_at = NULL WHERE timestamp = %s",
@@ -414,14 +846,102 @@ class Migrator:
                 )
             self.connection.commit()
             cursor.close()
-            logger.info(f"Applied {direction} migration: {timestamp}_{name}")
+            metrics.finish(True)
+            self.resume_pending.discard((timestamp, direction))
+            logger.info(f"Applied {direction} migration: {timestamp}_{name} in {metrics.seconds:.2f}s ({metrics.summary()})")
+            self.refresh_state()
         except Error as e:
             logger.error(f"Error applying migration {timestamp}_{name} ({direction}): {e}")
+            if metrics:
+                metrics.finish(False, str(e))
             self.connection.rollback()
+            self.resume_pending.add((timestamp, direction))
+            raise
+        except Exception as e:
+            if metrics:
+                metrics.finish(False, str(e))
+            self.resume_pending.add((timestamp, direction))
             raise
 
-    def run(self, target_version: Optional[str] = None, dry_run: bool = False, ignore_warnings: bool = False) -> None:
-        """Run migrations to the target version or latest."""
+    def run_python_script(self, python_path: Path, timestamp: str, name: str, direction: str, metrics: MigrationMetrics) -> None:
+        """Run a migration's Python script, adding its wall time to `metrics`."""
+        logger.info(f"Running Python migration {python_path}")
+        started = time.monotonic()
+        try:
+            run_python_migration(python_path, MigrationContext(self.connection, self.db_config['database'], timestamp, name, direction))
+        finally:
+            metrics.python_seconds += time.monotonic() - started
+
+    def record_applied(self, cursor, timestamp: str, name: str, seconds: Optional[float]) -> None:
+        """
+        Mark a migration applied, with its duration (None if unknown) once the migrations table
+        has the duration_ms column.
+        """
+        now = datetime.now()
+        duration_ms = int(seconds * 1000) if seconds is not None else None
+        try:
+            cursor.execute(
+                "INSERT INTO migrations (timestamp, name, status, applied_at, duration_ms) "
+                "VALUES (%s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE status = %s, applied_at = %s, duration_ms = %s",
+                (int(timestamp), name, 1, now, duration_ms, 1, now, duration_ms)
+            )
+        except Error as e:
+            if e.errno != 1054:  # Unknown column: schema older than the duration_ms migration
+                raise
+            cursor.execute(
+                "INSERT INTO migrations (timestamp, name, status, applied_at) "
+                "VALUES (%s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE status = %s, applied_at = %s",
+                (int(timestamp), name, 1, now, 1, now)
+            )
+
+    def apply_baseline(self, path: Path, covered: List[Dict], dry_run: bool = False, batch_size: int = 0,
+                       lock_policy: LockPolicy = LockPolicy()) -> None:
+        """
+        Create the schema of a fresh database from a --squash baseline and mark the migrations it
+        covers as applied, instead of replaying them one by one.
+        """
+        last = covered[-1]
+        if dry_run:
+            logger.info(f"Dry run: Would load baseline {path} and mark {len(covered)} migrations up to "
+                        f"{last['timestamp']}_{last['name']} applied")
+            return
+        logger.info(f"Loading baseline {path} for {len(covered)} migrations up to {last['timestamp']}_{last['name']}")
+        metrics = self.report.start(last['timestamp'], 'baseline', 'up')
+        try:
+            checkpoints = self.execute_sql_script(path, last['timestamp'], 'baseline', 'up', batch_size=batch_size,
+                                                  metrics=metrics, lock_policy=lock_policy)
+            cursor = self.connection.cursor()
+            checkpoints.clear(cursor)
+            for m in covered:
+                self.record_applied(cursor, m['timestamp'], m['name'], None)
+            self.connection.commit()
+            cursor.close()
+        except Exception as e:
+            metrics.finish(False, str(e))
+            logger.error(f"Loading baseline {path} failed: {e}; drop the tables it created before rerunning")
+            raise
+        metrics.finish(True)
+        logger.info(f"Loaded baseline {path} in {metrics.seconds:.2f}s ({metrics.summary()})")
+        self.refresh_state()
+
+    def write_report(self, report_path: Optional[str] = None, metrics_path: Optional[str] = None) -> None:
+        """Write the per-statement run report (JSON) and the Prometheus textfile, if requested."""
+        if not self.report.migrations:
+            return
+        if report_path:
+            self.report.write_json(Path(report_path))
+        if metrics_path:
+            self.report.write_prometheus(Path(metrics_path))
+
+    def run(self, target_version: Optional[str] = None, dry_run: bool = False, ignore_warnings: bool = False, jobs: int = 1, batch_size: int = 0, resume: bool = False,
+            max_copy_rows: int = DEFAULT_MAX_COPY_ROWS, allow_copy: bool = False,
+            report_path: Optional[str] = None, metrics_path: Optional[str] = None, lock_policy: LockPolicy = LockPolicy()) -> None:
+        """
+        Run migrations to the target version or latest, after a preflight check of the pending up migrations.
+        Per-statement metrics are written to `report_path` (JSON) and `metrics_path` (Prometheus textfile).
+        """
         if not self.ensure_connected():
             logger.error("Cannot run migrations: no database connection")
             raise RuntimeError("Database connection failed")
@@ -440,10 +960,16 @@ class Migrator:
                     raise ValueError(f"Version {target_version} not found")
                 target_timestamp = target['timestamp']
             if not self.check_tables_exist():
-                logger.info("No tables detected; applying all migrations")
+                baseline = find_baseline(self.baselines_dir, self.load_state().available, int(target_timestamp))
+                if baseline:
+                    path, covered = baseline
+                    self.apply_baseline(path, covered, dry_run, batch_size, lock_policy)
+                    applied = applied + [m['timestamp'] for m in covered]
+                else:
+                    logger.info("No tables detected; applying all migrations")
                 for timestamp, name in available:
                     if timestamp not in applied:
-                        self.apply_migration(timestamp, name, 'up', dry_run, ignore_warnings)
+                        self.apply_migration(timestamp, name, 'up', dry_run, ignore_warnings, jobs, batch_size, resume, lock_policy)
                 return
             current = max([int(t) for t in applied] + [0])
             target = int(target_timestamp)
@@ -451,6 +977,7 @@ class Migrator:
                 direction = 'up'
                 to_apply = [(t, n) for t, n in available if int(t) > current and int(t) <= target]
                 logger.info(f"Migrating up to {target_timestamp}: {len(to_apply)} versions")
+                self.check_assessments(self.assess_migrations(to_apply, current, max_copy_rows, allow_copy), max_copy_rows, report=dry_run)
             else:
                 direction = 'down'
                 to_apply = [(t, n) for t, n in reversed(available) if int(t) <= current and int(t) > target]
@@ -459,13 +986,165 @@ class Migrator:
                 if not dry_run and not self.validate_schema():
                     logger.error("Schema validation failed before migration")
                     raise ValueError("Schema validation failed")
-                self.apply_migration(timestamp, name, direction, dry_run, ignore_warnings)
+                self.apply_migration(timestamp, name, direction, dry_run, ignore_warnings, jobs, batch_size, resume, lock_policy)
         except Exception as e:
             logger.error(f"Migration run failed: {e}")
             raise
         finally:
+            self.write_report(report_path, metrics_path)
             self.close()
 
+    def get_setting(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Return the value of an active global setting from the settings table."""
+        if not self.ensure_connected():
+            raise RuntimeError("Database connection failed")
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "SELECT `value` FROM settings WHERE `key` = %s AND community_id IS NULL AND active = 1 "
+            "ORDER BY id DESC LIMIT 1",
+            (key,)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] if row else default
+
+    def manage_partitions(self, tables: Optional[List[str]] = None, interval: str = 'day', premake: int = 7, dry_run: bool = False) -> None:
+        """
+        Partition the append-only log tables by time (online, on first use), pre-create future
+        partitions and drop those past the `dash.log_retention` setting.
+        """
+        if not self.ensure_connected():
+            logger.error("Cannot manage partitions: no database connection")
+            raise RuntimeError("Database connection failed")
+        tables = tables or list(PARTITIONED_TABLES)
+        unknown = [t for t in tables if t not in PARTITIONED_TABLES]
+        if unknown:
+            raise ValueError(f"Unsupported partitioned tables: {', '.join(unknown)} "
+                             f"(supported: {', '.join(PARTITIONED_TABLES)})")
+        retention = self.get_setting('dash.log_retention')
+        retention = int(retention) if retention else None
+        if not retention:
+            logger.warning("dash.log_retention is not set; expired partitions will not be dropped")
+        for table in tables:
+            manager = PartitionManager(
+                self.connection, self.db_config['database'], table, PARTITIONED_TABLES[table],
+                interval=interval, premake=premake, retention=retention
+            )
+            try:
+                manager.run(dry_run)
+            except Error as e:
+                logger.error(f"Error managing partitions of {table}: {e}")
+                self.connection.rollback()
+                raise
+
+    def prune(self, tables: Optional[List[str]] = None, batch_size: int = 1000, max_rows_per_second: int = 5000, lock_wait_timeout: int = 2, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Delete expired rows from the log tables (per `dash.log_retention`) and stale OAuth
+        sessions (per `user.idle_period`) in small, rate-limited batches.
+        """
+        if not self.ensure_connected():
+            logger.error("Cannot prune: no database connection")
+            raise RuntimeError("Database connection failed")
+        known = [t.table for t in PRUNE_TARGETS]
+        unknown = [t for t in tables or [] if t not in known]
+        if unknown:
+            raise ValueError(f"Unsupported prune tables: {', '.join(unknown)} (supported: {', '.join(known)})")
+        retention = {}
+        for setting in {t.setting for t in PRUNE_TARGETS}:
+            value = self.get_setting(setting)
+            retention[setting] = int(value) if value else 0
+        # A dedicated connection keeps the lowered lock wait timeout out of the main session
+        connection = connect(**self.db_config)
+        try:
+            pruner = Pruner(connection, batch_size, max_rows_per_second, lock_wait_timeout)
+            results = pruner.run(retention, tables, dry_run)
+        finally:
+            connection.close()
+        if not dry_run:
+            logger.info(f"Pruned {sum(results.values())} rows: " + ', '.join(f"{t}={n}" for t, n in results.items()))
+        return results
+
+    def refresh_rollups(self, tables: Optional[List[str]] = None, rebuild: bool = False, refresh: bool = True,
+                        check: bool = False, lag: int = ROLLUP_LAG) -> bool:
+        """
+        Bring the dashboard rollup tables up to date from their watermarks (or rebuild them from
+        the base tables), then optionally check them against the base tables.
+        """
+        if not self.ensure_connected():
+            logger.error("Cannot refresh rollups: no database connection")
+            raise RuntimeError("Database connection failed")
+        known = [r.table for r in ROLLUPS]
+        unknown = [t for t in tables or [] if t not in known]
+        if unknown:
+            raise ValueError(f"Unknown rollup tables: {', '.join(unknown)} (known: {', '.join(known)})")
+        # A dedicated connection keeps the UTC time zone out of the main session
+        connection = connect(**self.db_config)
+        try:
+            return RollupRefresher(connection, lag).run(tables, rebuild, refresh, check)
+        finally:
+            connection.close()
+
+    def schema_version(self) -> Optional[str]:
+        """Timestamp of the latest applied migration."""
+        applied = [m['timestamp'] for m in self.list_migrations() if m['status'] == 'APPLIED']
+        return str(max(int(t) for t in applied)) if applied else None
+
+    def export_data(self, directory: str, jobs: int = 4, chunk_rows: int = 100000, community_id: Optional[int] = None) -> None:
+        """Export all tables (or one community's subset) as compressed TSV chunks for --import."""
+        if not self.ensure_connected():
+            logger.error("Cannot export: no database connection")
+            raise RuntimeError("Database connection failed")
+        Exporter(self.db_config, Path(directory), jobs, chunk_rows, community_id).run(self.schema_version())
+
+    def import_data(self, directory: str, jobs: int = 4, ignore_warnings: bool = False) -> None:
+        """Load an --export directory into this database, which must be at the same schema version."""
+        if not self.ensure_connected():
+            logger.error("Cannot import: no database connection")
+            raise RuntimeError("Database connection failed")
+        Importer(self.db_config, Path(directory), jobs).run(self.schema_version(), force=ignore_warnings)
+        self.state = None
+
+    def generate_data(self, directory: str, scale: float = 1.0, seed: int = 1, jobs: int = 4, end: Optional[str] = None,
+                      dry_run: bool = False) -> None:
+        """
+        Write a seeded synthetic dataset to `directory` in the --export format and load it.
+        Generated ids start after the rows already in each table, except that an existing
+        moderation_models row for the scoring model is reused. The scores name their model the way
+        the target's schema does; with `dry_run` only the files are written, for the latest schema.
+        """
+        offsets: Dict[str, int] = {}
+        model_id = None
+        model_columns = ('model_id',)
+        version = None
+        if not dry_run:
+            if not self.ensure_connected():
+                logger.error("Cannot generate data: no database connection")
+                raise RuntimeError("Database connection failed")
+            cursor = self.connection.cursor()
+            # Older schemas name the scoring model with strings and have no moderation_models table
+            cursor.execute(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'post_moderation_scores'",
+                (self.db_config['database'],)
+            )
+            model_columns = tuple(row[0] for row in cursor.fetchall() if row[0] in MODEL_COLUMNS)
+            cursor.execute("SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s", (self.db_config['database'],))
+            existing = {row[0] for row in cursor.fetchall()}
+            for table in SYNTHETIC_TABLES:
+                if table in existing:
+                    cursor.execute(f"SELECT MAX(id) FROM {quote_identifier(table)}")
+                    offsets[table] = int(cursor.fetchone()[0] or 0)
+            if 'model_id' in model_columns and 'moderation_models' in existing:
+                cursor.execute("SELECT id FROM moderation_models WHERE model_type = %s AND model_version = %s", SCORE_MODEL)
+                row = cursor.fetchone()
+                model_id = row[0] if row else None
+            cursor.close()
+            version = self.schema_version()
+        end_time = datetime.strptime(end, '%Y-%m-%d').replace(tzinfo=timezone.utc) if end else None
+        plan = Plan.create(scale, seed, end_time, offsets, model_id, model_columns)
+        SyntheticDataset(plan, Path(directory), jobs).run(version)
+        if not dry_run:
+            self.import_data(directory, jobs)
+
     def add_global_admin(self, username: str) -> None:
         """
         Add a global admin by username.
@@ -524,11 +1203,13 @@ class Migrator:
             self.connection.rollback()
             raise
 
-    def run_query(self, query: str, ignore_warnings: bool = False) -> None:
+    def run_query(self, query: str, ignore_warnings: bool = False, fmt: str = 'table', output: Optional[str] = None, limit: Optional[int] = None) -> None:
         """
-        Run a SQL query and display the results.
-        For SELECT queries, displays a formatted table with string truncation.
-        For other queries, executes and reports affected rows.
+        Run a SQL query and display or export the results.
+        Read queries use an unbuffered cursor, so rows are processed as the server sends them:
+        the `table` format renders a grid of at most TABLE_MAX_ROWS rows, while csv, tsv and
+        jsonl stream every row (up to `limit`) to stdout or the `output` file with a progress
+        counter. Other queries ask for confirmation and report affected rows.
         """
         if not self.ensure_connected():
             logger.error("Cannot run query: no database connection")
@@ -536,27 +1217,22 @@ class Migrator:
         try:
             # Create a new connection with autocommit=True for this query
             query_conn = connect(**self.db_config, autocommit=True)
-            cursor = query_conn.cursor(dictionary=True)
-            if query.lower().strip().startswith("select"):
+            if query.lower().strip().startswith(READ_QUERY_PREFIXES):
+                cursor = query_conn.cursor()
                 cursor.execute(query)
-                rows = cursor.fetchall()
-                if rows:
-                    # Truncate strings longer than 30 characters
-                    def truncate_value(v, max_length=30):
-                        s = str(v)
-                        if len(s) > max_length:
-                            return s[:max_length - 2] + ".."
-                        return s
-                    truncated_rows = [{k: truncate_value(v) for k, v in row.items()} for row in rows]
-                    print(tabulate(truncated_rows, headers="keys", tablefmt="grid"))
-                else:
-                    print("No rows returned.")
+                exhausted = self.emit_rows(cursor, fmt, output, limit)
+                if not exhausted:
+                    # Stop the server from sending the rest instead of draining it
+                    self.kill_query(query_conn)
+                    return
             else:
                 if not ignore_warnings:
                     confirm = input("This query may modify data. Proceed? (y/n): ").strip().lower()
                     if confirm != 'y':
                         logger.info("Query execution aborted by user")
+                        query_conn.close()
                         return
+                cursor = query_conn.cursor()
                 cursor.execute(query)
                 affected_rows = cursor.rowcount
                 print(f"Query executed successfully. Affected rows: {affected_rows}")
@@ -566,6 +1242,59 @@ class Migrator:
             logger.error(f"Error executing query: {e}")
             raise
 
+    def emit_rows(self, cursor, fmt: str, output: Optional[str], limit: Optional[int]) -> bool:
+        """Write the rows of an executed query; returns False if rows were left unread."""
+        columns = list(cursor.column_names)
+        if fmt == 'table':
+            max_rows = min(limit, TABLE_MAX_ROWS) if limit else TABLE_MAX_ROWS
+            rows = cursor.fetchmany(max_rows + 1)
+            truncated = len(rows) > max_rows
+            rows = rows[:max_rows]
+            stream = open(output, 'w') if output and output != '-' else None
+            try:
+                if rows:
+                    print_table(columns, rows, stream)
+                else:
+                    print("No rows returned.", file=stream)
+            finally:
+                if stream:
+                    stream.close()
+            if truncated and max_rows == TABLE_MAX_ROWS:
+                logger.warning(f"Showing the first {TABLE_MAX_ROWS} rows; use --format csv, tsv or jsonl to stream all of them")
+            return not truncated
+        stream = open(output, 'w', newline='') if output and output != '-' else sys.stdout
+        progress = Progress("Fetched")
+        try:
+            writer = RowWriter(stream, fmt, columns)
+            while True:
+                size = STREAM_FETCH_SIZE if not limit else min(STREAM_FETCH_SIZE, limit - writer.rows)
+                rows = cursor.fetchmany(size) if size > 0 else []
+                if not rows:
+                    break
+                writer.write(rows)
+                progress.add(len(rows))
+                if limit and writer.rows >= limit:
+                    break
+            stream.flush()
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        progress.done()
+        return not (limit and writer.rows >= limit)
+
+    def kill_query(self, query_conn) -> None:
+        """Abort the query still running on `query_conn` and close it."""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(f"KILL QUERY {int(query_conn.connection_id)}")
+            cursor.close()
+        except Error as e:
+            logger.debug(f"Could not kill query on connection {query_conn.connection_id}: {e}")
+        try:
+            query_conn.close()
+        except Error:
+            pass
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="X-Moderator Database Migrator")
     parser.add_argument('--to', type=str, help="Migrate to a specific version (timestamp or name)")
@@ -579,12 +1308,73 @@ if __name__ == '__main__':
     parser.add_argument('--add-global-admin', type=str, help="Add a global admin by username (e.g., @username)")
     parser.add_argument('--remove-global-admin', type=str, help="Remove a global admin by username (e.g., @username)")
     parser.add_argument('--run', type=str, help="Run a SQL query and display the results in a formatted table")
+    parser.add_argument('--format', choices=FORMATS, default='table', help="Output format for --run: table (up to 1000 rows) or streamed csv, tsv, jsonl (default: table)")
+    parser.add_argument('--output', type=str, help="Write --run results to this file instead of stdout")
+    parser.add_argument('--limit', type=int, help="Stop --run after this many rows")
+    parser.add_argument('--serve', action='store_true', help="Run as a service: migrate to --to or latest under a GET_LOCK advisory lock shared by all instances and serve /healthz and /status")
+    parser.add_argument('--serve-host', type=str, default='0.0.0.0', help="Address --serve listens on (default: 0.0.0.0)")
+    parser.add_argument('--serve-port', type=int, default=DEFAULT_PORT, help=f"Port --serve listens on (default: {DEFAULT_PORT})")
+    parser.add_argument('--fleet', type=str, metavar='INVENTORY', help="Migrate every database of an inventory file (to --to or latest) in parallel, canaries first, and print a status table")
+    parser.add_argument('--fleet-jobs', type=int, default=DEFAULT_FLEET_JOBS, help=f"Databases --fleet migrates at once (default: {DEFAULT_FLEET_JOBS})")
+    parser.add_argument('--per-host-jobs', type=int, default=DEFAULT_PER_HOST, help=f"Databases --fleet migrates at once on one server (default: {DEFAULT_PER_HOST})")
+    parser.add_argument('--canaries', type=int, default=1, help="With --fleet, migrate this many targets first when none is marked canary (default: 1)")
+    parser.add_argument('--max-failure-rate', type=float, default=DEFAULT_MAX_FAILURE_RATE, help=f"Stop starting --fleet targets once more than this fraction of them failed (default: {DEFAULT_MAX_FAILURE_RATE})")
+    parser.add_argument('--fleet-logs', type=str, default=str(DEFAULT_LOG_DIR), metavar='DIR', help=f"Directory for the per-target logs and reports of --fleet (default: {DEFAULT_LOG_DIR})")
+    parser.add_argument('--shell', action='store_true', help="Interactive SQL shell over a pooled session with prepared-statement caching, timing and admin commands")
+    parser.add_argument('--run-file', type=str, metavar='PATH', help="Run the statements and shell commands of a file in one pooled session, with per-statement timing")
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE, help=f"Pooled connections for --shell/--run-file: one runs every statement of the session, the others cancel reads (default: {DEFAULT_POOL_SIZE})")
+    parser.add_argument('--jobs', type=int, default=1, help="Run independent statements of a migration over N connections (default: 1, serial)")
+    parser.add_argument('--resume', action='store_true', help="Continue a partially applied migration from its first incomplete statement")
+    parser.add_argument('--python', action='store_true', help="With --new, also create up.py/down.py data migration scripts")
+    parser.add_argument('--partitions', action='store_true', help="Partition logs, moderation_logs and notifications by time (online, first run) and rotate their partitions")
+    parser.add_argument('--partition-tables', type=str, help="Comma-separated subset of tables for --partitions")
+    parser.add_argument('--partition-interval', choices=['day', 'week', 'month'], default='day', help="Time span of each partition (default: day)")
+    parser.add_argument('--premake', type=int, default=7, help="Number of future partitions to keep ahead (default: 7)")
+    parser.add_argument('--prune', action='store_true', help="Delete rows past dash.log_retention / user.idle_period in small batches")
+    parser.add_argument('--prune-tables', type=str, help="Comma-separated subset of tables for --prune")
+    parser.add_argument('--prune-batch-size', type=int, default=1000, help="Primary-key range scanned per --prune batch (default: 1000)")
+    parser.add_argument('--max-rows-per-second', type=int, default=5000, help="Upper bound on rows deleted per second by --prune (default: 5000, 0 for no limit)")
+    parser.add_argument('--lock-wait-timeout', type=int, default=2, help="innodb_lock_wait_timeout in seconds for --prune batches (default: 2)")
+    parser.add_argument('--refresh-rollups', action='store_true', help="Update the dashboard rollup tables from their watermarks (built in full on first use)")
+    parser.add_argument('--rebuild-rollups', action='store_true', help="Recompute the rollup tables from the base tables, one group per transaction")
+    parser.add_argument('--check-rollups', action='store_true', help="Compare the rollup tables with the base tables up to their watermarks; exits 1 on mismatches")
+    parser.add_argument('--rollup-tables', type=str, help="Comma-separated subset of rollup tables for --refresh-rollups/--rebuild-rollups/--check-rollups")
+    parser.add_argument('--export', type=str, metavar='DIR', help="Export all tables to DIR as compressed TSV chunks (parallel with --jobs)")
+    parser.add_argument('--import', dest='import_dir', type=str, metavar='DIR', help="Load an --export directory with LOAD DATA LOCAL INFILE (parallel with --jobs)")
+    parser.add_argument('--community', type=int, help="With --export, only extract the rows of this community (communities.id)")
+    parser.add_argument('--generate', type=str, metavar='DIR', help="Write a seeded synthetic dataset to DIR and load it with --import (files only with --dry-run)")
+    parser.add_argument('--scale', type=float, default=1.0, help="Size of the --generate dataset; 1 is about 1M rows (default: 1)")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed for --generate; the same seed, scale and end date give the same rows (default: 1)")
+    parser.add_argument('--generate-end', type=str, metavar='YYYY-MM-DD', help="Date of the newest generated post (default: today, UTC)")
+    parser.add_argument('--chunk-rows', type=int, default=100000, help="Primary-key range per --export chunk (default: 100000)")
+    parser.add_argument('--lint', action='store_true', help="Check the migrations offline for redundant indexes and unindexed foreign keys; exits 1 on findings not in lint-baseline.txt")
+    parser.add_argument('--update-lint-baseline', action='store_true', help="With --lint, accept the current findings into lint-baseline.txt")
+    parser.add_argument('--check-schema', action='store_true', help="Compare a fingerprint of the live schema with the one the applied migrations produce; prints a diff and exits 1 on drift")
+    parser.add_argument('--preflight', action='store_true', help="Show how pending migrations (to --to or latest) will run: INSTANT/INPLACE/COPY, locks, table sizes and estimated durations")
+    parser.add_argument('--squash', type=str, metavar='UPTO', help="Write baselines/<timestamp>.sql, one script with the schema and seed rows of the migrations up to UPTO; fresh databases load it instead of replaying them")
+    parser.add_argument('--rehearse', action='store_true', help="Apply pending migrations (to --to or latest) to a sampled scratch copy of the database, report measured and extrapolated statement times, then drop the copy")
+    parser.add_argument('--rehearse-sample', type=int, default=DEFAULT_SAMPLE_ROWS, help=f"Rows copied per affected table for --rehearse; 0 copies all rows (default: {DEFAULT_SAMPLE_ROWS})")
+    parser.add_argument('--bench', action='store_true', help="Benchmark the backend's hot queries (EXPLAIN/ANALYZE FORMAT=JSON and latency percentiles); exits 1 on regressions")
+    parser.add_argument('--bench-apply', action='store_true', help="With --bench, apply pending migrations (to --to or latest) one at a time, benchmarking after each; for seeded scratch databases only")
+    parser.add_argument('--bench-iterations', type=int, default=50, help="Timed executions per query for --bench (default: 50)")
+    parser.add_argument('--bench-output', type=str, metavar='PATH', help="Write the --bench results as JSON, usable later as --bench-baseline")
+    parser.add_argument('--bench-baseline', type=str, metavar='PATH', help="Compare --bench against the last run in this results file")
+    parser.add_argument('--max-regression', type=float, default=1.5, help="Fail --bench when p95 latency or rows examined grow by more than this factor (default: 1.5)")
+    parser.add_argument('--max-copy-rows', type=int, default=DEFAULT_MAX_COPY_ROWS, help="Refuse COPY-algorithm ALTERs on tables with more rows than this (default: 1000000)")
+    parser.add_argument('--allow-copy', action='store_true', help="Allow COPY-algorithm ALTERs on tables above --max-copy-rows")
+    parser.add_argument('--report', type=str, metavar='PATH', help="With --to-latest/--to/--rehearse, write a JSON report of every statement's time, rows, warnings and Handler_*/Innodb_rows_* deltas")
+    parser.add_argument('--metrics-textfile', type=str, metavar='PATH', help="With --to-latest/--to, write per-migration metrics for the node_exporter textfile collector")
+    parser.add_argument('--lock-timeout', type=int, default=5, help="Seconds a migration statement may wait for a metadata or row lock before it is retried (default: 5)")
+    parser.add_argument('--lock-retries', type=int, default=5, help="Attempts per migration statement after lock wait timeouts (default: 5)")
+    parser.add_argument('--max-statement-time', type=float, default=0, help="Abort migration statements running longer than this many seconds (default: 0, no limit)")
+    parser.add_argument('--batch-size', type=int, default=0, help="Send runs of up to N DML statements per round trip, merging compatible INSERTs (default: 0, off)")
     args = parser.parse_args()
 
     if args.verbose:
         logger.setLevel(logging.DEBUG)
 
     migrator = Migrator()
+    lock_policy = LockPolicy(args.lock_timeout, args.lock_retries, args.max_statement_time)
     try:
         if args.add_global_admin:
             logger.info(f"Adding global admin: {args.add_global_admin}")
@@ -594,7 +1384,59 @@ if __name__ == '__main__':
             migrator.remove_global_admin(args.remove_global_admin)
         elif args.run:
             logger.info(f"Running query: {args.run}")
-            migrator.run_query(args.run, ignore_warnings=args.ignore_warnings)
+            migrator.run_query(args.run, ignore_warnings=args.ignore_warnings, fmt=args.format, output=args.output, limit=args.limit)
+        elif args.serve:
+            serve(migrator, args.serve_host, args.serve_port, target_version=args.to, jobs=args.jobs, batch_size=args.batch_size,
+                  resume=args.resume, max_copy_rows=args.max_copy_rows, allow_copy=args.allow_copy, report_path=args.report,
+                  metrics_path=args.metrics_textfile, lock_policy=lock_policy)
+        elif args.fleet:
+            if not migrator.fan_out(args.fleet, args.to, args.dry_run, args.ignore_warnings, args.fleet_jobs, args.per_host_jobs,
+                                    args.canaries, args.max_failure_rate, Path(args.fleet_logs), jobs=args.jobs, batch_size=args.batch_size,
+                                    resume=args.resume, max_copy_rows=args.max_copy_rows, allow_copy=args.allow_copy, lock_policy=lock_policy):
+                exit(1)
+        elif args.shell or args.run_file:
+            session = Session(migrator, args.pool_size, args.format, args.ignore_warnings)
+            try:
+                if args.run_file:
+                    if not session.run_file(Path(args.run_file)):
+                        exit(1)
+                else:
+                    session.interactive()
+            finally:
+                session.close()
+        elif args.partitions:
+            tables = [t.strip() for t in args.partition_tables.split(',') if t.strip()] if args.partition_tables else None
+            migrator.manage_partitions(tables, args.partition_interval, args.premake, dry_run=args.dry_run)
+        elif args.prune:
+            tables = [t.strip() for t in args.prune_tables.split(',') if t.strip()] if args.prune_tables else None
+            migrator.prune(tables, args.prune_batch_size, args.max_rows_per_second, args.lock_wait_timeout, dry_run=args.dry_run)
+        elif args.refresh_rollups or args.rebuild_rollups or args.check_rollups:
+            tables = [t.strip() for t in args.rollup_tables.split(',') if t.strip()] if args.rollup_tables else None
+            if not migrator.refresh_rollups(tables, rebuild=args.rebuild_rollups, refresh=args.refresh_rollups, check=args.check_rollups):
+                exit(1)
+        elif args.export:
+            migrator.export_data(args.export, args.jobs, args.chunk_rows, args.community)
+        elif args.import_dir:
+            migrator.import_data(args.import_dir, args.jobs, ignore_warnings=args.ignore_warnings)
+        elif args.generate:
+            migrator.generate_data(args.generate, args.scale, args.seed, max(args.jobs, 1), args.generate_end, args.dry_run)
+        elif args.preflight:
+            migrator.preflight(args.to, args.max_copy_rows, args.allow_copy)
+        elif args.lint:
+            if not migrator.lint(update_baseline=args.update_lint_baseline):
+                exit(1)
+        elif args.check_schema:
+            if not migrator.validate_schema(full_validation=True):
+                exit(1)
+        elif args.squash:
+            migrator.squash(args.squash)
+        elif args.rehearse:
+            if not migrator.rehearse(args.to, args.rehearse_sample or None, args.jobs, args.batch_size, lock_policy, args.report):
+                exit(1)
+        elif args.bench:
+            if not migrator.benchmark(args.to, args.bench_apply, args.bench_iterations, args.bench_output,
+                                      args.bench_baseline, args.max_regression):
+                exit(1)
         elif args.list:
             migrations = migrator.list_migrations()
             if not migrations:
@@ -626,11 +1468,15 @@ if __name__ == '__main__':
                 print(f"Applied: {len(status['behind']) + (1 if status['current'] else 0)}")
                 print(f"Pending: {len(status['ahead'])}")
         elif args.new:
-            migrator.create_migration(non_interactive=args.ignore_warnings)
+            migrator.create_migration(non_interactive=args.ignore_warnings, python=args.python)
         elif args.to_latest:
-            migrator.run(dry_run=args.dry_run, ignore_warnings=args.ignore_warnings)
+            migrator.run(dry_run=args.dry_run, ignore_warnings=args.ignore_warnings, jobs=args.jobs, batch_size=args.batch_size, resume=args.resume,
+                         max_copy_rows=args.max_copy_rows, allow_copy=args.allow_copy, report_path=args.report, metrics_path=args.metrics_textfile,
+                         lock_policy=lock_policy)
         elif args.to:
-            migrator.run(target_version=args.to, dry_run=args.dry_run, ignore_warnings=args.ignore_warnings)
+            migrator.run(target_version=args.to, dry_run=args.dry_run, ignore_warnings=args.ignore_warnings, jobs=args.jobs, batch_size=args.batch_size, resume=args.resume,
+                         max_copy_rows=args.max_copy_rows, allow_copy=args.allow_copy, report_path=args.report, metrics_path=args.metrics_textfile,
+                         lock_policy=lock_policy)
         else:
             parser.print_help()
     except Exception as e:
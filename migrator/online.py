@@ -0,0 +1,313 @@
+import re
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+from mysql.connector import Error
+from tokenizer import quote_identifier, unquote_identifier
+from db import run_statement, run_update
+
+logger = logging.getLogger(__name__)
+
+ALTER_TABLE_RE = re.compile(
+    r'^\s*ALTER\s+(?:ONLINE\s+)?(?:IGNORE\s+)?TABLE\s+(?:IF\s+EXISTS\s+)?'
+    r'((?:`(?:[^`]|``)+`|[\w$]+)(?:\s*\.\s*(?:`(?:[^`]|``)+`|[\w$]+))?)\s+(.*?)\s*;?\s*$',
+    re.IGNORECASE | re.DOTALL
+)
+
+# Clauses that cannot be replayed on a shadow copy without losing data or constraints
+UNSUPPORTED_CLAUSE_RE = re.compile(
+    r'\b(?:FOREIGN\s+KEY|CHANGE\b|RENAME\s+(?!INDEX\b|KEY\b)|PARTITION\b)',
+    re.IGNORECASE
+)
+# Partitioning is allowed when the caller opts in with partitioned=True
+UNSUPPORTED_PARTITIONED_CLAUSE_RE = re.compile(
+    r'\b(?:FOREIGN\s+KEY|CHANGE\b|RENAME\s+(?!INDEX\b|KEY\b))',
+    re.IGNORECASE
+)
+
+def parse_alter_table(statement: str) -> Optional[Tuple[str, str]]:
+    """Return (table, alter clause) for an ALTER TABLE statement, or None for anything else."""
+    match = ALTER_TABLE_RE.match(statement)
+    if not match:
+        return None
+    return unquote_identifier(match.group(1)), match.group(2)
+
+class OnlineSchemaChange:
+    """
+    Trigger-based online ALTER TABLE, in the style of pt-online-schema-change.
+
+    1. Create an empty shadow table (`_<table>_new`) with CREATE TABLE ... LIKE and apply
+       the ALTER clause to it.
+    2. Install AFTER INSERT/UPDATE/DELETE triggers on the original table that mirror writes
+       into the shadow table.
+    3. Copy existing rows in primary-key chunks, resizing chunks to hit `chunk_time` and
+       pausing while the server is busier than `max_threads_running`.
+    4. Recreate the table's foreign keys on the shadow table, swap both tables with one
+       atomic RENAME TABLE, repoint child foreign keys and drop the old table.
+
+    With `partitioned=True` the ALTER clause may partition the table. InnoDB does not support
+    foreign keys on partitioned tables, so the table's own foreign keys are dropped and tables
+    referencing it are refused.
+    """
+
+    def __init__(self, connection, database: str, table: str, alter_clause: str,
+                 chunk_size: int = 1000, chunk_time: float = 0.5, sleep: float = 0.0,
+                 max_threads_running: int = 50, keep_old_table: bool = False, partitioned: bool = False):
+        unsupported = UNSUPPORTED_PARTITIONED_CLAUSE_RE if partitioned else UNSUPPORTED_CLAUSE_RE
+        if unsupported.search(alter_clause):
+            raise ValueError(
+                f"Online schema change does not support foreign key, CHANGE/RENAME or partition clauses "
+                f"(table {table}); run this ALTER as a regular statement instead"
+            )
+        self.connection = connection
+        self.database = database
+        self.table = table
+        self.alter_clause = alter_clause
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_time = chunk_time
+        self.sleep = sleep
+        self.max_threads_running = max_threads_running
+        self.keep_old_table = keep_old_table
+        self.partitioned = partitioned
+        self.shadow = f"_{table}_new"
+        self.old = f"_{table}_old"
+        self.triggers = [f"osc_{table}_{event}"[:64] for event in ('ins', 'upd', 'del')]
+
+    def get_primary_key(self) -> str:
+        """Return the single-column primary key used for chunking."""
+        rows = run_statement(
+            self.connection,
+            "SELECT COLUMN_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME = 'PRIMARY' ORDER BY SEQ_IN_INDEX",
+            (self.database, self.table)
+        )
+        if len(rows) != 1:
+            raise ValueError(f"Online schema change requires a single-column primary key on {self.table}")
+        return rows[0][0]
+
+    def get_columns(self, table: str) -> List[str]:
+        """Return the column names of a table in ordinal order."""
+        rows = run_statement(
+            self.connection,
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+            (self.database, table)
+        )
+        return [row[0] for row in rows]
+
+    def get_foreign_keys(self, referenced: bool = False) -> List[Dict]:
+        """
+        Return foreign keys defined on the table, or (referenced=True) those of other tables
+        that point at it. Each entry holds the owning table, name, columns, parent and rules.
+        """
+        column = 'kcu.REFERENCED_TABLE_NAME' if referenced else 'kcu.TABLE_NAME'
+        rows = run_statement(
+            self.connection,
+            "SELECT kcu.TABLE_NAME, kcu.CONSTRAINT_NAME, kcu.COLUMN_NAME, kcu.REFERENCED_TABLE_NAME, "
+            "kcu.REFERENCED_COLUMN_NAME, rc.UPDATE_RULE, rc.DELETE_RULE "
+            "FROM information_schema.KEY_COLUMN_USAGE kcu "
+            "JOIN information_schema.REFERENTIAL_CONSTRAINTS rc "
+            "ON rc.CONSTRAINT_SCHEMA = kcu.CONSTRAINT_SCHEMA AND rc.CONSTRAINT_NAME = kcu.CONSTRAINT_NAME "
+            "AND rc.TABLE_NAME = kcu.TABLE_NAME "
+            f"WHERE kcu.TABLE_SCHEMA = %s AND {column} = %s AND kcu.REFERENCED_TABLE_NAME IS NOT NULL "
+            "ORDER BY kcu.TABLE_NAME, kcu.CONSTRAINT_NAME, kcu.ORDINAL_POSITION",
+            (self.database, self.table)
+        )
+        keys: Dict[Tuple[str, str], Dict] = {}
+        for table, name, col, ref_table, ref_col, on_update, on_delete in rows:
+            key = keys.setdefault((table, name), {
+                'table': table, 'name': name, 'columns': [], 'ref_table': ref_table,
+                'ref_columns': [], 'on_update': on_update, 'on_delete': on_delete
+            })
+            key['columns'].append(col)
+            key['ref_columns'].append(ref_col)
+        return list(keys.values())
+
+    @staticmethod
+    def foreign_key_clause(fk: Dict, ref_table: str) -> str:
+        """Build an ADD CONSTRAINT clause, toggling the leading underscore of the name like pt-osc."""
+        name = fk['name'][1:] if fk['name'].startswith('_') else f"_{fk['name']}"
+        columns = ', '.join(quote_identifier(c) for c in fk['columns'])
+        ref_columns = ', '.join(quote_identifier(c) for c in fk['ref_columns'])
+        return (
+            f"ADD CONSTRAINT {quote_identifier(name[:64])} FOREIGN KEY ({columns}) "
+            f"REFERENCES {quote_identifier(ref_table)} ({ref_columns}) "
+            f"ON DELETE {fk['on_delete']} ON UPDATE {fk['on_update']}"
+        )
+
+    def create_shadow(self) -> None:
+        """Create the altered, empty shadow table (foreign keys are added right before the swap)."""
+        run_statement(self.connection, f"DROP TABLE IF EXISTS {quote_identifier(self.shadow)}")
+        run_statement(self.connection, f"CREATE TABLE {quote_identifier(self.shadow)} LIKE {quote_identifier(self.table)}")
+        run_statement(self.connection, f"ALTER TABLE {quote_identifier(self.shadow)} {self.alter_clause}")
+
+    def create_triggers(self, pk: str, columns: List[str]) -> None:
+        """Install triggers that mirror every write on the original table into the shadow table."""
+        table, shadow = quote_identifier(self.table), quote_identifier(self.shadow)
+        column_list = ', '.join(quote_identifier(c) for c in columns)
+        new_values = ', '.join(f"NEW.{quote_identifier(c)}" for c in columns)
+        qpk = quote_identifier(pk)
+        ins, upd, dele = (quote_identifier(t) for t in self.triggers)
+        self.drop_triggers()
+        run_statement(
+            self.connection,
+            f"CREATE TRIGGER {dele} AFTER DELETE ON {table} FOR EACH ROW "
+            f"DELETE IGNORE FROM {shadow} WHERE {shadow}.{qpk} = OLD.{qpk}"
+        )
+        run_statement(
+            self.connection,
+            f"CREATE TRIGGER {upd} AFTER UPDATE ON {table} FOR EACH ROW BEGIN "
+            f"DELETE IGNORE FROM {shadow} WHERE {shadow}.{qpk} = OLD.{qpk}; "
+            f"REPLACE INTO {shadow} ({column_list}) VALUES ({new_values}); END"
+        )
+        run_statement(
+            self.connection,
+            f"CREATE TRIGGER {ins} AFTER INSERT ON {table} FOR EACH ROW "
+            f"REPLACE INTO {shadow} ({column_list}) VALUES ({new_values})"
+        )
+
+    def drop_triggers(self) -> None:
+        """Drop the mirroring triggers if present."""
+        for trigger in self.triggers:
+            run_statement(self.connection, f"DROP TRIGGER IF EXISTS {quote_identifier(trigger)}")
+
+    def wait_for_load(self) -> None:
+        """Pause copying while Threads_running is above the configured maximum."""
+        while True:
+            rows = run_statement(self.connection, "SHOW GLOBAL STATUS LIKE 'Threads_running'")
+            running = int(rows[0][1]) if rows else 0
+            if running <= self.max_threads_running:
+                return
+            logger.info(f"Threads_running={running} exceeds {self.max_threads_running}; pausing copy of {self.table}")
+            time.sleep(1)
+
+    def copy_rows(self, pk: str, columns: List[str]) -> int:
+        """Copy existing rows into the shadow table in primary-key order and return the count copied."""
+        table, shadow, qpk = quote_identifier(self.table), quote_identifier(self.shadow), quote_identifier(pk)
+        column_list = ', '.join(quote_identifier(c) for c in columns)
+        bounds = run_statement(self.connection, f"SELECT MIN({qpk}), MAX({qpk}) FROM {table}")
+        low, high = bounds[0] if bounds else (None, None)
+        if low is None:
+            logger.info(f"Table {self.table} is empty; nothing to copy")
+            return 0
+        total_estimate = run_statement(
+            self.connection,
+            "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+            (self.database, self.table)
+        )
+        total_estimate = int(total_estimate[0][0] or 0) if total_estimate else 0
+        chunk_size = self.chunk_size
+        copied = 0
+        last = None
+        while True:
+            self.wait_for_load()
+            start = time.monotonic()
+            where = f"WHERE {qpk} > %s" if last is not None else f"WHERE {qpk} >= %s"
+            boundary = run_statement(
+                self.connection,
+                f"SELECT MAX({qpk}) FROM (SELECT {qpk} FROM {table} {where} "
+                f"ORDER BY {qpk} LIMIT {int(chunk_size)}) chunk",
+                (last if last is not None else low,)
+            )
+            upper = boundary[0][0] if boundary else None
+            if upper is None:
+                break
+            copied += run_update(
+                self.connection,
+                f"INSERT LOW_PRIORITY IGNORE INTO {shadow} ({column_list}) "
+                f"SELECT {column_list} FROM {table} FORCE INDEX (PRIMARY) "
+                f"{where} AND {qpk} <= %s LOCK IN SHARE MODE",
+                (last if last is not None else low, upper)
+            )
+            self.connection.commit()
+            last = upper
+            elapsed = time.monotonic() - start
+            if self.chunk_time > 0 and elapsed > 0:
+                # Resize the next chunk towards the target chunk time, damped to avoid oscillation
+                chunk_size = int(max(100, min(chunk_size * 4, chunk_size * self.chunk_time / elapsed)))
+            if total_estimate:
+                logger.info(f"Copied {copied}/{total_estimate} rows of {self.table} "
+                            f"({min(100.0, 100.0 * copied / total_estimate):.1f}%), up to {pk}={upper}")
+            if upper >= high:
+                # Rows inserted after the copy started are mirrored by the triggers
+                break
+            if self.sleep:
+                time.sleep(self.sleep)
+        return copied
+
+    def swap(self) -> None:
+        """Add foreign keys to the shadow table, atomically swap it in and repoint child tables."""
+        own_keys = self.get_foreign_keys()
+        child_keys = [fk for fk in self.get_foreign_keys(referenced=True) if fk['table'] != self.table]
+        if self.partitioned:
+            if own_keys:
+                logger.warning(f"Dropping foreign keys of {self.table} ({', '.join(fk['name'] for fk in own_keys)}); "
+                               f"partitioned tables cannot have foreign keys")
+            own_keys = []
+        run_statement(self.connection, "SET SESSION foreign_key_checks = 0")
+        try:
+            if own_keys:
+                clauses = ', '.join(
+                    self.foreign_key_clause(fk, self.shadow if fk['ref_table'] == self.table else fk['ref_table'])
+                    for fk in own_keys
+                )
+                # With foreign_key_checks disabled this is an in-place, metadata-only change
+                run_statement(self.connection, f"ALTER TABLE {quote_identifier(self.shadow)} {clauses}")
+            run_statement(
+                self.connection,
+                f"RENAME TABLE {quote_identifier(self.table)} TO {quote_identifier(self.old)}, "
+                f"{quote_identifier(self.shadow)} TO {quote_identifier(self.table)}"
+            )
+            logger.info(f"Swapped {self.shadow} in for {self.table}")
+            for fk in child_keys:
+                run_statement(
+                    self.connection,
+                    f"ALTER TABLE {quote_identifier(fk['table'])} DROP FOREIGN KEY {quote_identifier(fk['name'])}, "
+                    f"{self.foreign_key_clause(fk, self.table)}"
+                )
+        finally:
+            run_statement(self.connection, "SET SESSION foreign_key_checks = 1")
+
+    def cleanup(self, swapped: bool) -> None:
+        """Drop triggers and whichever leftover table is no longer needed."""
+        self.drop_triggers()
+        if swapped:
+            if self.keep_old_table:
+                logger.info(f"Keeping previous table as {self.old}")
+            else:
+                run_statement(self.connection, f"DROP TABLE IF EXISTS {quote_identifier(self.old)}")
+        else:
+            run_statement(self.connection, f"DROP TABLE IF EXISTS {quote_identifier(self.shadow)}")
+
+    def run(self) -> None:
+        """Perform the online schema change."""
+        logger.info(f"Starting online schema change of {self.table}: {self.alter_clause}")
+        started = time.monotonic()
+        pk = self.get_primary_key()
+        if self.partitioned:
+            children = sorted({fk['table'] for fk in self.get_foreign_keys(referenced=True) if fk['table'] != self.table})
+            if children:
+                raise ValueError(f"Cannot partition {self.table}: it is referenced by foreign keys of {', '.join(children)}")
+        swapped = False
+        try:
+            self.create_shadow()
+            old_columns = self.get_columns(self.table)
+            new_columns = set(self.get_columns(self.shadow))
+            if pk not in new_columns:
+                raise ValueError(f"Online schema change cannot drop primary key column {pk} of {self.table}")
+            # Columns dropped by the ALTER are not copied; added columns take their defaults
+            columns = [c for c in old_columns if c in new_columns]
+            self.create_triggers(pk, columns)
+            copied = self.copy_rows(pk, columns)
+            self.swap()
+            swapped = True
+            logger.info(f"Online schema change of {self.table} completed: {copied} rows copied "
+                        f"in {time.monotonic() - started:.1f}s")
+        except (Error, ValueError) as e:
+            logger.error(f"Online schema change of {self.table} failed: {e}")
+            raise
+        finally:
+            try:
+                self.cleanup(swapped)
+            except Error as e:
+                logger.error(f"Failed to clean up online schema change of {self.table}: {e}")
@@ -0,0 +1,94 @@
+import csv
+import json
+import time
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional, Sequence, TextIO
+from tabulate import tabulate
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('table', 'csv', 'tsv', 'jsonl')
+READ_QUERY_PREFIXES = ('select', 'with', 'show', 'explain', 'describe', 'desc')
+
+def format_value(value):
+    """Convert a column value to something csv/json can write; bytes that are not UTF-8 become hex."""
+    if isinstance(value, (bytes, bytearray)):
+        try:
+            return bytes(value).decode('utf-8')
+        except UnicodeDecodeError:
+            return '0x' + bytes(value).hex()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, (Decimal, timedelta)):
+        return str(value)
+    return value
+
+def truncate_value(value, max_length: int = 30) -> str:
+    """Shorten a value for the grid display."""
+    s = str(value)
+    if len(s) > max_length:
+        return s[:max_length - 2] + ".."
+    return s
+
+class RowWriter:
+    """Incremental writer of result rows as CSV (with header), TSV (NULL as \\N) or JSON lines."""
+
+    def __init__(self, stream: TextIO, fmt: str, columns: Sequence[str]):
+        if fmt not in ('csv', 'tsv', 'jsonl'):
+            raise ValueError(f"Unsupported streaming format: {fmt}")
+        self.stream = stream
+        self.fmt = fmt
+        self.columns = list(columns)
+        self.rows = 0
+        if fmt == 'csv':
+            self.writer = csv.writer(stream)
+            self.writer.writerow(self.columns)
+        elif fmt == 'tsv':
+            stream.write('\t'.join(self.columns) + '\n')
+
+    def write(self, rows: List[Sequence]) -> None:
+        """Write a batch of rows given as sequences in column order."""
+        if self.fmt == 'csv':
+            self.writer.writerows([format_value(v) for v in row] for row in rows)
+        elif self.fmt == 'tsv':
+            self.stream.writelines(
+                '\t'.join('\\N' if v is None else str(format_value(v)).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+                          for v in row) + '\n'
+                for row in rows
+            )
+        else:
+            self.stream.writelines(
+                json.dumps(dict(zip(self.columns, (format_value(v) for v in row))), ensure_ascii=False, default=str) + '\n'
+                for row in rows
+            )
+        self.rows += len(rows)
+
+class Progress:
+    """Logs a row counter and rate at most every `interval` seconds."""
+
+    def __init__(self, label: str, interval: float = 5.0):
+        self.label = label
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last = self.started
+        self.count = 0
+
+    def add(self, rows: int) -> None:
+        """Count fetched rows and log progress when due."""
+        self.count += rows
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            logger.info(f"{self.label}: {self.count} rows ({self.count / (now - self.started):.0f} rows/s)")
+
+    def done(self) -> None:
+        """Log the final count."""
+        elapsed = time.monotonic() - self.started
+        logger.info(f"{self.label}: {self.count} rows in {elapsed:.1f}s")
+
+def print_table(columns: List[str], rows: List[Sequence], stream: Optional[TextIO] = None) -> None:
+    """Render rows as a grid, truncating long values."""
+    truncated = [[truncate_value(v) for v in row] for row in rows]
+    print(tabulate(truncated, headers=columns, tablefmt="grid"), file=stream)
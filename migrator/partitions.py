@@ -0,0 +1,185 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from tokenizer import quote_identifier
+from online import OnlineSchemaChange
+from db import run_statement
+
+logger = logging.getLogger(__name__)
+
+# Append-only tables partitioned by time, with their partitioning column
+PARTITIONED_TABLES: Dict[str, str] = {
+    'logs': 'created_at',
+    'moderation_logs': 'created_at',
+    'notifications': 'created_at',
+}
+
+INTERVALS = ('day', 'week', 'month')
+MAXVALUE_PARTITION = 'pmax'
+OLDEST_PARTITION = 'pold'
+
+def interval_start(moment: datetime, interval: str) -> datetime:
+    """Return the start (UTC midnight) of the interval containing `moment`."""
+    day = moment.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+def next_interval(start: datetime, interval: str) -> datetime:
+    """Return the start of the interval following the one starting at `start`."""
+    if interval == 'week':
+        return start + timedelta(days=7)
+    if interval == 'month':
+        return (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+def partition_name(start: datetime) -> str:
+    """Name the partition holding rows from `start`, e.g. p20261017."""
+    return f"p{start:%Y%m%d}"
+
+def partition_definition(name: str, bound: Optional[datetime]) -> str:
+    """Build a PARTITION clause; bound None is the catch-all MAXVALUE partition."""
+    if bound is None:
+        return f"PARTITION {quote_identifier(name)} VALUES LESS THAN MAXVALUE"
+    return f"PARTITION {quote_identifier(name)} VALUES LESS THAN ({int(bound.timestamp())})"
+
+class PartitionManager:
+    """
+    RANGE partitioning of an append-only table on UNIX_TIMESTAMP(<column>).
+
+    Each partition holds one interval (day, week or month, in UTC) and is named after the
+    interval's first day; a trailing `pmax` partition catches rows beyond the last interval.
+    `maintain()` splits future partitions off the empty `pmax` and drops partitions entirely
+    older than the retention period, which is metadata work instead of a DELETE scan.
+    """
+
+    def __init__(self, connection, database: str, table: str, column: str = 'created_at',
+                 interval: str = 'day', premake: int = 7, retention: Optional[int] = None,
+                 chunk_size: int = 1000, chunk_time: float = 0.5, sleep: float = 0.0,
+                 max_threads_running: int = 50):
+        if interval not in INTERVALS:
+            raise ValueError(f"Partition interval must be one of {', '.join(INTERVALS)}")
+        self.connection = connection
+        self.database = database
+        self.table = table
+        self.column = column
+        self.interval = interval
+        self.premake = premake
+        self.retention = retention
+        self.osc_options = {
+            'chunk_size': chunk_size, 'chunk_time': chunk_time, 'sleep': sleep,
+            'max_threads_running': max_threads_running,
+        }
+
+    def get_partitions(self) -> List[Tuple[str, Optional[int]]]:
+        """Return (name, upper bound) of each partition in order, bound None for MAXVALUE; [] if unpartitioned."""
+        rows = run_statement(
+            self.connection,
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            (self.database, self.table)
+        )
+        return [(name, None if str(bound).upper() == 'MAXVALUE' else int(bound)) for name, bound in rows]
+
+    def now(self) -> datetime:
+        """Current time in UTC."""
+        return datetime.now(timezone.utc)
+
+    def cutoff(self) -> Optional[datetime]:
+        """Rows created before this moment are past retention."""
+        if not self.retention:
+            return None
+        return self.now() - timedelta(seconds=self.retention)
+
+    def future_bounds(self, after: datetime) -> List[datetime]:
+        """Interval starts after `after` up to `premake` intervals beyond the current one."""
+        horizon = interval_start(self.now(), self.interval)
+        for _ in range(self.premake + 1):
+            horizon = next_interval(horizon, self.interval)
+        bounds = []
+        bound = next_interval(interval_start(after, self.interval), self.interval)
+        while bound <= horizon:
+            bounds.append(bound)
+            bound = next_interval(bound, self.interval)
+        return bounds
+
+    def initial_layout(self) -> List[str]:
+        """
+        Partition definitions for converting the table: one partition for everything older than
+        the first retained interval (`pold`), one per interval up to `premake` ahead, and `pmax`.
+        """
+        cutoff = self.cutoff()
+        first = interval_start(cutoff or self.now(), self.interval)
+        definitions = [partition_definition(OLDEST_PARTITION, first)]
+        start = first
+        for bound in self.future_bounds(first):
+            definitions.append(partition_definition(partition_name(start), bound))
+            start = bound
+        definitions.append(partition_definition(MAXVALUE_PARTITION, None))
+        return definitions
+
+    def convert(self, dry_run: bool = False) -> None:
+        """Partition the table online (shadow table copy and atomic swap)."""
+        column = quote_identifier(self.column)
+        alter_clause = (
+            f"DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, {column}) "
+            f"PARTITION BY RANGE (UNIX_TIMESTAMP({column})) ({', '.join(self.initial_layout())})"
+        )
+        if dry_run:
+            logger.info(f"Dry run: Would partition {self.table} online: {alter_clause}")
+            return
+        logger.info(f"Partitioning {self.table} by {self.interval} on {self.column}")
+        OnlineSchemaChange(self.connection, self.database, self.table, alter_clause,
+                           partitioned=True, **self.osc_options).run()
+
+    def maintain(self, dry_run: bool = False) -> Tuple[int, int]:
+        """Pre-create future partitions and drop expired ones; returns (added, dropped)."""
+        partitions = self.get_partitions()
+        if not partitions:
+            raise ValueError(f"Table {self.table} is not partitioned")
+        if partitions[-1][1] is not None:
+            raise ValueError(f"Table {self.table} has no {MAXVALUE_PARTITION} partition to split future partitions from")
+        table = quote_identifier(self.table)
+        bounded = [(name, bound) for name, bound in partitions if bound is not None]
+        last = datetime.fromtimestamp(bounded[-1][1], timezone.utc) if bounded else interval_start(self.now(), self.interval)
+        added = []
+        start = last
+        for bound in self.future_bounds(last):
+            added.append(partition_definition(partition_name(start), bound))
+            start = bound
+        if added:
+            statement = (
+                f"ALTER TABLE {table} REORGANIZE PARTITION {quote_identifier(MAXVALUE_PARTITION)} INTO "
+                f"({', '.join(added + [partition_definition(MAXVALUE_PARTITION, None)])})"
+            )
+            if dry_run:
+                logger.info(f"Dry run: {statement}")
+            else:
+                # pmax is empty while partitions are made ahead of time, so this only rewrites metadata
+                run_statement(self.connection, statement)
+                logger.info(f"Added {len(added)} partitions to {self.table}, up to {start:%Y-%m-%d}")
+        expired = []
+        cutoff = self.cutoff()
+        if cutoff is not None:
+            expired = [name for name, bound in bounded if bound <= int(cutoff.timestamp())]
+            # Keep at least one bounded partition so the layout stays valid
+            expired = expired[:max(0, len(bounded) - 1)]
+        if expired:
+            statement = f"ALTER TABLE {table} DROP PARTITION {', '.join(quote_identifier(n) for n in expired)}"
+            if dry_run:
+                logger.info(f"Dry run: {statement}")
+            else:
+                run_statement(self.connection, statement)
+                logger.info(f"Dropped {len(expired)} expired partitions of {self.table} (before {cutoff:%Y-%m-%d %H:%M})")
+        return len(added), len(expired)
+
+    def run(self, dry_run: bool = False) -> None:
+        """Partition the table if needed, then maintain its partitions."""
+        if not self.get_partitions():
+            self.convert(dry_run)
+            if dry_run:
+                return
+        self.maintain(dry_run)
@@ -0,0 +1,303 @@
+import re
+import logging
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from tokenizer import iter_sql_statements, read_directives, unquote_identifier
+from executor import strip_literals
+from online import parse_alter_table
+from schema_model import SchemaModel, Table, parse_column, split_top_level
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ('INSTANT', 'INPLACE', 'COPY')  # in order of cost
+LOCKS = ('NONE', 'SHARED', 'EXCLUSIVE')
+DEFAULT_MAX_COPY_ROWS = 1000000
+BYTES_PER_CHAR = 4  # utf8mb4, for the VARCHAR length-byte rule
+
+# Rough throughput (rows/s, bytes/s) of each kind of work, for duration estimates
+THROUGHPUT: Dict[str, Tuple[int, int]] = {
+    'INDEX': (500000, 100 * 1024 * 1024),    # INPLACE secondary index build (sort + bulk load)
+    'REBUILD': (100000, 50 * 1024 * 1024),   # INPLACE table rebuild
+    'COPY': (50000, 20 * 1024 * 1024),       # row-by-row copy into a new table
+    'ONLINE': (10000, 10 * 1024 * 1024),     # chunked shadow-table copy (-- migrator:online)
+    'DML': (20000, 20 * 1024 * 1024),        # UPDATE/DELETE/INSERT ... SELECT scan
+}
+
+class TableSize(NamedTuple):
+    rows: int  # information_schema.TABLES.TABLE_ROWS, an estimate for InnoDB
+    data_length: int
+    index_length: int
+
+EMPTY = TableSize(0, 0, 0)
+
+class Cost(NamedTuple):
+    algorithm: str  # INSTANT, INPLACE or COPY; ONLINE for shadow-table changes, DML for data changes
+    lock: str  # NONE, SHARED or EXCLUSIVE (ROW for DML)
+    work: Optional[str]  # key into THROUGHPUT, None for metadata-only changes
+    note: str
+
+class Assessment(NamedTuple):
+    migration: str
+    number: int  # statement number within the script
+    table: Optional[str]
+    operation: str
+    cost: Cost
+    size: TableSize
+    seconds: float
+    blocked: bool
+
+def worst(costs: List[Cost]) -> Cost:
+    """Combine the costs of the clauses of one statement: the costliest algorithm and strongest lock win."""
+    algorithm = max((c.algorithm for c in costs), key=lambda a: ALGORITHMS.index(a) if a in ALGORITHMS else 0)
+    lock = max((c.lock for c in costs), key=lambda l: LOCKS.index(l) if l in LOCKS else 0)
+    works = [c.work for c in costs if c.work]
+    work = min(works, key=lambda w: THROUGHPUT[w][0]) if works else None  # the slowest kind of work
+    notes = '; '.join(dict.fromkeys(c.note for c in costs if c.note))
+    return Cost(algorithm, lock, work, notes)
+
+def varchar_bytes(column_type: str) -> Optional[int]:
+    """Maximum byte length of a VARCHAR/VARBINARY type, None for other types."""
+    match = re.match(r'(var)?(char|binary)\((\d+)\)$', column_type)
+    if not match or not match.group(1):
+        return None
+    return int(match.group(3)) * (BYTES_PER_CHAR if match.group(2) == 'char' else 1)
+
+def classify_column_change(table: Optional[Table], old_name: str, definition: str) -> Cost:
+    """Cost of MODIFY/CHANGE COLUMN, comparing the new definition with the modelled column."""
+    definition, _ = SchemaModel.split_position(definition)
+    parsed = parse_column(definition)
+    old = table.columns.get(old_name) if table else None
+    if not parsed or not old:
+        return Cost('COPY', 'SHARED', 'COPY', f"column {old_name} unknown to the schema model; assuming COPY")
+    new, _ = parsed
+    if new.auto_increment and not old.auto_increment:
+        return Cost('COPY', 'SHARED', 'COPY', f"adds AUTO_INCREMENT to {old_name}")
+    if new.type != old.type:
+        old_bytes, new_bytes = varchar_bytes(old.type), varchar_bytes(new.type)
+        same_kind = old.type.split('(')[0] == new.type.split('(')[0]
+        if same_kind and old_bytes is not None and new_bytes is not None and new_bytes >= old_bytes and \
+                (new_bytes <= 255 or old_bytes > 255):
+            pass  # widening within the same length-byte count only rewrites metadata
+        elif same_kind and old.type.startswith(('enum(', 'set(')) and new.type.startswith(old.type[:-1]):
+            pass  # members appended at the end
+        else:
+            return Cost('COPY', 'SHARED', 'COPY', f"{old_name} type {old.type} -> {new.type}")
+    if old.nullable and not new.nullable:
+        return Cost('INPLACE', 'NONE', 'REBUILD', f"{old_name} becomes NOT NULL (rebuild; fails on existing NULLs)")
+    return Cost('INSTANT', 'NONE', None, '')
+
+def classify_alter_clause(table: Optional[Table], clause: str, foreign_key_checks: bool = True) -> Cost:
+    """Cost of one ALTER TABLE clause under MariaDB's (10.6) InnoDB online DDL rules."""
+    text = strip_literals(clause).upper()
+    if re.match(r'ADD\s+(CONSTRAINT\s+\S+\s+)?PRIMARY\s+KEY\b', text):
+        return Cost('INPLACE', 'NONE', 'REBUILD', 'new primary key rebuilds the table')
+    if re.match(r'ADD\s+(CONSTRAINT\s+(\S+\s+)?)?FOREIGN\s+KEY\b', text):
+        if foreign_key_checks:
+            return Cost('COPY', 'SHARED', 'COPY', 'ADD FOREIGN KEY copies unless foreign_key_checks=0')
+        return Cost('INPLACE', 'NONE', None, '')
+    if re.match(r'ADD\s+(CONSTRAINT\s+(\S+\s+)?)?CHECK\b', text):
+        return Cost('COPY', 'SHARED', 'COPY', 'ADD CHECK validates every row by copying')
+    if re.match(r'ADD\s+(FULLTEXT|SPATIAL)\b', text):
+        return Cost('INPLACE', 'SHARED', 'REBUILD', 'FULLTEXT/SPATIAL index blocks writes')
+    if re.match(r'ADD\s+(CONSTRAINT\s+\S+\s+)?(UNIQUE|INDEX|KEY)\b', text):
+        return Cost('INPLACE', 'NONE', 'INDEX', '')
+    if re.match(r'ADD\b', text):
+        body = re.sub(r'^ADD\s+(COLUMN\s+)?(IF\s+NOT\s+EXISTS\s+)?', '', text)
+        if re.search(r'\bAUTO_INCREMENT\b', body):
+            return Cost('COPY', 'SHARED', 'COPY', 'new AUTO_INCREMENT column')
+        if re.search(r'\bPERSISTENT\b|\bSTORED\b', body):
+            return Cost('COPY', 'SHARED', 'COPY', 'new stored generated column')
+        if re.search(r'\bPRIMARY\s+KEY\b', body):
+            return Cost('INPLACE', 'NONE', 'REBUILD', 'new primary key rebuilds the table')
+        if re.search(r'\bUNIQUE\b', body):
+            return Cost('INPLACE', 'NONE', 'INDEX', '')
+        return Cost('INSTANT', 'NONE', None, '')
+    if re.match(r'DROP\s+PRIMARY\s+KEY\b', text):
+        return Cost('COPY', 'SHARED', 'COPY', 'DROP PRIMARY KEY without a new one copies the table')
+    if re.match(r'DROP\s+(INDEX|KEY|FOREIGN\s+KEY|CONSTRAINT|CHECK)\b', text):
+        return Cost('INSTANT', 'NONE', None, '')
+    if re.match(r'DROP\s+PARTITION\b', text):
+        return Cost('INPLACE', 'EXCLUSIVE', None, 'drops partition files')
+    if re.match(r'DROP\b', text):
+        name = unquote_identifier(re.sub(r'^DROP\s+(COLUMN\s+)?(IF\s+EXISTS\s+)?', '', clause.strip(), flags=re.IGNORECASE))
+        primary = table.indexes.get('PRIMARY') if table else None
+        if primary and name in primary.column_names:
+            return Cost('INPLACE', 'NONE', 'REBUILD', f"drops primary key column {name}")
+        return Cost('INSTANT', 'NONE', None, '')
+    if re.match(r'(MODIFY|CHANGE)\b', text):
+        rest = re.sub(r'^(MODIFY|CHANGE)\s+(COLUMN\s+)?(IF\s+EXISTS\s+)?', '', clause.strip(), flags=re.IGNORECASE)
+        if text.startswith('CHANGE'):
+            old_name, _, rest = rest.partition(' ')
+            return classify_column_change(table, unquote_identifier(old_name), rest.strip())
+        parsed = parse_column(rest)
+        return classify_column_change(table, parsed[0].name if parsed else '', rest)
+    if re.match(r'(ALTER\s+(COLUMN\s+)?\S+\s+(SET|DROP)\s+DEFAULT|RENAME\b|COMMENT\b|AUTO_INCREMENT\b|(DEFAULT\s+)?(CHARACTER\s+SET|CHARSET|COLLATE)\b)', text):
+        return Cost('INSTANT', 'NONE', None, '')
+    if re.match(r'(ALTER\s+(INDEX|KEY)\s+\S+\s+(NOT\s+)?(IGNORED|VISIBLE|INVISIBLE))', text):
+        return Cost('INSTANT', 'NONE', None, '')
+    if re.match(r'(ENGINE|FORCE|ROW_FORMAT|KEY_BLOCK_SIZE|PAGE_COMPRESSED)\b', text):
+        return Cost('INPLACE', 'NONE', 'REBUILD', 'table rebuild')
+    if re.match(r'(PARTITION\s+BY|REMOVE\s+PARTITIONING|CONVERT\s+TO|ORDER\s+BY|REORGANIZE\s+PARTITION|COALESCE\s+PARTITION)\b', text):
+        return Cost('COPY', 'SHARED', 'COPY', f"{' '.join(text.split()[:2])} copies rows")
+    if re.match(r'ADD\s+PARTITION\b', text):
+        return Cost('INPLACE', 'EXCLUSIVE', None, '')
+    if re.match(r'(ALGORITHM|LOCK)\s*=', text):
+        return Cost('INSTANT', 'NONE', None, '')
+    return Cost('COPY', 'SHARED', 'COPY', f"unrecognized clause '{clause.strip()[:40]}'; assuming COPY")
+
+def requested_options(clause: str) -> Dict[str, str]:
+    """Explicit ALGORITHM= / LOCK= options of an ALTER TABLE statement."""
+    return {m.group(1).upper(): m.group(2).upper() for m in re.finditer(r'\b(ALGORITHM|LOCK)\s*=?\s*(\w+)', strip_literals(clause), re.IGNORECASE)}
+
+def clause_label(clause: str) -> str:
+    """Short name of an ALTER TABLE clause for reports, e.g. ADD INDEX or MODIFY COLUMN."""
+    words = re.findall(r'[A-Za-z_]+', clause.upper())[:3]
+    if not words:
+        return clause.strip()
+    if words[0] in ('MODIFY', 'CHANGE'):
+        return f"{words[0]} COLUMN"
+    keywords = ('COLUMN', 'INDEX', 'KEY', 'PRIMARY', 'UNIQUE', 'FOREIGN', 'CONSTRAINT', 'CHECK', 'PARTITION',
+                'PARTITIONING', 'FULLTEXT', 'SPATIAL', 'TO', 'BY', 'DEFAULT')
+    label = [words[0]] + [w for w in words[1:] if w in keywords][:1]
+    if label == ['ADD'] or label == ['DROP']:
+        label.append('COLUMN')
+    return ' '.join(label)
+
+def estimate_seconds(cost: Cost, size: TableSize) -> float:
+    """Rough duration: the slower of the row-rate and byte-rate bounds for the kind of work."""
+    if not cost.work:
+        return 0.0
+    rows_per_second, bytes_per_second = THROUGHPUT[cost.work]
+    data = size.data_length if cost.work in ('INDEX', 'DML') else size.data_length + size.index_length
+    return max(size.rows / rows_per_second, data / bytes_per_second)
+
+class Preflight:
+    """
+    Classifies the statements of pending migrations by how MariaDB will execute them:
+    INSTANT (metadata only), INPLACE (built in place, concurrent DML allowed unless the lock says
+    otherwise) or COPY (rows copied into a new table while writes are blocked), with the lock
+    level, the size of the table from information_schema.TABLES and an estimated duration.
+
+    Statements are replayed into a schema model starting from the applied migrations, so a
+    MODIFY is compared with the column as the earlier statements left it. COPY-class statements
+    on tables with more than `max_copy_rows` rows are blocked unless `allow_copy` is set or the
+    script carries `-- migrator:allow-copy [tables=a,b]`.
+    """
+
+    def __init__(self, model: SchemaModel, sizes: Dict[str, TableSize],
+                 max_copy_rows: int = DEFAULT_MAX_COPY_ROWS, allow_copy: bool = False):
+        self.model = model
+        self.sizes = dict(sizes)
+        self.max_copy_rows = max_copy_rows
+        self.allow_copy = allow_copy
+
+    def classify(self, statement: str, foreign_key_checks: bool = True) -> Optional[Tuple[Optional[str], str, Cost, Optional[str]]]:
+        """
+        Return (table, operation, cost, sized table) for a statement, or None for statements not
+        worth reporting. The sized table is the one whose size drives the cost (the source of an
+        INSERT ... SELECT, otherwise the table itself).
+        """
+        text = strip_literals(statement).strip()
+        words = text.upper().split()
+        parsed = parse_alter_table(statement)
+        if parsed:
+            table_name, clause = parsed
+            table = self.model.tables.get(table_name)
+            clauses = split_top_level(clause)
+            costs = [classify_alter_clause(table, c, foreign_key_checks) for c in clauses]
+            if any(re.match(r'\s*ADD\s+(CONSTRAINT\s+\S+\s+)?PRIMARY\s+KEY\b', c, re.IGNORECASE) for c in clauses):
+                # Replacing the primary key in one statement is an INPLACE rebuild, not a copy
+                costs = [Cost('INSTANT', 'NONE', None, '') if re.match(r'\s*DROP\s+PRIMARY\s+KEY\b', c, re.IGNORECASE) else cost
+                         for c, cost in zip(clauses, costs)]
+            cost = worst(costs)
+            options = requested_options(clause)
+            if options.get('ALGORITHM') == 'COPY':
+                cost = Cost('COPY', 'SHARED', 'COPY', 'ALGORITHM=COPY requested')
+            elif options.get('ALGORITHM') in ALGORITHMS and ALGORITHMS.index(options['ALGORITHM']) < ALGORITHMS.index(cost.algorithm):
+                cost = cost._replace(note=f"{cost.note}; server will reject ALGORITHM={options['ALGORITHM']}".lstrip('; '))
+            if options.get('LOCK') in LOCKS and LOCKS.index(options['LOCK']) > LOCKS.index(cost.lock):
+                cost = cost._replace(lock=options['LOCK'])
+            operations = ', '.join(dict.fromkeys(clause_label(c) for c in clauses))
+            return table_name, f"ALTER TABLE {operations}", cost, table_name
+        match = re.match(r'CREATE\s+(UNIQUE\s+|FULLTEXT\s+|SPATIAL\s+)?INDEX\s+.*?\bON\s+(`(?:[^`]|``)+`|[\w$.]+)', text, re.IGNORECASE | re.DOTALL)
+        if match:
+            kind = (match.group(1) or '').strip().upper()
+            table_name = unquote_identifier(match.group(2))
+            cost = classify_alter_clause(self.model.tables.get(table_name), f"ADD {kind or 'INDEX'}".replace('UNIQUE', 'UNIQUE INDEX'))
+            return table_name, f"CREATE {kind + ' ' if kind else ''}INDEX", cost, table_name
+        match = re.match(r'DROP\s+INDEX\s+.*?\bON\s+(`(?:[^`]|``)+`|[\w$.]+)', text, re.IGNORECASE | re.DOTALL)
+        if match:
+            table_name = unquote_identifier(match.group(1))
+            return table_name, 'DROP INDEX', Cost('INSTANT', 'NONE', None, ''), table_name
+        if words[:1] == ['CREATE'] and 'TABLE' in words[:4]:
+            name = re.match(r'CREATE\s+(?:OR\s+REPLACE\s+)?(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(`(?:[^`]|``)+`|[\w$.]+)', text, re.IGNORECASE)
+            table_name = unquote_identifier(name.group(1)) if name else None
+            source = re.search(r'\bSELECT\b.*?\bFROM\s+(`(?:[^`]|``)+`|[\w$.]+)', text, re.IGNORECASE | re.DOTALL)
+            if source:
+                return table_name, 'CREATE TABLE ... SELECT', Cost('DML', 'ROW', 'DML', 'copies query results'), unquote_identifier(source.group(1))
+            return table_name, 'CREATE TABLE', Cost('INSTANT', 'NONE', None, ''), None
+        if words[:2] in (['DROP', 'TABLE'], ['TRUNCATE', 'TABLE'], ['RENAME', 'TABLE']) or words[:1] == ['TRUNCATE']:
+            name = re.match(r'\w+\s+(?:TABLE\s+)?(?:IF\s+EXISTS\s+)?(`(?:[^`]|``)+`|[\w$.]+)', text, re.IGNORECASE)
+            table_name = unquote_identifier(name.group(1)) if name else None
+            return table_name, ' '.join(words[:2]), Cost('INSTANT', 'EXCLUSIVE', None, 'waits for every open transaction on the table'), table_name
+        if words[:1] == ['OPTIMIZE']:
+            name = re.match(r'OPTIMIZE\s+(?:NO_WRITE_TO_BINLOG\s+|LOCAL\s+)?TABLE\s+(`(?:[^`]|``)+`|[\w$.]+)', text, re.IGNORECASE)
+            table_name = unquote_identifier(name.group(1)) if name else None
+            return table_name, 'OPTIMIZE TABLE', Cost('INPLACE', 'NONE', 'REBUILD', 'table rebuild'), table_name
+        match = re.match(r'(UPDATE|DELETE\s+FROM|INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO)\s+(`(?:[^`]|``)+`|[\w$.]+)', text, re.IGNORECASE)
+        if match:
+            verb = match.group(1).split()[0].upper()
+            if verb in ('INSERT', 'REPLACE') and not re.search(r'\bSELECT\b', text, re.IGNORECASE):
+                return None
+            table_name = unquote_identifier(match.group(2))
+            if verb in ('INSERT', 'REPLACE'):
+                source = re.search(r'\bFROM\s+(`(?:[^`]|``)+`|[\w$.]+)', text, re.IGNORECASE)
+                source_name = unquote_identifier(source.group(1)) if source else None
+                return table_name, f"{verb} ... SELECT", Cost('DML', 'ROW', 'DML', f"scans {source_name or 'its source'}"), source_name
+            return table_name, verb, Cost('DML', 'ROW', 'DML', 'locks every row it touches until commit'), table_name
+        return None
+
+    def track_sizes(self, statement: str) -> None:
+        """Follow tables that are renamed or dropped so later statements see the right size."""
+        text = statement.strip()
+        if re.match(r'RENAME\s+TABLE\b', text, re.IGNORECASE):
+            for pair in split_top_level(re.sub(r'^RENAME\s+TABLE\s+', '', text, flags=re.IGNORECASE).rstrip(';')):
+                parts = re.split(r'\s+TO\s+', pair, flags=re.IGNORECASE)
+                if len(parts) == 2 and unquote_identifier(parts[0]) in self.sizes:
+                    self.sizes[unquote_identifier(parts[1])] = self.sizes.pop(unquote_identifier(parts[0]))
+        elif re.match(r'(DROP\s+(TEMPORARY\s+)?TABLE|TRUNCATE)\b', text, re.IGNORECASE):
+            names = re.sub(r'^(DROP|TRUNCATE)\s+(TEMPORARY\s+)?(TABLE\s+)?(IF\s+EXISTS\s+)?', '', text, flags=re.IGNORECASE).rstrip(';')
+            for name in split_top_level(names):
+                self.sizes.pop(unquote_identifier(name), None)
+
+    def assess_script(self, script_path: Path, migration: str) -> List[Assessment]:
+        """Assess the statements of one up.sql script and apply them to the model."""
+        with open(script_path, 'r') as f:
+            directives = read_directives(f)
+        online = directives.get('online')
+        online_tables = [t.strip() for t in (online or {}).get('tables', '').split(',') if t.strip()]
+        allowed = directives.get('allow-copy')
+        allowed_tables = [t.strip() for t in (allowed or {}).get('tables', '').split(',') if t.strip()]
+        foreign_key_checks = True
+        assessments = []
+        with open(script_path, 'r') as f:
+            for number, statement in enumerate(iter_sql_statements(f), 1):
+                setting = re.match(r'SET\s+(?:SESSION\s+|@@SESSION\.|@@)?FOREIGN_KEY_CHECKS\s*=\s*(\w+)', statement.strip(), re.IGNORECASE)
+                if setting:
+                    foreign_key_checks = setting.group(1).upper() not in ('0', 'OFF', 'FALSE')
+                classified = self.classify(statement, foreign_key_checks)
+                if classified:
+                    table, operation, cost, sized = classified
+                    parsed = parse_alter_table(statement)
+                    if parsed and online is not None and (not online_tables or table in online_tables):
+                        cost = Cost('ONLINE', 'NONE', 'ONLINE', 'shadow table copy (-- migrator:online)')
+                    size = self.sizes.get(sized, EMPTY) if sized else EMPTY
+                    blocked = (
+                        cost.algorithm == 'COPY' and size.rows > self.max_copy_rows and not self.allow_copy
+                        and not (allowed is not None and (not allowed_tables or table in allowed_tables))
+                    )
+                    assessments.append(Assessment(migration, number, table, operation, cost, size,
+                                                  estimate_seconds(cost, size), blocked))
+                self.track_sizes(statement)
+                self.model.apply(statement)
+        return assessments
@@ -0,0 +1,117 @@
+import time
+import random
+import logging
+from typing import Dict, List, NamedTuple, Optional
+from mysql.connector import Error
+from tokenizer import quote_identifier
+from db import run_statement, run_update
+
+logger = logging.getLogger(__name__)
+
+# InnoDB errors that mean another transaction holds the rows we want
+LOCK_ERRORS = (1205, 1213)  # ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK
+
+class PruneTarget(NamedTuple):
+    table: str
+    column: str  # rows with column < NOW() - setting are expired
+    setting: str
+    append_only: bool  # column grows with the primary key, so the walk can stop at the first live chunk
+
+PRUNE_TARGETS: List[PruneTarget] = [
+    PruneTarget('logs', 'created_at', 'dash.log_retention', True),
+    PruneTarget('moderation_logs', 'created_at', 'dash.log_retention', True),
+    PruneTarget('notifications', 'created_at', 'dash.log_retention', True),
+    PruneTarget('oauth_sessions', 'expires_at', 'user.idle_period', False),
+]
+
+class Pruner:
+    """
+    Deletes expired rows in small primary-key ranges, one short transaction per batch.
+
+    Each batch locks at most `batch_size` consecutive rows of the clustered index, so backend
+    writes are never queued behind a long DELETE. The delete rate is capped at
+    `max_rows_per_second`, and the session's `innodb_lock_wait_timeout` is lowered to
+    `lock_wait_timeout`: a batch that runs into a lock backs off with jitter and retries
+    instead of holding up others, and the table is abandoned after `max_retries` attempts.
+    """
+
+    def __init__(self, connection, batch_size: int = 1000, max_rows_per_second: int = 5000,
+                 lock_wait_timeout: int = 2, max_retries: int = 5):
+        self.connection = connection
+        self.batch_size = max(1, batch_size)
+        self.max_rows_per_second = max_rows_per_second
+        self.lock_wait_timeout = lock_wait_timeout
+        self.max_retries = max_retries
+
+    def delete_range(self, table: str, column: str, start: int, end: int, cutoff) -> int:
+        """Delete the expired rows with start < id <= end, retrying on lock conflicts."""
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                deleted = run_update(
+                    self.connection,
+                    f"DELETE FROM {table} WHERE `id` > %s AND `id` <= %s AND {column} < %s",
+                    (start, end, cutoff)
+                )
+                self.connection.commit()
+                return deleted
+            except Error as e:
+                self.connection.rollback()
+                if e.errno not in LOCK_ERRORS or attempt == self.max_retries:
+                    raise
+                backoff = min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"Lock conflict pruning {table} ids {start + 1}..{end} (attempt {attempt}/{self.max_retries}); "
+                               f"retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+        return 0
+
+    def prune(self, target: PruneTarget, retention: int, dry_run: bool = False) -> int:
+        """Delete the rows of one table older than `retention` seconds and return the count."""
+        table, column = quote_identifier(target.table), quote_identifier(target.column)
+        cutoff = run_statement(self.connection, "SELECT NOW() - INTERVAL %s SECOND", (retention,))[0][0]
+        if dry_run:
+            logger.info(f"Dry run: Would delete rows of {target.table} with {target.column} < {cutoff} "
+                        f"({target.setting}={retention}s)")
+            return 0
+        logger.info(f"Pruning {target.table}: {target.column} < {cutoff}")
+        started = time.monotonic()
+        deleted = 0
+        start = 0
+        while True:
+            batch_started = time.monotonic()
+            row = run_statement(
+                self.connection,
+                f"SELECT MAX(`id`), MIN({column}) FROM (SELECT `id`, {column} FROM {table} "
+                f"WHERE `id` > %s ORDER BY `id` LIMIT {self.batch_size}) chunk",
+                (start,)
+            )
+            end, oldest = row[0] if row else (None, None)
+            if end is None:
+                break
+            if target.append_only and oldest is not None and oldest >= cutoff:
+                # Everything from here on was written after the cutoff
+                break
+            batch_deleted = self.delete_range(table, column, start, int(end), cutoff)
+            deleted += batch_deleted
+            start = int(end)
+            if self.max_rows_per_second and batch_deleted:
+                # Sleep off whatever the batch saved below the rate limit
+                pause = batch_deleted / self.max_rows_per_second - (time.monotonic() - batch_started)
+                if pause > 0:
+                    time.sleep(pause)
+        elapsed = time.monotonic() - started
+        logger.info(f"Pruned {deleted} rows from {target.table} in {elapsed:.1f}s "
+                    f"({deleted / max(elapsed, 1e-6):.0f} rows/s)")
+        return deleted
+
+    def run(self, retention: Dict[str, int], tables: Optional[List[str]] = None, dry_run: bool = False) -> Dict[str, int]:
+        """Prune every target (or the given tables) whose retention setting is known."""
+        run_statement(self.connection, "SET SESSION innodb_lock_wait_timeout = %s", (self.lock_wait_timeout,))
+        results = {}
+        for target in PRUNE_TARGETS:
+            if tables and target.table not in tables:
+                continue
+            if not retention.get(target.setting):
+                logger.warning(f"Setting {target.setting} is not set; skipping {target.table}")
+                continue
+            results[target.table] = self.prune(target, retention[target.setting], dry_run)
+        return results
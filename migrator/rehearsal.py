@@ -0,0 +1,137 @@
+import logging
+from typing import Dict, List, NamedTuple, Optional
+from tokenizer import quote_identifier
+from fingerprint import ignored, load_live_schema
+from metrics import MigrationMetrics, preview
+from db import run_statement, run_update
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_ROWS = 100000
+
+class RehearsedStatement(NamedTuple):
+    migration: str
+    number: int
+    last: int  # == number unless batched
+    table: Optional[str]
+    mode: str  # serial, online, batch, parallel or python
+    sample_rows: int  # rows of the table in the scratch schema
+    rows: int  # rows of the table in production
+    seconds: float  # measured on the scratch schema
+    estimate: float  # extrapolated to production
+    sql: str
+
+    @property
+    def scale(self) -> float:
+        """Factor from the sample to production size."""
+        return self.rows / self.sample_rows if self.sample_rows and self.rows > self.sample_rows else 1.0
+
+def insertable_columns(connection, database: str) -> Dict[str, List[str]]:
+    """Columns of every table of `database` that can be inserted into (generated columns cannot)."""
+    columns: Dict[str, List[str]] = {}
+    for table, column in run_statement(
+        connection,
+        "SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = %s AND IS_GENERATED = 'NEVER' ORDER BY TABLE_NAME, ORDINAL_POSITION",
+        (database,)
+    ):
+        columns.setdefault(table, []).append(column)
+    return columns
+
+class ScratchSchema:
+    """
+    A throwaway database on the same server holding a copy of another database's tables, made
+    with CREATE TABLE ... LIKE, and of some of their rows. CREATE TABLE ... LIKE does not copy
+    foreign keys, so they are added after the rows with foreign_key_checks disabled: sampled child
+    rows need not find their parents.
+    """
+
+    def __init__(self, connection, source: str, name: Optional[str] = None):
+        self.connection = connection
+        self.source = source
+        self.name = name or f"{source}_rehearsal"[:64]
+        self.created = False
+
+    def exists(self) -> bool:
+        """True if a database with the scratch name is already there."""
+        return bool(run_statement(self.connection, "SELECT 1 FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = %s", (self.name,)))
+
+    def create_empty(self) -> None:
+        """Create the scratch database without tables."""
+        if self.exists():
+            raise ValueError(f"Database {self.name} already exists; drop it (e.g. a leftover of an interrupted "
+                             f"run) and retry")
+        run_update(self.connection, f"CREATE DATABASE {quote_identifier(self.name)}")
+        self.created = True
+
+    def create(self, samples: Dict[str, Optional[int]]) -> Dict[str, int]:
+        """
+        Create the scratch database with every base table of the source, copy up to `samples[table]`
+        rows of the listed tables (None for all of them) and return the rows copied per table.
+        """
+        tables, _ = load_live_schema(self.connection, self.source)
+        tables = {name: table for name, table in tables.items() if not ignored(name)}
+        columns = insertable_columns(self.connection, self.source)
+        self.create_empty()
+        scratch, source = quote_identifier(self.name), quote_identifier(self.source)
+        for name in tables:
+            run_update(self.connection, f"CREATE TABLE {scratch}.{quote_identifier(name)} LIKE {source}.{quote_identifier(name)}")
+        copied = {}
+        for name, limit in samples.items():
+            if name not in tables:
+                continue
+            column_list = ', '.join(quote_identifier(c) for c in columns.get(name, []))
+            # Under READ COMMITTED, INSERT ... SELECT does not lock the production rows it reads
+            run_update(self.connection, "SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+            copied[name] = run_update(
+                self.connection,
+                f"INSERT INTO {scratch}.{quote_identifier(name)} ({column_list}) "
+                f"SELECT {column_list} FROM {source}.{quote_identifier(name)}"
+                f"{f' LIMIT {int(limit)}' if limit is not None else ''}"
+            )
+            self.connection.commit()
+            logger.info(f"Copied {copied[name]} rows of {name} into {self.name}")
+        run_update(self.connection, "SET SESSION foreign_key_checks = 0")
+        try:
+            for name, table in tables.items():
+                clauses = [
+                    f"ADD CONSTRAINT {quote_identifier(fk.name)} FOREIGN KEY ({', '.join(quote_identifier(c) for c in fk.columns)}) "
+                    f"REFERENCES {scratch}.{quote_identifier(fk.ref_table)} ({', '.join(quote_identifier(c) for c in fk.ref_columns)}) "
+                    f"ON DELETE {fk.on_delete} ON UPDATE {fk.on_update}"
+                    for fk in table.foreign_keys.values()
+                ]
+                if clauses:
+                    run_update(self.connection, f"ALTER TABLE {scratch}.{quote_identifier(name)} {', '.join(clauses)}")
+        finally:
+            run_update(self.connection, "SET SESSION foreign_key_checks = 1")
+        logger.info(f"Created scratch database {self.name}: {len(tables)} tables, {sum(copied.values())} rows copied")
+        return copied
+
+    def drop(self) -> None:
+        """Drop the scratch database if this instance created it."""
+        if self.created:
+            run_update(self.connection, f"DROP DATABASE IF EXISTS {quote_identifier(self.name)}")
+            self.created = False
+            logger.info(f"Dropped scratch database {self.name}")
+
+def extrapolate(migrations: List[MigrationMetrics], tables: Dict[str, List[Optional[str]]],
+                sampled: Dict[str, int], production: Dict[str, int]) -> List[RehearsedStatement]:
+    """
+    Scale each measured statement linearly by the production/sample row ratio of the table it
+    changes (`tables[migration][number - 1]`). Statements on tables that were not sampled, and
+    Python migrations, whose tables are unknown, are reported as measured.
+    """
+    results = []
+    for m in migrations:
+        for s in m.statements:
+            statement_tables = tables.get(m.key, [])
+            table = statement_tables[s.number - 1] if s.number <= len(statement_tables) else None
+            sample_rows = sampled.get(table, 0) if table else 0
+            rows = production.get(table, 0) if table in sampled else sample_rows
+            result = RehearsedStatement(m.key, s.number, s.last, table, s.mode, sample_rows, rows, s.seconds, 0.0, s.sql)
+            results.append(result._replace(estimate=s.seconds * result.scale))
+        if m.python_seconds:
+            results.append(RehearsedStatement(m.key, 0, 0, None, 'python', 0, 0, m.python_seconds, m.python_seconds,
+                                              preview(f"{m.direction}.py (not extrapolated)")))
+    return results
+
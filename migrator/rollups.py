@@ -0,0 +1,281 @@
+import math
+import logging
+from datetime import date, datetime, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+from tokenizer import quote_identifier
+from db import run_statement, run_update
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_LAG = 60  # seconds; rows are rolled up once they are this old, so commits in flight are not skipped
+KEY_BATCH = 200  # groups re-aggregated per transaction
+ID_CHUNK = 100000  # ids of an append-only source rolled up per transaction
+MAX_MISMATCHES = 20  # mismatches logged per rollup
+
+class Rollup(NamedTuple):
+    table: str
+    keys: Tuple[str, ...]  # primary key of the rollup table
+    measures: Tuple[str, ...]
+    source: str  # FROM clause over the base tables
+    select: Tuple[str, ...]  # source expressions of the keys, then of the measures
+    where: str  # source rows that are counted
+    group: str  # source column that rebuilds, checks and re-aggregation go by, with the day
+    group_key: str  # rollup column holding `group`; 0 stands for a NULL group
+    created: str  # source timestamp whose UTC day is the rollup's `day`
+    changed: Optional[str]  # source timestamp of the last change; None for append-only sources
+    id: str  # source primary key, the watermark of append-only sources
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        """Rollup columns in the order of `select`."""
+        return self.keys + self.measures
+
+ROLLUPS: List[Rollup] = [
+    Rollup(
+        'post_rollups', ('community_id', 'day'),
+        ('post_count', 'reply_count', 'flagged_count', 'reviewed_count', 'approved_count', 'hidden_count', 'deleted_count'),
+        'posts p',
+        ('p.community_id', 'DATE(p.created_at)', 'COUNT(*)', 'SUM(p.parent_post_id IS NOT NULL)',
+         'SUM(p.review_status = 1)', 'SUM(p.review_status = 2)', 'SUM(p.moderation_status = 1)',
+         'SUM(p.moderation_status = 2)', 'SUM(p.moderation_status = 3)'),
+        '1 = 1', 'p.community_id', 'community_id', 'p.created_at', 'p.updated_at', 'p.id',
+    ),
+    Rollup(
+        'moderation_score_rollups', ('community_id', 'category_id', 'day'),
+        ('score_count', 'human_count', 'score_sum', 'confidence_sum', 'reputation_delta_sum'),
+        'post_moderation_scores s JOIN moderation_categories c ON c.id = s.category_id',
+        ('c.community_id', 's.category_id', 'DATE(s.created_at)', 'COUNT(*)', 'SUM(s.created_by IS NOT NULL)',
+         'SUM(s.score)', 'SUM(s.confidence)', 'SUM(COALESCE(s.reputation_delta, 0))'),
+        's.is_active = 1', 's.category_id', 'category_id', 's.created_at', 's.updated_at', 's.id',
+    ),
+    Rollup(
+        'moderation_action_rollups', ('community_id', 'action_type', 'day'), ('action_count',),
+        'moderation_logs l',
+        ('COALESCE(l.community_id, 0)', 'l.action_type', 'DATE(l.created_at)', 'COUNT(*)'),
+        '1 = 1', 'l.community_id', 'community_id', 'l.created_at', None, 'l.id',
+    ),
+]
+
+class RollupRefresher:
+    """
+    Keeps the rollup tables in step with their base tables without recomputing them.
+
+    Mutable sources (posts, scores) are tracked by `updated_at`: each refresh finds the groups,
+    i.e. (community or category, day), with a row changed since the watermark and re-aggregates
+    just those groups from the base table, so updates such as a post getting flagged are picked
+    up. Deleted rows leave no trace there, so their groups stay stale until a rebuild. The
+    append-only moderation_logs is tracked by id, and the new rows' counts are added to the
+    rollup in id chunks, each committed with its watermark. Both watermarks stay `lag` seconds
+    behind the server clock. Days are UTC days.
+    """
+
+    def __init__(self, connection, lag: int = ROLLUP_LAG, rollups: List[Rollup] = ROLLUPS):
+        self.connection = connection
+        self.lag = lag
+        self.rollups = rollups
+        run_update(self.connection, "SET SESSION time_zone = '+00:00'")
+
+    def watermark(self, rollup: Rollup) -> Tuple[Optional[datetime], Optional[int]]:
+        """The rollup's (watermark_at, watermark_id); (None, None) before its first build."""
+        rows = run_statement(self.connection, "SELECT watermark_at, watermark_id FROM rollup_watermarks WHERE name = %s", (rollup.table,))
+        return rows[0] if rows else (None, None)
+
+    def save_watermark(self, rollup: Rollup, at: Optional[datetime], last_id: Optional[int], rebuilt: bool = False) -> None:
+        """Record the watermark; committed by the caller together with the rows it covers."""
+        run_update(
+            self.connection,
+            "INSERT INTO rollup_watermarks (name, watermark_at, watermark_id, refreshed_at, rebuilt_at) "
+            "VALUES (%s, %s, %s, NOW(), IF(%s, NOW(), NULL)) ON DUPLICATE KEY UPDATE watermark_at = VALUES(watermark_at), "
+            "watermark_id = VALUES(watermark_id), refreshed_at = NOW(), rebuilt_at = COALESCE(VALUES(rebuilt_at), rebuilt_at)",
+            (rollup.table, at, last_id, rebuilt)
+        )
+
+    def horizon(self) -> datetime:
+        """Newest change time that is rolled up now."""
+        return run_statement(self.connection, "SELECT NOW() - INTERVAL %s SECOND", (self.lag,))[0][0]
+
+    def last_id(self, rollup: Rollup, after: int = 0) -> Optional[int]:
+        """Highest id of an append-only source that is rolled up now, if above `after`."""
+        rows = run_statement(
+            self.connection,
+            f"SELECT {rollup.id} FROM {rollup.source} WHERE {rollup.id} > %s AND {rollup.created} <= NOW() - INTERVAL %s SECOND "
+            f"ORDER BY {rollup.id} DESC LIMIT 1",
+            (after, self.lag)
+        )
+        return rows[0][0] if rows else None
+
+    def retained_since(self, rollup: Rollup) -> Optional[date]:
+        """
+        First complete day of an append-only source. Older rows may have been pruned, so rollup
+        days before it are kept as history by rebuilds and skipped by checks.
+        """
+        if rollup.changed is not None:
+            return None
+        rows = run_statement(self.connection, f"SELECT {rollup.created} FROM {rollup.source} ORDER BY {rollup.id} LIMIT 1")
+        return rows[0][0].date() + timedelta(days=1) if rows else None
+
+    def group_values(self, rollup: Rollup) -> List[Optional[int]]:
+        """Groups present in the source or the rollup."""
+        values = {row[0] for row in run_statement(self.connection, f"SELECT DISTINCT {rollup.group} FROM {rollup.source}")}
+        values |= {row[0] or None for row in run_statement(
+            self.connection,
+            f"SELECT DISTINCT {quote_identifier(rollup.group_key)} FROM {quote_identifier(rollup.table)}"
+        )}
+        return sorted(values, key=lambda v: (v is not None, v or 0))
+
+    def aggregate(self, rollup: Rollup, condition: str) -> str:
+        """SELECT of the rollup rows of the source rows matching `condition`."""
+        return (f"SELECT {', '.join(rollup.select)} FROM {rollup.source} WHERE {rollup.where} AND {condition} "
+                f"GROUP BY {', '.join(str(i + 1) for i in range(len(rollup.keys)))}")
+
+    def group_condition(self, rollup: Rollup, since: Optional[date] = None, max_id: Optional[int] = None) -> Tuple[str, str]:
+        """Source and rollup conditions of one group (one %s each), optionally from a day and up to an id."""
+        source = f"{rollup.group} <=> %s"
+        table = f"{quote_identifier(rollup.group_key)} = %s"
+        if since is not None:
+            source += f" AND {rollup.created} >= %s"
+            table += " AND day >= %s"
+        if max_id is not None:
+            source += f" AND {rollup.id} <= %s"
+        return source, table
+
+    def reaggregate(self, rollup: Rollup, keys: List[tuple]) -> None:
+        """Recompute the given rollup rows from their source groups, KEY_BATCH per transaction."""
+        column_list = ', '.join(quote_identifier(c) for c in rollup.columns)
+        group_index = rollup.keys.index(rollup.group_key)
+        day_index = rollup.keys.index('day')
+        for i in range(0, len(keys), KEY_BATCH):
+            batch = keys[i:i + KEY_BATCH]
+            match = ' AND '.join(f"{quote_identifier(k)} = %s" for k in rollup.keys)
+            run_update(self.connection, f"DELETE FROM {quote_identifier(rollup.table)} WHERE " + ' OR '.join(f"({match})" for _ in batch),
+                                        tuple(v for key in batch for v in key))
+            ranges = {(key[group_index], key[day_index]) for key in batch}
+            condition = ' OR '.join(f"({rollup.group} <=> %s AND {rollup.created} >= %s AND {rollup.created} < %s)" for _ in ranges)
+            params = tuple(v for group, day in ranges for v in (group or None, day, day + timedelta(days=1)))
+            run_update(self.connection, f"INSERT INTO {quote_identifier(rollup.table)} ({column_list}) {self.aggregate(rollup, f'({condition})')}", params)
+            self.connection.commit()
+
+    def refresh(self, rollup: Rollup) -> int:
+        """Bring a rollup up to date from its watermark; builds it on first use. Returns groups or rows rolled up."""
+        at, last_id = self.watermark(rollup)
+        if (at if rollup.changed is not None else last_id) is None:
+            logger.info(f"{rollup.table} has no watermark yet; building it")
+            return self.rebuild(rollup)
+        if rollup.changed is not None:
+            horizon = self.horizon()
+            if horizon <= at:
+                return 0
+            keys = run_statement(
+                self.connection,
+                f"SELECT DISTINCT {', '.join(rollup.select[:len(rollup.keys)])} FROM {rollup.source} "
+                f"WHERE {rollup.changed} > %s AND {rollup.changed} <= %s",
+                (at, horizon)
+            )
+            self.reaggregate(rollup, keys)
+            self.save_watermark(rollup, horizon, None)
+            self.connection.commit()
+            logger.info(f"Refreshed {rollup.table}: {len(keys)} groups changed since {at}")
+            return len(keys)
+        upper = self.last_id(rollup, last_id)
+        if upper is None:
+            return 0
+        column_list = ', '.join(quote_identifier(c) for c in rollup.columns)
+        additions = ', '.join(f"{quote_identifier(m)} = {quote_identifier(m)} + VALUES({quote_identifier(m)})" for m in rollup.measures)
+        for start in range(last_id, upper, ID_CHUNK):
+            end = min(start + ID_CHUNK, upper)
+            run_update(
+                self.connection,
+                f"INSERT INTO {quote_identifier(rollup.table)} ({column_list}) "
+                f"{self.aggregate(rollup, f'{rollup.id} > %s AND {rollup.id} <= %s')} ON DUPLICATE KEY UPDATE {additions}",
+                (start, end)
+            )
+            self.save_watermark(rollup, None, end)
+            self.connection.commit()
+        logger.info(f"Refreshed {rollup.table}: ids {last_id + 1}..{upper} rolled up")
+        return upper - last_id
+
+    def rebuild(self, rollup: Rollup) -> int:
+        """
+        Recompute a rollup from its base tables one group per transaction, so readers keep seeing
+        the previous rows of a group until its new ones are committed. Returns the groups rebuilt.
+        """
+        horizon = self.horizon()
+        max_id = (self.last_id(rollup) or 0) if rollup.changed is None else None
+        since = self.retained_since(rollup)
+        source, table = self.group_condition(rollup, since, max_id)
+        column_list = ', '.join(quote_identifier(c) for c in rollup.columns)
+        groups = self.group_values(rollup)
+        for value in groups:
+            run_update(self.connection, f"DELETE FROM {quote_identifier(rollup.table)} WHERE {table}",
+                                        (value or 0,) + ((since,) if since else ()))
+            run_update(self.connection, f"INSERT INTO {quote_identifier(rollup.table)} ({column_list}) {self.aggregate(rollup, source)}",
+                                        (value,) + ((since,) if since else ()) + ((max_id,) if max_id is not None else ()))
+            self.connection.commit()
+        self.save_watermark(rollup, horizon if rollup.changed is not None else None, max_id, rebuilt=True)
+        self.connection.commit()
+        logger.info(f"Rebuilt {rollup.table}: {len(groups)} groups" + (f" (days from {since}; older days kept)" if since else ""))
+        return len(groups)
+
+    def check(self, rollup: Rollup) -> List[str]:
+        """
+        Compare a rollup with its base tables up to the watermark and return the mismatches.
+        Groups with rows changed after the watermark are pending, not wrong, and are skipped.
+        """
+        at, last_id = self.watermark(rollup)
+        if (at if rollup.changed is not None else last_id) is None:
+            return [f"{rollup.table} has never been refreshed"]
+        pending = set()
+        if rollup.changed is not None:
+            pending = set(run_statement(
+                self.connection,
+                f"SELECT DISTINCT {', '.join(rollup.select[:len(rollup.keys)])} FROM {rollup.source} WHERE {rollup.changed} > %s",
+                (at,)
+            ))
+        since = self.retained_since(rollup)
+        source, table = self.group_condition(rollup, since, last_id if rollup.changed is None else None)
+        mismatches = []
+        for value in self.group_values(rollup):
+            expected = {row[:len(rollup.keys)]: row[len(rollup.keys):] for row in run_statement(
+                self.connection,
+                self.aggregate(rollup, source),
+                (value,) + ((since,) if since else ()) + ((last_id,) if rollup.changed is None else ())
+            )}
+            actual = {row[:len(rollup.keys)]: row[len(rollup.keys):] for row in run_statement(
+                self.connection,
+                f"SELECT {', '.join(quote_identifier(c) for c in rollup.columns)} FROM {quote_identifier(rollup.table)} WHERE {table}",
+                (value or 0,) + ((since,) if since else ())
+            )}
+            for key in sorted(set(expected) | set(actual), key=str):
+                if key in pending:
+                    continue
+                want, have = expected.get(key), actual.get(key)
+                if want is None or have is None or not all(
+                    math.isclose(float(w), float(h), rel_tol=1e-9, abs_tol=1e-6) for w, h in zip(want, have)
+                ):
+                    mismatches.append(f"{rollup.table} {dict(zip(rollup.keys, key))}: expected "
+                                      f"{dict(zip(rollup.measures, want)) if want else 'no row'}, found "
+                                      f"{dict(zip(rollup.measures, have)) if have else 'no row'}")
+        return mismatches
+
+    def run(self, tables: Optional[List[str]] = None, rebuild: bool = False, refresh: bool = True, check: bool = False) -> bool:
+        """Refresh or rebuild the rollups, then optionally check them; False if a check found mismatches."""
+        ok = True
+        for rollup in self.rollups:
+            if tables and rollup.table not in tables:
+                continue
+            if rebuild:
+                self.rebuild(rollup)
+            elif refresh:
+                self.refresh(rollup)
+            if check:
+                mismatches = self.check(rollup)
+                for mismatch in mismatches[:MAX_MISMATCHES]:
+                    logger.error(f"Rollup mismatch: {mismatch}")
+                if len(mismatches) > MAX_MISMATCHES:
+                    logger.error(f"... and {len(mismatches) - MAX_MISMATCHES} more mismatches in {rollup.table}")
+                if mismatches:
+                    logger.error(f"{rollup.table}: {len(mismatches)} rows differ from the base tables; fix with --rebuild-rollups")
+                    ok = False
+                else:
+                    logger.info(f"{rollup.table} matches its base tables")
+        return ok
@@ -0,0 +1,552 @@
+import re
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from tokenizer import iter_sql_statements, unquote_identifier
+from executor import strip_literals
+
+logger = logging.getLogger(__name__)
+
+IDENTIFIER_RE = re.compile(r'\s*(`(?:[^`]|``)+`|[\w$]+)')
+QUALIFIED_RE = re.compile(r'\s*((?:`(?:[^`]|``)+`|[\w$]+)(?:\s*\.\s*(?:`(?:[^`]|``)+`|[\w$]+))?)')
+COLUMN_TYPE_RE = re.compile(
+    r'\s*(double\s+precision|long\s+varchar|long\s+varbinary|[a-z_][\w]*)(\s*\((?:[^()\']|\'(?:[^\'\\]|\\.|\'\')*\')*\))?'
+    r'((?:\s+(?:unsigned|signed|zerofill))*)',
+    re.IGNORECASE
+)
+INTEGER_WIDTH_RE = re.compile(r'^(tinyint|smallint|mediumint|int|bigint)\(\d+\)')
+TYPE_ALIASES = {
+    'integer': 'int', 'int1': 'tinyint', 'int2': 'smallint', 'int3': 'mediumint', 'int4': 'int',
+    'int8': 'bigint', 'middleint': 'mediumint', 'bool': 'tinyint', 'boolean': 'tinyint',
+    'dec': 'decimal', 'numeric': 'decimal', 'fixed': 'decimal', 'real': 'double',
+    'double precision': 'double', 'float8': 'double', 'float4': 'float', 'character': 'char',
+    'json': 'longtext', 'long varchar': 'mediumtext', 'long': 'mediumtext', 'long varbinary': 'mediumblob',
+}
+ACTION_RE = re.compile(r'\bON\s+(DELETE|UPDATE)\s+(RESTRICT|CASCADE|SET\s+NULL|SET\s+DEFAULT|NO\s+ACTION)', re.IGNORECASE)
+
+def normalize_type(column_type: str) -> str:
+    """
+    Canonical spelling of a column type, comparable with information_schema.COLUMNS.COLUMN_TYPE:
+    lower case, aliases resolved and integer display widths dropped.
+    """
+    text = re.sub(r'\s+', ' ', column_type.strip())
+    match = re.match(r"([a-z][a-z0-9_ ]*?) ?(\(.*\))?((?: unsigned| signed| zerofill)*)$", text, re.IGNORECASE)
+    if not match:
+        return text.lower()
+    base, args, flags = match.group(1).strip().lower(), match.group(2) or '', (match.group(3) or '').lower()
+    if "'" not in args:  # ENUM/SET member names keep their case and spacing
+        args = re.sub(r'\s+', '', args.lower())
+    base = TYPE_ALIASES.get(base, base)
+    if base == 'decimal' and not args:
+        args = '(10,0)'
+    flags = ' '.join(f for f in flags.split() if f != 'signed')
+    text = INTEGER_WIDTH_RE.sub(r'\1', base + args)
+    return f"{text} {flags}".strip()
+
+def split_top_level(text: str, separator: str = ',') -> List[str]:
+    """Split on a separator outside parentheses, quotes and backticks."""
+    parts, depth, quote, start, i = [], 0, '', 0, 0
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == '\\' and quote != '`':
+                i += 1
+            elif char == quote:
+                quote = ''
+        elif char in '\'"`':
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+        i += 1
+    tail = text[start:].strip()
+    if tail:
+        parts.append(tail)
+    return parts
+
+class Scanner:
+    """Cursor over a DDL fragment with keyword, identifier and parenthesized-group readers."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def accept(self, *words: str) -> bool:
+        """Consume the given keywords if they come next."""
+        pattern = r'\s*' + r'\s+'.join(re.escape(w) for w in words) + r'(?![\w$])'
+        match = re.compile(pattern, re.IGNORECASE).match(self.text, self.pos)
+        if match:
+            self.pos = match.end()
+            return True
+        return False
+
+    def identifier(self, qualified: bool = False) -> Optional[str]:
+        """Read a (possibly backticked, optionally schema-qualified) name."""
+        match = (QUALIFIED_RE if qualified else IDENTIFIER_RE).match(self.text, self.pos)
+        if not match:
+            return None
+        self.pos = match.end()
+        return unquote_identifier(match.group(1))
+
+    def peek_paren(self) -> bool:
+        """True if the next non-space character opens a group."""
+        rest = self.text[self.pos:].lstrip()
+        return rest.startswith('(')
+
+    def group(self) -> Optional[str]:
+        """Read a balanced parenthesized group and return its inner text."""
+        start = self.text.find('(', self.pos)
+        if start < 0 or self.text[self.pos:start].strip():
+            return None
+        depth, quote, i = 0, '', start
+        while i < len(self.text):
+            char = self.text[i]
+            if quote:
+                if char == '\\' and quote != '`':
+                    i += 1
+                elif char == quote:
+                    quote = ''
+            elif char in '\'"`':
+                quote = char
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+                if depth == 0:
+                    self.pos = i + 1
+                    return self.text[start + 1:i]
+            i += 1
+        return None
+
+    def rest(self) -> str:
+        """Return the unread remainder."""
+        return self.text[self.pos:].strip()
+
+def parse_index_columns(text: str) -> List[Tuple[str, Optional[int]]]:
+    """Parse `a, b(10) DESC` into [(name, prefix length)]."""
+    columns = []
+    for part in split_top_level(text):
+        scanner = Scanner(part)
+        name = scanner.identifier()
+        length = None
+        if scanner.peek_paren():
+            inner = scanner.group()
+            if inner and inner.strip().isdigit():
+                length = int(inner)
+        columns.append((name or part.strip(), length))
+    return columns
+
+class Column:
+    """A column: normalized type, nullability and auto-increment."""
+
+    def __init__(self, name: str, column_type: str, nullable: bool = True, auto_increment: bool = False):
+        self.name = name
+        self.type = normalize_type(column_type)
+        self.nullable = nullable
+        self.auto_increment = auto_increment
+
+class Index:
+    """An index; `implicit` marks the index InnoDB creates for a foreign key that has none."""
+
+    def __init__(self, name: str, columns: List[Tuple[str, Optional[int]]], unique: bool = False,
+                 kind: str = 'BTREE', implicit: bool = False):
+        self.name = name
+        self.columns = columns
+        self.unique = unique or name == 'PRIMARY'
+        self.kind = kind
+        self.implicit = implicit
+
+    @property
+    def primary(self) -> bool:
+        """True for the primary key."""
+        return self.name == 'PRIMARY'
+
+    @property
+    def column_names(self) -> List[str]:
+        """Indexed column names, without prefix lengths."""
+        return [c for c, _ in self.columns]
+
+class ForeignKey:
+    """A foreign key constraint."""
+
+    def __init__(self, name: str, columns: List[str], ref_table: str, ref_columns: List[str],
+                 on_delete: str = 'RESTRICT', on_update: str = 'RESTRICT'):
+        self.name = name
+        self.columns = columns
+        self.ref_table = ref_table
+        self.ref_columns = ref_columns
+        self.on_delete = on_delete
+        self.on_update = on_update
+
+class Table:
+    """Columns, indexes and foreign keys of one table, in declaration order."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.columns: Dict[str, Column] = {}
+        self.indexes: Dict[str, Index] = {}
+        self.foreign_keys: Dict[str, ForeignKey] = {}
+        self.fk_counter = 0
+
+    def unique_index_name(self, base: str) -> str:
+        """MariaDB names an unnamed index after its first column, suffixed _2, _3... on clashes."""
+        if base not in self.indexes:
+            return base
+        n = 2
+        while f"{base}_{n}" in self.indexes:
+            n += 1
+        return f"{base}_{n}"
+
+    def covering_index(self, columns: List[str], explicit_only: bool = False) -> Optional[Index]:
+        """An index whose leading columns are exactly `columns` (in any order of declaration)."""
+        for index in self.indexes.values():
+            if explicit_only and index.implicit:
+                continue
+            if index.kind == 'BTREE' and index.column_names[:len(columns)] == columns:
+                return index
+        return None
+
+    def add_index(self, index: Index) -> None:
+        """Add an index, replacing an implicit foreign key index it makes unnecessary."""
+        if index.primary:
+            self.indexes.pop('PRIMARY', None)
+            self.indexes = {'PRIMARY': index, **self.indexes}
+            for column, _ in index.columns:
+                if column in self.columns:
+                    self.columns[column].nullable = False
+        else:
+            self.indexes[index.name] = index
+        for name, existing in list(self.indexes.items()):
+            if existing.implicit and existing is not index and index.kind == 'BTREE' and \
+                    index.column_names[:len(existing.columns)] == existing.column_names:
+                del self.indexes[name]
+
+    def add_foreign_key(self, fk: ForeignKey, index_name: Optional[str] = None) -> None:
+        """Add a foreign key, creating the implicit index InnoDB adds when none leads with its columns."""
+        # The implicit index takes the FOREIGN KEY index name, else the constraint name, else the first column
+        index_name = index_name or fk.name or fk.columns[0]
+        if not fk.name:
+            self.fk_counter += 1
+            fk.name = f"{self.name}_ibfk_{self.fk_counter}"
+        self.foreign_keys[fk.name] = fk
+        if not self.covering_index(fk.columns):
+            name = self.unique_index_name(index_name)
+            self.indexes[name] = Index(name, [(c, None) for c in fk.columns], implicit=True)
+
+    def drop_column(self, name: str) -> None:
+        """Drop a column and remove it from indexes, dropping indexes left without columns."""
+        self.columns.pop(name, None)
+        for index_name, index in list(self.indexes.items()):
+            index.columns = [c for c in index.columns if c[0] != name]
+            if not index.columns:
+                del self.indexes[index_name]
+
+    def rename_column(self, old: str, new: str) -> None:
+        """Rename a column everywhere it is referenced within the table."""
+        for index in self.indexes.values():
+            index.columns = [(new if c == old else c, length) for c, length in index.columns]
+        for fk in self.foreign_keys.values():
+            fk.columns = [new if c == old else c for c in fk.columns]
+
+def parse_column(definition: str) -> Optional[Tuple[Column, str]]:
+    """Parse a column definition into a Column and its attribute text (upper case, literals blanked)."""
+    scanner = Scanner(definition)
+    name = scanner.identifier()
+    match = COLUMN_TYPE_RE.match(definition, scanner.pos)
+    if not name or not match:
+        return None
+    attributes = strip_literals(definition[match.end():]).upper()
+    column = Column(
+        name, match.group(1) + (match.group(2) or '') + (match.group(3) or ''),
+        nullable=not re.search(r'\bNOT\s+NULL\b', attributes) and not re.search(r'\bPRIMARY\s+KEY\b', attributes),
+        auto_increment=bool(re.search(r'\bAUTO_INCREMENT\b', attributes))
+    )
+    return column, attributes
+
+class SchemaModel:
+    """
+    In-memory model of the schema produced by replaying DDL, with no database involved.
+    Understands CREATE/DROP/RENAME TABLE, CREATE/DROP INDEX and the common ALTER TABLE
+    clauses; data statements and unrecognized DDL are ignored (and counted in `skipped`).
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, Table] = {}
+        self.skipped = 0
+
+    @classmethod
+    def from_scripts(cls, paths: Iterable[Path]) -> 'SchemaModel':
+        """Build a model by replaying migration scripts in order."""
+        model = cls()
+        for path in paths:
+            with open(path, 'r') as f:
+                for statement in iter_sql_statements(f):
+                    model.apply(statement)
+        return model
+
+    def apply(self, statement: str) -> None:
+        """Apply one statement to the model."""
+        text = statement.strip().rstrip(';').strip()
+        scanner = Scanner(text)
+        if scanner.accept('CREATE'):
+            scanner.accept('OR', 'REPLACE')
+            scanner.accept('TEMPORARY')
+            if scanner.accept('TABLE'):
+                self.create_table(scanner)
+                return
+            unique = scanner.accept('UNIQUE')
+            kind = 'FULLTEXT' if scanner.accept('FULLTEXT') else 'SPATIAL' if scanner.accept('SPATIAL') else 'BTREE'
+            scanner.accept('ONLINE') or scanner.accept('OFFLINE')
+            if scanner.accept('INDEX'):
+                scanner.accept('IF', 'NOT', 'EXISTS')
+                name = scanner.identifier()
+                if scanner.accept('USING'):
+                    scanner.identifier()
+                if scanner.accept('ON'):
+                    table = self.tables.get(scanner.identifier(qualified=True))
+                    columns = scanner.group()
+                    if table and columns is not None and name not in table.indexes:
+                        table.add_index(Index(name, parse_index_columns(columns), unique, kind))
+                    return
+        elif scanner.accept('DROP'):
+            scanner.accept('TEMPORARY')
+            if scanner.accept('TABLE'):
+                scanner.accept('IF', 'EXISTS')
+                for name in split_top_level(scanner.rest()):
+                    self.tables.pop(unquote_identifier(re.sub(r'\s+(RESTRICT|CASCADE)$', '', name, flags=re.IGNORECASE)), None)
+                return
+            if scanner.accept('INDEX'):
+                scanner.accept('IF', 'EXISTS')
+                name = scanner.identifier()
+                if scanner.accept('ON'):
+                    table = self.tables.get(scanner.identifier(qualified=True))
+                    if table:
+                        table.indexes.pop(name, None)
+                    return
+        elif scanner.accept('RENAME', 'TABLE'):
+            for pair in split_top_level(scanner.rest()):
+                parts = re.split(r'\s+TO\s+', pair, flags=re.IGNORECASE)
+                if len(parts) == 2:
+                    self.rename_table(unquote_identifier(parts[0]), unquote_identifier(parts[1]))
+            return
+        elif scanner.accept('ALTER'):
+            scanner.accept('ONLINE')
+            scanner.accept('IGNORE')
+            if scanner.accept('TABLE'):
+                scanner.accept('IF', 'EXISTS')
+                table = self.tables.get(scanner.identifier(qualified=True))
+                if table:
+                    self.alter_table(table, scanner.rest())
+                return
+        elif re.match(r'(INSERT|REPLACE|UPDATE|DELETE|SET|SELECT|CALL|DO)\b', text, re.IGNORECASE):
+            return
+        self.skipped += 1
+        logger.debug(f"Schema model ignored statement: {text[:80]}")
+
+    def rename_table(self, old: str, new: str) -> None:
+        """Rename a table and repoint foreign keys that reference it."""
+        table = self.tables.pop(old, None)
+        if not table:
+            return
+        table.name = new
+        self.tables[new] = table
+        for other in self.tables.values():
+            for fk in other.foreign_keys.values():
+                if fk.ref_table == old:
+                    fk.ref_table = new
+
+    def create_table(self, scanner: Scanner) -> None:
+        """Handle CREATE TABLE ... (definitions) and CREATE TABLE ... LIKE."""
+        exists_ok = scanner.accept('IF', 'NOT', 'EXISTS')
+        name = scanner.identifier(qualified=True)
+        if name in self.tables and exists_ok:
+            return
+        if scanner.accept('LIKE'):
+            source = self.tables.get(scanner.identifier(qualified=True))
+            table = Table(name)
+            if source:
+                # LIKE copies columns and indexes but not foreign keys
+                for column in source.columns.values():
+                    table.columns[column.name] = Column(column.name, column.type, column.nullable, column.auto_increment)
+                for index in source.indexes.values():
+                    table.indexes[index.name] = Index(index.name, list(index.columns), index.unique, index.kind)
+            self.tables[name] = table
+            return
+        body = scanner.group()
+        if body is None:
+            self.skipped += 1
+            return
+        table = Table(name)
+        self.tables[name] = table
+        foreign_keys = []
+        for definition in split_top_level(body):
+            foreign_keys.extend(self.add_definition(table, definition))
+        # InnoDB adds implicit indexes only after all declared keys exist
+        for fk, index_name in foreign_keys:
+            table.add_foreign_key(fk, index_name)
+
+    def add_definition(self, table: Table, definition: str) -> List[Tuple[ForeignKey, Optional[str]]]:
+        """Add a column or key definition; foreign keys are returned for the caller to add last."""
+        scanner = Scanner(definition)
+        symbol = None
+        if scanner.accept('CONSTRAINT'):
+            if not re.match(r'\s*(PRIMARY|UNIQUE|FOREIGN|CHECK)\b', definition[scanner.pos:], re.IGNORECASE):
+                symbol = scanner.identifier()
+        if scanner.accept('PRIMARY', 'KEY'):
+            if scanner.accept('USING'):
+                scanner.identifier()
+            columns = scanner.group()
+            if columns is not None:
+                table.add_index(Index('PRIMARY', parse_index_columns(columns), True))
+            return []
+        if scanner.accept('UNIQUE') or scanner.accept('FULLTEXT') or scanner.accept('SPATIAL') or \
+                scanner.accept('INDEX') or scanner.accept('KEY'):
+            head = definition[:scanner.pos].strip().upper()
+            unique = head.endswith('UNIQUE')
+            kind = 'FULLTEXT' if head.endswith('FULLTEXT') else 'SPATIAL' if head.endswith('SPATIAL') else 'BTREE'
+            scanner.accept('INDEX') or scanner.accept('KEY')
+            scanner.accept('IF', 'NOT', 'EXISTS')
+            name = None if scanner.peek_paren() or Scanner(scanner.rest()).accept('USING') else scanner.identifier()
+            if scanner.accept('USING'):
+                scanner.identifier()
+            columns = scanner.group()
+            if columns is not None:
+                parsed = parse_index_columns(columns)
+                name = name or symbol or table.unique_index_name(parsed[0][0])
+                table.add_index(Index(name, parsed, unique, kind))
+            return []
+        if scanner.accept('FOREIGN', 'KEY'):
+            scanner.accept('IF', 'NOT', 'EXISTS')
+            index_name = None if scanner.peek_paren() else scanner.identifier()
+            columns = scanner.group()
+            if columns is None or not scanner.accept('REFERENCES'):
+                return []
+            ref_table = scanner.identifier(qualified=True)
+            ref_columns = scanner.group() or ''
+            actions = {m.group(1).upper(): re.sub(r'\s+', ' ', m.group(2).upper()) for m in ACTION_RE.finditer(scanner.rest())}
+            fk = ForeignKey(symbol, [c for c, _ in parse_index_columns(columns)], ref_table,
+                            [c for c, _ in parse_index_columns(ref_columns)],
+                            actions.get('DELETE', 'RESTRICT'), actions.get('UPDATE', 'RESTRICT'))
+            return [(fk, index_name)]
+        if scanner.accept('CHECK') or scanner.accept('PERIOD'):
+            return []
+        self.add_column(table, definition)
+        return []
+
+    def add_column(self, table: Table, definition: str, position: Optional[str] = None) -> Optional[Column]:
+        """Parse a column definition and add (or replace) the column."""
+        parsed = parse_column(definition)
+        if not parsed:
+            return None
+        column, attributes = parsed
+        name = column.name
+        columns = list(table.columns.items())
+        columns = [(n, c) for n, c in columns if n != name]
+        if position and position.upper() == 'FIRST':
+            columns.insert(0, (name, column))
+        elif position:
+            after = [n for n, _ in columns].index(position) + 1 if position in table.columns else len(columns)
+            columns.insert(after, (name, column))
+        else:
+            existing = [n for n, _ in table.columns.items()]
+            if name in existing:
+                columns.insert(existing.index(name), (name, column))
+            else:
+                columns.append((name, column))
+        table.columns = dict(columns)
+        if re.search(r'\bPRIMARY\s+KEY\b', attributes):
+            table.add_index(Index('PRIMARY', [(name, None)], True))
+        elif re.search(r'\bUNIQUE\b', attributes):
+            table.add_index(Index(table.unique_index_name(name), [(name, None)], True))
+        return column
+
+    def alter_table(self, table: Table, specification: str) -> None:
+        """Apply the clauses of an ALTER TABLE statement."""
+        for clause in split_top_level(specification):
+            scanner = Scanner(clause)
+            if scanner.accept('ADD'):
+                if scanner.accept('COLUMN'):
+                    self.add_columns(table, scanner)
+                    continue
+                rest = scanner.rest()
+                if re.match(r'(CONSTRAINT|PRIMARY|UNIQUE|INDEX|KEY|FULLTEXT|SPATIAL|FOREIGN|CHECK|PERIOD)\b', rest, re.IGNORECASE):
+                    for fk, index_name in self.add_definition(table, rest):
+                        table.add_foreign_key(fk, index_name)
+                else:
+                    self.add_columns(table, scanner)
+            elif scanner.accept('DROP'):
+                if scanner.accept('PRIMARY', 'KEY'):
+                    table.indexes.pop('PRIMARY', None)
+                elif scanner.accept('FOREIGN', 'KEY'):
+                    scanner.accept('IF', 'EXISTS')
+                    table.foreign_keys.pop(scanner.identifier(), None)
+                elif scanner.accept('INDEX') or scanner.accept('KEY'):
+                    scanner.accept('IF', 'EXISTS')
+                    table.indexes.pop(scanner.identifier(), None)
+                elif scanner.accept('CONSTRAINT'):
+                    scanner.accept('IF', 'EXISTS')
+                    name = scanner.identifier()
+                    table.foreign_keys.pop(name, None)
+                    if name in table.indexes and table.indexes[name].unique:
+                        del table.indexes[name]
+                else:
+                    scanner.accept('COLUMN')
+                    scanner.accept('IF', 'EXISTS')
+                    table.drop_column(scanner.identifier())
+            elif scanner.accept('MODIFY'):
+                scanner.accept('COLUMN')
+                scanner.accept('IF', 'EXISTS')
+                definition, position = self.split_position(scanner.rest())
+                self.add_column(table, definition, position)
+            elif scanner.accept('CHANGE'):
+                scanner.accept('COLUMN')
+                scanner.accept('IF', 'EXISTS')
+                old = scanner.identifier()
+                definition, position = self.split_position(scanner.rest())
+                new = Scanner(definition).identifier()
+                if old in table.columns and new:
+                    existing = list(table.columns)
+                    table.columns = {(new if n == old else n): c for n, c in table.columns.items()}
+                    table.rename_column(old, new)
+                    self.add_column(table, definition, position or (existing[existing.index(old) - 1] if existing.index(old) else 'FIRST'))
+            elif scanner.accept('RENAME', 'COLUMN'):
+                old = scanner.identifier()
+                scanner.accept('TO')
+                new = scanner.identifier()
+                if old in table.columns:
+                    table.columns = {(new if n == old else n): c for n, c in table.columns.items()}
+                    table.columns[new].name = new
+                    table.rename_column(old, new)
+            elif scanner.accept('RENAME', 'INDEX') or scanner.accept('RENAME', 'KEY'):
+                old = scanner.identifier()
+                scanner.accept('TO')
+                new = scanner.identifier()
+                if old in table.indexes:
+                    table.indexes = {(new if n == old else n): i for n, i in table.indexes.items()}
+                    table.indexes[new].name = new
+            elif scanner.accept('RENAME'):
+                scanner.accept('TO') or scanner.accept('AS')
+                self.rename_table(table.name, scanner.identifier(qualified=True))
+
+    @staticmethod
+    def split_position(definition: str) -> Tuple[str, Optional[str]]:
+        """Separate a trailing FIRST / AFTER column from a column definition."""
+        match = re.search(r'\s+(FIRST|AFTER\s+(`(?:[^`]|``)+`|[\w$]+))\s*$', definition, re.IGNORECASE)
+        if not match:
+            return definition, None
+        position = 'FIRST' if match.group(1).upper() == 'FIRST' else unquote_identifier(match.group(2))
+        return definition[:match.start()], position
+
+    def add_columns(self, table: Table, scanner: Scanner) -> None:
+        """Handle ADD [COLUMN] [IF NOT EXISTS] with one definition or a parenthesized list."""
+        scanner.accept('IF', 'NOT', 'EXISTS')
+        if scanner.peek_paren():
+            for definition in split_top_level(scanner.group() or ''):
+                self.add_column(table, definition)
+            return
+        definition, position = self.split_position(scanner.rest())
+        self.add_column(table, definition, position)
@@ -0,0 +1,275 @@
+import json
+import time
+import signal
+import socket
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+from mysql.connector import Error
+from mysql.connector import aio
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8080
+LOCK_WAIT = 30  # seconds per GET_LOCK call; the wait happens on the server, without round trips
+LOCK_CHECK = 30  # seconds between checks that the lock is still held while migrating
+LOCK_SESSION_TIMEOUT = 7 * 86400  # wait_timeout of the lock session, so the server never drops it as idle
+STATUS_TTL = 2.0  # seconds a /status snapshot is reused
+MAX_WAIT = 3600  # upper bound of ?wait= on /healthz and /status
+CONNECT_DELAY = 1.0
+CONNECT_MAX_DELAY = 30.0
+NO_SUCH_TABLE = 1146
+
+STARTING, WAITING, MIGRATING, READY, FAILED = 'starting', 'waiting', 'migrating', 'ready', 'failed'
+
+class MigratorService:
+    """
+    Long-running migrator for container startup. Every instance serves /healthz and /status and
+    queues for the advisory lock GET_LOCK('xmod-migrator:<database>'): the holder migrates to the
+    latest version, the others wait inside GET_LOCK on the server and, once they get the lock,
+    find nothing left to apply. If the holder dies, its lock is released with its connection and
+    the next instance takes over. /healthz answers 200 once the schema is up to date (503 before);
+    `?wait=SECONDS` holds the request until then, so dependents wait on a single request instead
+    of polling the database.
+
+    The lock and /status use asyncio connections; the migration itself runs the blocking
+    Migrator.run in a worker thread. While it runs, the lock session is checked every LOCK_CHECK
+    seconds: if the lock was lost, another instance may already be migrating, so this one fails.
+    """
+
+    def __init__(self, migrator, host: str = '0.0.0.0', port: int = DEFAULT_PORT, run_options: Optional[Dict] = None):
+        self.migrator = migrator
+        self.host = host
+        self.port = port
+        self.run_options = run_options or {}
+        self.database = migrator.db_config['database']
+        self.lock_name = f"xmod-migrator:{self.database}"[:64]
+        self.instance = socket.gethostname()
+        self.state = STARTING
+        self.since = datetime.now(timezone.utc)
+        self.error: Optional[str] = None
+        self.holder: Optional[int] = None  # connection id holding the lock while this instance waits
+        self.ready: Optional[asyncio.Event] = None  # created inside the event loop
+        self.lock_connection = None
+        self.status_connection = None
+        self.status_lock: Optional[asyncio.Lock] = None
+        self.snapshot: Optional[Dict] = None
+        self.snapshot_at = 0.0
+
+    def set_state(self, state: str, error: Optional[str] = None) -> None:
+        """Move to a new lifecycle state."""
+        self.state = state
+        self.error = error
+        self.since = datetime.now(timezone.utc)
+        self.snapshot = None
+        logger.info(f"Service state: {state}{f' ({error})' if error else ''}")
+
+    async def connect(self):
+        """Open an asyncio connection, backing off without blocking the event loop."""
+        delay = CONNECT_DELAY
+        while True:
+            try:
+                return await aio.connect(**self.migrator.db_config, autocommit=True)
+            except Error as e:
+                logger.warning(f"Database not reachable ({e}); retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, CONNECT_MAX_DELAY)
+
+    async def connect_lock(self):
+        """Open the lock connection with a session timeout that outlasts any migration."""
+        connection = await self.connect()
+        cursor = await connection.cursor()
+        try:
+            await cursor.execute("SET SESSION wait_timeout = %s", (LOCK_SESSION_TIMEOUT,))
+        finally:
+            await cursor.close()
+        return connection
+
+    @staticmethod
+    async def query(connection, statement: str, params: tuple = (), dictionary: bool = False) -> List:
+        """Execute a statement and return its rows."""
+        cursor = await connection.cursor(dictionary=dictionary)
+        try:
+            await cursor.execute(statement, params)
+            return await cursor.fetchall()
+        finally:
+            await cursor.close()
+
+    async def acquire_lock(self) -> None:
+        """Wait for the migration lock, LOCK_WAIT seconds per server-side wait."""
+        while True:
+            self.holder = (await self.query(self.lock_connection, "SELECT IS_USED_LOCK(%s)", (self.lock_name,)))[0][0]
+            if self.holder is not None and self.state != WAITING:
+                self.set_state(WAITING)
+                logger.info(f"Connection {self.holder} holds {self.lock_name}; waiting for it")
+            acquired = (await self.query(self.lock_connection, "SELECT GET_LOCK(%s, %s)", (self.lock_name, LOCK_WAIT)))[0][0]
+            if acquired == 1:
+                self.holder = None
+                return
+            if acquired is None:
+                raise RuntimeError(f"GET_LOCK({self.lock_name}) failed")
+
+    async def watch_lock(self) -> str:
+        """Return why the lock was lost, checking every LOCK_CHECK seconds while it is held."""
+        while True:
+            await asyncio.sleep(LOCK_CHECK)
+            try:
+                held = (await self.query(self.lock_connection, "SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", (self.lock_name,)))[0][0]
+            except Error as e:
+                return f"lost the lock connection ({e})"
+            if held != 1:
+                return f"{self.lock_name} is no longer held by this instance"
+
+    async def release_lock(self) -> None:
+        """Release the migration lock if the connection still holds it."""
+        try:
+            await self.query(self.lock_connection, "SELECT RELEASE_LOCK(%s)", (self.lock_name,))
+        except Error as e:
+            logger.warning(f"Could not release {self.lock_name}: {e}")
+
+    async def lifecycle(self) -> None:
+        """Connect, take the lock, migrate to the target and signal readiness."""
+        while True:
+            try:
+                if self.lock_connection is None:
+                    self.lock_connection = await self.connect_lock()
+                await self.acquire_lock()
+                break
+            except Error as e:
+                logger.warning(f"Lost the lock connection ({e}); reconnecting")
+                self.lock_connection = None
+                await asyncio.sleep(CONNECT_DELAY)
+            except RuntimeError as e:
+                self.set_state(FAILED, str(e))
+                return
+        self.set_state(MIGRATING)
+        migration = asyncio.ensure_future(asyncio.to_thread(self.migrator.run, **self.run_options))
+        watch = asyncio.ensure_future(self.watch_lock())
+        try:
+            await asyncio.wait([migration, watch], return_when=asyncio.FIRST_COMPLETED)
+            if not migration.done():
+                lost = watch.result()
+                logger.error(f"Migration lock lost while migrating: {lost}. Another instance may now run the same migrations; this instance is marked failed")
+                self.set_state(FAILED, f"migration lock lost: {lost}")
+                await asyncio.wait([migration])  # the worker thread cannot be interrupted
+                if migration.exception() is not None:
+                    logger.error(f"The migration failed as well: {migration.exception()}")
+            elif migration.exception() is not None:
+                self.set_state(FAILED, str(migration.exception()))
+            else:
+                self.set_state(READY)
+                self.ready.set()
+        finally:
+            watch.cancel()
+            await self.release_lock()
+
+    async def status(self) -> Dict:
+        """The service state with get_status() from the migrations table, cached for STATUS_TTL seconds."""
+        async with self.status_lock:
+            if self.snapshot is not None and time.monotonic() - self.snapshot_at < STATUS_TTL:
+                return self.snapshot
+            body: Dict = {
+                'state': self.state,
+                'since': self.since.isoformat(),
+                'instance': self.instance,
+                'database': self.database,
+                'error': self.error,
+                'lock_holder': self.holder,
+            }
+            try:
+                if self.status_connection is None or not await self.status_connection.is_connected():
+                    self.status_connection = await aio.connect(**self.migrator.db_config, autocommit=True)
+                try:
+                    applied = await self.query(
+                        self.status_connection,
+                        "SELECT timestamp, name, status, applied_at FROM migrations WHERE status = 1 ORDER BY timestamp",
+                        dictionary=True
+                    )
+                except Error as e:
+                    if e.errno != NO_SUCH_TABLE:
+                        raise
+                    applied = []
+                status = self.migrator.get_status(applied)
+                current = status['current']
+                body.update({
+                    'current': f"{current['timestamp']}_{current['name']}" if current else None,
+                    'applied': len(status['behind']) + (1 if current else 0),
+                    'pending': [f"{m['timestamp']}_{m['name']}" for m in status['ahead']],
+                })
+            except Error as e:
+                body['status_error'] = str(e)
+                self.status_connection = None
+            self.snapshot, self.snapshot_at = body, time.monotonic()
+            return body
+
+    async def wait_ready(self, seconds: float) -> None:
+        """Hold a request until the service is ready, at most `seconds`."""
+        if seconds > 0 and not self.ready.is_set():
+            try:
+                await asyncio.wait_for(self.ready.wait(), min(seconds, MAX_WAIT))
+            except asyncio.TimeoutError:
+                pass
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer one HTTP/1.1 request (GET or HEAD) and close the connection."""
+        try:
+            request = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass  # headers are not used
+            if len(request) < 2 or request[0] not in ('GET', 'HEAD'):
+                code, body = 405, {'error': 'method not allowed'}
+            else:
+                url = urlsplit(request[1])
+                wait = parse_qs(url.query).get('wait', ['0'])[0]
+                await self.wait_ready(float(wait) if wait.replace('.', '', 1).isdigit() else 0)
+                if url.path == '/healthz':
+                    code, body = (200 if self.state == READY else 503), {'state': self.state, 'error': self.error}
+                elif url.path == '/status':
+                    code, body = 200, await self.status()
+                else:
+                    code, body = 404, {'error': 'not found'}
+            payload = (json.dumps(body, default=str) + '\n').encode('utf-8')
+            reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable'}[code]
+            writer.write(
+                f"HTTP/1.1 {code} {reason}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode('latin-1')
+            )
+            if request and request[0] != 'HEAD':
+                writer.write(payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.debug(f"HTTP client went away: {e}")
+        finally:
+            writer.close()
+
+    async def run(self) -> None:
+        """Serve HTTP and run the lifecycle until SIGTERM or SIGINT."""
+        self.ready = asyncio.Event()
+        self.status_lock = asyncio.Lock()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        logger.info(f"Serving /healthz and /status on {self.host}:{self.port}")
+        lifecycle = asyncio.create_task(self.lifecycle())
+        await stop.wait()
+        logger.info("Shutting down")
+        server.close()
+        await server.wait_closed()
+        if self.state == MIGRATING:
+            logger.info("Waiting for the running migration to finish")
+            await asyncio.wait([lifecycle])
+        lifecycle.cancel()
+        for connection in (self.lock_connection, self.status_connection):
+            if connection is not None:
+                try:
+                    await connection.close()
+                except Error:
+                    pass
+
+def serve(migrator, host: str = '0.0.0.0', port: int = DEFAULT_PORT, **run_options) -> None:
+    """Run the migrator service until terminated."""
+    asyncio.run(MigratorService(migrator, host, port, run_options).run())
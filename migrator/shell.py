@@ -0,0 +1,340 @@
+import shlex
+import time
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from mysql.connector import Error
+from mysql.connector.errors import PoolError
+from mysql.connector.pooling import MySQLConnectionPool
+from tabulate import tabulate
+from output import FORMATS, READ_QUERY_PREFIXES
+from metrics import preview
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 2
+PREPARED_CACHE_SIZE = 64  # prepared statements kept open per shell
+BIND = '\\bind'
+PROMPT = 'xmod> '
+CONTINUATION = '   -> '
+HELP = """SQL statements end with ';' at the end of a line. Parameterized statements use ? placeholders
+and are prepared once, then reused:
+  SELECT * FROM users WHERE username = ? \\bind alice;
+Arguments are shell-quoted; NULL binds NULL.
+
+  \\help                      this text
+  \\q                         quit (also quit or exit)
+  \\timing on|off             print the time of each statement (default: on)
+  \\format table|csv|tsv|jsonl output format of result rows
+  \\prepared                  list the cached prepared statements
+  \\status                    migration version and pending migrations
+  \\add-global-admin USER     grant global admin, as --add-global-admin
+  \\remove-global-admin USER  revoke global admin, as --remove-global-admin"""
+
+class QueryTiming(NamedTuple):
+    number: int
+    sql: str
+    rows: int
+    seconds: float
+    prepared: str  # 'hit' or 'miss' for bound statements, '' otherwise
+    error: Optional[str]
+
+class PreparedCache:
+    """
+    Server-side prepared statements, one cursor per (connection, statement text), closed least
+    recently used first. mysql-connector re-prepares unless a cursor is executed with the very
+    string object it was prepared with, so that object is cached alongside the cursor.
+    """
+
+    def __init__(self, size: int = PREPARED_CACHE_SIZE):
+        self.size = size
+        self.entries: 'OrderedDict[Tuple[int, str], Tuple[object, str]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, connection, sql: str) -> Tuple[object, str, bool]:
+        """The prepared cursor and statement object for `sql` on `connection`, and whether it was cached."""
+        key = (connection.connection_id, sql)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return (*self.entries[key], True)
+        self.misses += 1
+        entry = (connection.cursor(prepared=True), sql)
+        self.entries[key] = entry
+        while len(self.entries) > self.size:
+            _, (cursor, _) = self.entries.popitem(last=False)
+            self.close_cursor(cursor)
+        return (*entry, False)
+
+    def discard(self, connection, sql: str) -> None:
+        """Forget a statement whose cursor failed."""
+        entry = self.entries.pop((connection.connection_id, sql), None)
+        if entry:
+            self.close_cursor(entry[0])
+
+    @staticmethod
+    def close_cursor(cursor) -> None:
+        """Close a cursor, deallocating its statement on the server."""
+        try:
+            cursor.close()
+        except Error as e:
+            logger.debug(f"Could not close prepared statement: {e}")
+
+    def close(self) -> None:
+        """Deallocate every cached statement."""
+        for cursor, _ in self.entries.values():
+            self.close_cursor(cursor)
+        self.entries.clear()
+
+def split_bind(text: str) -> Tuple[str, Optional[List[Optional[str]]]]:
+    """Split `SQL \\bind arg ...` into the statement and its arguments (None without \\bind)."""
+    text = text.strip().rstrip(';').strip()
+    if BIND not in text:
+        return text, None
+    sql, _, arguments = text.rpartition(BIND)
+    return sql.strip(), [None if a == 'NULL' else a for a in shlex.split(arguments)]
+
+def is_read(sql: str) -> bool:
+    """True for statements that only read, which run without confirmation."""
+    return sql.lstrip().lower().startswith(READ_QUERY_PREFIXES)
+
+def parse_line(buffer: List[str], line: str) -> Optional[Tuple[str, str]]:
+    """
+    Add one input line to the pending statement in `buffer`. Returns ('command', text) for a
+    backslash command, ('quit', text) for quit/exit, both only between statements, or
+    ('sql', text) once a line ends with ';'; None while a statement is incomplete.
+    """
+    stripped = line.strip()
+    if not buffer:
+        if not stripped or stripped.startswith('--'):
+            return None
+        if stripped.startswith('\\'):
+            return 'command', stripped
+        if stripped.lower() in ('quit', 'exit'):
+            return 'quit', stripped
+    buffer.append(line.rstrip('\n'))
+    if not stripped.endswith(';'):
+        return None
+    text = '\n'.join(buffer)
+    buffer.clear()
+    return 'sql', text
+
+def parse_lines(lines: Iterable[str]) -> List[Tuple[str, str]]:
+    """All commands and statements of a batch; a last statement may lack its ';'."""
+    buffer: List[str] = []
+    items = [item for item in (parse_line(buffer, line) for line in lines) if item]
+    if buffer:
+        items.append(('sql', '\n'.join(buffer)))
+    return items
+
+class Session:
+    """
+    A long-lived SQL session for the interactive --shell and for --run-file batches. Every
+    statement runs on one autocommit connection taken from a small pool for the whole session,
+    so user variables, SET SESSION, USE, temporary tables and explicit transactions carry over
+    from one statement to the next. The rest of the pool serves KILL QUERY when a read is
+    cancelled; the migrator's own connection stays open for admin commands.
+    """
+
+    def __init__(self, migrator, pool_size: int = DEFAULT_POOL_SIZE, fmt: str = 'table', ignore_warnings: bool = False):
+        if not migrator.ensure_connected():
+            raise RuntimeError("Database connection failed")
+        self.migrator = migrator
+        # Resetting sessions on return to the pool would deallocate the prepared statements
+        self.pool = MySQLConnectionPool(pool_name='migrator-session', pool_size=max(1, pool_size),
+                                        pool_reset_session=False, autocommit=True, **migrator.db_config)
+        self.connection = self.pool.get_connection()
+        self.cache = PreparedCache()
+        self.fmt = fmt
+        self.ignore_warnings = ignore_warnings
+        self.timing = True
+        self.timings: List[QueryTiming] = []
+        self.buffer: List[str] = []
+
+    def close(self) -> None:
+        """Deallocate prepared statements and close the pooled connections."""
+        self.cache.close()
+        self.connection.close()
+        self.pool._remove_connections()  # mysql-connector has no public way to close a pool
+
+    def confirm(self, sql: str) -> bool:
+        """Ask before running a statement that may modify data."""
+        if self.ignore_warnings or is_read(sql):
+            return True
+        return input("This query may modify data. Proceed? (y/n): ").strip().lower() == 'y'
+
+    def cancel(self, connection, cursor) -> None:
+        """Stop the server from sending the rest of a result and drain what is in flight."""
+        try:
+            spare = self.pool.get_connection()
+        except PoolError:  # a pool of one: use the migrator's connection
+            spare = None
+        try:
+            admin = (spare or self.migrator.connection).cursor()
+            admin.execute(f"KILL QUERY {int(connection.connection_id)}")
+            admin.close()
+        except Error as e:
+            logger.debug(f"Could not kill query on connection {connection.connection_id}: {e}")
+        finally:
+            if spare is not None:
+                spare.close()  # back to the pool
+        try:
+            cursor.fetchall()
+        except Error:
+            pass
+
+    def execute(self, text: str) -> QueryTiming:
+        """Run one statement (with optional \\bind arguments) on the session connection and show its result."""
+        sql, params = split_bind(text)
+        number = len(self.timings) + 1
+        connection = self.connection
+        if not connection.is_connected():
+            logger.warning("Session connection lost; reconnecting (session variables, temporary tables "
+                           "and any open transaction are gone)")
+            connection.reconnect(attempts=3, delay=1)
+        prepared = ''
+        started = time.monotonic()
+        rows, error = 0, None
+        try:
+            if params is not None:
+                cursor, statement, hit = self.cache.get(connection, sql)
+                prepared = 'hit' if hit else 'miss'
+                try:
+                    cursor.execute(statement, tuple(params))
+                except Error:
+                    self.cache.discard(connection, sql)
+                    raise
+            else:
+                cursor = connection.cursor()
+                cursor.execute(sql)
+            try:
+                if cursor.with_rows:
+                    if not self.migrator.emit_rows(cursor, self.fmt, None, None):
+                        self.cancel(connection, cursor)
+                    rows = max(cursor.rowcount, 0)
+                else:
+                    rows = max(cursor.rowcount, 0)
+                    print(f"Query executed successfully. Affected rows: {rows}")
+            finally:
+                if params is None:
+                    cursor.close()
+        except Error as e:
+            error = str(e)
+            print(f"ERROR: {e}")
+        timing = QueryTiming(number, sql, rows, time.monotonic() - started, prepared, error)
+        self.timings.append(timing)
+        if self.timing:
+            print(f"({timing.rows} rows, {timing.seconds * 1000:.1f} ms{f', prepared {prepared}' if prepared else ''})")
+        return timing
+
+    def command(self, line: str) -> bool:
+        """Run a backslash command; returns False to end the session."""
+        parts = line.split()
+        name, args = parts[0].lower(), parts[1:]
+        if name in ('\\q', '\\quit'):
+            return False
+        if name in ('\\help', '\\?', '\\h'):
+            print(HELP)
+        elif name == '\\timing':
+            self.timing = (args[0].lower() != 'off') if args else not self.timing
+            print(f"Timing is {'on' if self.timing else 'off'}")
+        elif name == '\\format' and args and args[0] in FORMATS:
+            self.fmt = args[0]
+        elif name == '\\prepared':
+            print(tabulate([{'Connection': connection_id, 'Statement': preview(sql, 80)}
+                            for connection_id, sql in self.cache.entries],
+                           headers="keys", tablefmt="grid"))
+            print(f"{len(self.cache.entries)} cached, {self.cache.hits} hits, {self.cache.misses} misses")
+        elif name == '\\status':
+            status = self.migrator.get_status()
+            current = f"{status['current']['timestamp']}_{status['current']['name']}" if status['current'] else 'none'
+            print(f"Current: {current}, pending: {len(status['ahead'])}")
+        elif name == '\\add-global-admin' and len(args) == 1:
+            self.migrator.add_global_admin(args[0])
+        elif name == '\\remove-global-admin' and len(args) == 1:
+            self.migrator.remove_global_admin(args[0])
+        else:
+            print(f"Unknown or incomplete command {line.strip()!r}; \\help lists the commands")
+        return True
+
+    def dispatch(self, kind: str, text: str) -> Tuple[bool, Optional[QueryTiming]]:
+        """Run a parsed command or statement; returns (keep going, statement timing)."""
+        if kind == 'quit':
+            return False, None
+        if kind == 'command':
+            try:
+                return self.command(text), None
+            except (Error, RuntimeError, ValueError) as e:
+                print(f"ERROR: {e}")
+                return True, None
+        if not self.confirm(split_bind(text)[0]):
+            logger.info("Query execution aborted by user")
+            return True, None
+        return True, self.execute(text)
+
+    def feed(self, line: str) -> Tuple[bool, Optional[QueryTiming]]:
+        """Take one input line, running the command or statement it completes."""
+        item = parse_line(self.buffer, line)
+        return self.dispatch(*item) if item else (True, None)
+
+    def interactive(self) -> None:
+        """Read statements and commands from the terminal until \\q or end of input."""
+        try:
+            import readline  # noqa: F401 -- line editing and history for input(), where available
+        except ImportError:
+            pass
+        print(f"Connected to {self.migrator.db_config['database']} (session connection {self.connection.connection_id}). "
+              f"\\help for help, \\q to quit.")
+        while True:
+            try:
+                line = input(CONTINUATION if self.buffer else PROMPT)
+            except EOFError:
+                print()
+                break
+            except KeyboardInterrupt:
+                print()
+                self.buffer = []
+                continue
+            keep_going, _ = self.feed(line)
+            if not keep_going:
+                break
+
+    def run_items(self, items: List[Tuple[str, str]], source: str) -> bool:
+        """Run a batch of parsed statements and commands, stopping at the first failing statement."""
+        started = time.monotonic()
+        ok = True
+        for kind, text in items:
+            keep_going, timing = self.dispatch(kind, text)
+            if timing and timing.error:
+                logger.error(f"{source}: statement {timing.number} failed: {timing.error}")
+                ok = False
+                break
+            if not keep_going:
+                break
+        if self.timings:
+            print(tabulate([{
+                '#': t.number,
+                'Statement': preview(t.sql, 60),
+                'Rows': t.rows,
+                'ms': t.seconds * 1000,
+                'Prepared': t.prepared,
+                'Status': 'ERROR' if t.error else 'OK',
+            } for t in self.timings], headers="keys", tablefmt="grid", floatfmt=".1f"))
+        logger.info(f"{source}: {len(self.timings)} statements in {time.monotonic() - started:.2f}s, "
+                    f"{sum(t.seconds for t in self.timings):.3f}s in queries; prepared statements: "
+                    f"{self.cache.hits} hits, {self.cache.misses} misses")
+        return ok
+
+    def run_file(self, path: Path) -> bool:
+        """Run the statements and commands of a file; writes need --ignore-warnings or one confirmation up front."""
+        with open(path, 'r') as f:
+            items = parse_lines(f)
+        writes = [text for kind, text in items if kind == 'sql' and not is_read(split_bind(text)[0])]
+        if writes and not self.ignore_warnings:
+            if input(f"{len(writes)} statements in {path} may modify data. Proceed? (y/n): ").strip().lower() != 'y':
+                logger.info("Batch aborted by user")
+                return False
+        self.ignore_warnings = True
+        return self.run_items(items, str(path))
@@ -0,0 +1,144 @@
+import re
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from schema_model import Table
+from tokenizer import quote_identifier, read_directives
+from fingerprint import ignored, load_live_schema
+from rehearsal import insertable_columns
+from db import run_statement
+
+logger = logging.getLogger(__name__)
+
+INSERT_ROWS = 100  # rows per INSERT statement of the baseline
+AUTO_INCREMENT_RE = re.compile(r'\s+AUTO_INCREMENT=\d+')
+DEFINER_RE = re.compile(r'\s+DEFINER=\S+')
+
+def baseline_path(directory: Path, timestamp: str) -> Path:
+    """Where the baseline covering the migrations up to `timestamp` is written."""
+    return directory / f"{timestamp}.sql"
+
+def read_covered(path: Path) -> List[str]:
+    """Timestamps of the migrations a baseline covers, from its `-- migrator:baseline covers=...` directive."""
+    with open(path, 'r') as f:
+        options = read_directives(f).get('baseline') or {}
+    return [t for t in options.get('covers', '').split(',') if t]
+
+def find_baseline(directory: Path, available: List[Dict], target: int) -> Optional[Tuple[Path, List[Dict]]]:
+    """
+    The newest baseline at or below the target version and the migrations it covers. A baseline
+    is skipped when a migration at or below its version is missing from its covers list, e.g.
+    one merged with an older timestamp after the squash.
+    """
+    if not directory.exists():
+        return None
+    baselines = sorted((int(p.stem), p) for p in directory.glob('*.sql') if p.stem.isdigit())
+    for timestamp, path in reversed(baselines):
+        if timestamp > target:
+            continue
+        covered = set(read_covered(path))
+        migrations = [m for m in available if int(m['timestamp']) <= timestamp]
+        missing = [f"{m['timestamp']}_{m['name']}" for m in migrations if m['timestamp'] not in covered]
+        if missing:
+            logger.warning(f"Ignoring baseline {path}: it does not cover {', '.join(missing)}")
+            continue
+        return path, migrations
+    return None
+
+def dependency_order(tables: Dict[str, Table]) -> List[str]:
+    """Table names with foreign key parents before their children, otherwise alphabetical."""
+    ordered: List[str] = []
+    visiting = set()
+
+    def visit(name: str) -> None:
+        if name in ordered or name in visiting or name not in tables:
+            return
+        visiting.add(name)
+        for fk in tables[name].foreign_keys.values():
+            visit(fk.ref_table)
+        visiting.discard(name)
+        ordered.append(name)
+    for name in sorted(tables):
+        visit(name)
+    return ordered
+
+class SchemaDump:
+    """Definitions and rows of a migrated scratch database, as the statements of a baseline."""
+
+    def __init__(self, connection, database: str):
+        self.connection = connection
+        self.database = database
+
+    def check_objects(self) -> None:
+        """Refuse schemas with objects the baseline does not reproduce."""
+        counts = run_statement(
+            self.connection,
+            "SELECT (SELECT COUNT(*) FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = %s), "
+            "(SELECT COUNT(*) FROM information_schema.ROUTINES WHERE ROUTINE_SCHEMA = %s), "
+            "(SELECT COUNT(*) FROM information_schema.EVENTS WHERE EVENT_SCHEMA = %s)",
+            (self.database,) * 3
+        )[0]
+        if any(counts):
+            raise ValueError(f"Cannot squash: the migrations create {counts[0]} triggers, {counts[1]} routines and "
+                             f"{counts[2]} events, which baselines do not support")
+
+    def create_table(self, table: str) -> str:
+        """CREATE TABLE statement without the AUTO_INCREMENT counter."""
+        create = run_statement(self.connection, f"SHOW CREATE TABLE {quote_identifier(self.database)}.{quote_identifier(table)}")[0][1]
+        return AUTO_INCREMENT_RE.sub('', create)
+
+    def create_view(self, view: str) -> str:
+        """CREATE VIEW statement without definer and schema qualifiers."""
+        create = run_statement(self.connection, f"SHOW CREATE VIEW {quote_identifier(self.database)}.{quote_identifier(view)}")[0][1]
+        return DEFINER_RE.sub('', create).replace(f"{quote_identifier(self.database)}.", '')
+
+    def inserts(self, table: str, columns: List[str]) -> List[str]:
+        """INSERT statements for the rows of a table, each value quoted by the server."""
+        quoted = ', '.join(f"QUOTE({quote_identifier(c)})" for c in columns)
+        rows = [row[0] for row in run_statement(
+            self.connection,
+            f"SELECT CONCAT('(', CONCAT_WS(', ', {quoted}), ')') "
+            f"FROM {quote_identifier(self.database)}.{quote_identifier(table)}"
+        )]
+        column_list = ', '.join(quote_identifier(c) for c in columns)
+        return [
+            f"INSERT INTO {quote_identifier(table)} ({column_list}) VALUES\n"
+            + ',\n'.join(r.decode('utf-8') if isinstance(r, (bytes, bytearray)) else r for r in rows[i:i + INSERT_ROWS])
+            for i in range(0, len(rows), INSERT_ROWS)
+        ]
+
+    def statements(self) -> List[str]:
+        """Tables with their final indexes and foreign keys, then the rows the migrations inserted, then views."""
+        self.check_objects()
+        tables, _ = load_live_schema(self.connection, self.database)
+        order = [t for t in dependency_order(tables) if not ignored(t)]
+        views = sorted(row[0] for row in run_statement(
+            self.connection,
+            "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'VIEW'",
+            (self.database,)
+        ))
+        columns = insertable_columns(self.connection, self.database)
+        statements = [self.create_table(t) for t in order]
+        for table in order:
+            if table != 'migrations':  # covered migrations are recorded when the baseline is applied
+                statements.extend(self.inserts(table, columns.get(table, [])))
+        statements.extend(self.create_view(v) for v in views)
+        return statements
+
+def write_baseline(path: Path, statements: List[str], covered: List[Tuple[str, str]]) -> None:
+    """Write a baseline script covering the (timestamp, name) migrations."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    last = f"{covered[-1][0]}_{covered[-1][1]}"
+    header = (
+        f"-- Baseline: {len(covered)} migrations up to {last}\n"
+        f"-- Created On: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        f"--\n"
+        f"-- GENERATED BY --squash; DO NOT EDIT\n"
+        f"--\n"
+        f"-- migrator:baseline covers={','.join(t for t, _ in covered)}\n"
+        f"-- migrator:serial\n\n"
+    )
+    body = ';\n\n'.join(["SET foreign_key_checks = 0", *statements, "SET foreign_key_checks = 1"]) + ';\n'
+    path.write_text(header + body)
+    logger.info(f"Wrote baseline {path}: {len(statements)} statements covering {len(covered)} migrations")
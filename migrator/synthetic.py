@@ -0,0 +1,438 @@
+import gzip
+import json
+import math
+import time
+import uuid
+import random
+import logging
+import multiprocessing
+from datetime import datetime, timezone
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from transfer import FORMAT_VERSION, MANIFEST
+
+logger = logging.getLogger(__name__)
+
+# Rows per unit of --scale; one unit is roughly 1M rows, most of them moderation scores
+POSTS_PER_SCALE = 100000
+USERS_PER_SCALE = 20000
+COMMUNITIES_PER_SCALE = 20  # grows with the square root of the scale
+POSTS_PER_CHUNK = 50000
+USERS_PER_CHUNK = 200000
+DAYS = 180  # posts are spread over this many days before the end date
+COMPRESS_LEVEL = 1  # chunk files are temporary; favour speed over size
+NULL = '\\N'  # generated values never contain tabs, newlines or backslashes, so rows are joined as is
+
+# Tables written, parents before children, in the latest schema (see Plan.tables for older ones)
+TABLES: Dict[str, List[str]] = {
+    'communities': ['id', 'x_community_id', 'name', 'description', 'rules', 'created_at'],
+    'users': ['id', 'x_user_id', 'username', 'display_name', 'badge', 'default_community_id', 'last_action_at', 'created_at'],
+    'user_roles': ['id', 'community_id', 'user_id', 'role', 'status', 'flag', 'reputation', 'created_at'],
+    'moderation_categories': ['id', 'community_id', 'name', 'description', 'color', 'soft_threshold', 'soft_action_type',
+                              'hard_threshold', 'hard_action_type', 'weight', 'is_active', 'created_at'],
+    'posts': ['id', 'x_post_id', 'community_id', 'user_id', 'parent_post_id', 'content_type', 'post_url', 'like_count',
+              'reply_count', 'review_status', 'moderation_status', 'created_at'],
+    'post_text': ['id', 'community_id', 'post_id', 'message', 'created_at'],
+    'post_images': ['id', 'community_id', 'post_id', 'x_content_url', 'width', 'height', 'mime_type', 'file_size',
+                    'alt_text', 'is_nsfw', 'classification', 'ordinal', 'created_at'],
+    'post_videos': ['id', 'community_id', 'post_id', 'x_content_url', 'width', 'height', 'mime_type', 'file_size',
+                    'duration', 'is_nsfw', 'classification', 'ordinal', 'created_at'],
+    'post_audios': ['id', 'community_id', 'post_id', 'x_content_url', 'mime_type', 'file_size', 'duration', 'is_nsfw',
+                    'classification', 'ordinal', 'created_at'],
+    'moderation_models': ['id', 'model_type', 'model_version', 'created_at'],
+    'post_moderation_scores': ['id', 'post_id', 'category_id', 'score', 'confidence', 'reputation_delta', 'model_id',
+                               'training_label', 'is_active', 'created_at'],
+    'embeddings': ['id', 'community_id', 'post_type_id', 'type', 'model', 'embedding_uuid', 'created_at'],
+    'user_bans': ['id', 'community_id', 'user_id', 'reason', 'expiry_at', 'created_at'],
+    'moderation_logs': ['id', 'community_id', 'user_id', 'target_user_id', 'target_post_id', 'action_type', 'reason', 'created_at'],
+}
+
+# name, description, RRGGBBAA color, soft threshold/action, hard threshold/action, weight
+CATEGORIES = [
+    ('spam', 'Unsolicited or repetitive promotion', 0xFF8800FF, 0.6, 1, 0.9, 2, 1.5),
+    ('toxicity', 'Rude or disrespectful language', 0xFF0000FF, 0.5, 1, 0.85, 2, 1.2),
+    ('harassment', 'Targeted abuse of another user', 0xAA0000FF, 0.5, 3, 0.8, 4, 1.5),
+    ('nsfw', 'Adult content', 0xFF00FFFF, 0.6, 1, 0.9, 2, 1.0),
+    ('misinformation', 'Misleading claims', 0xFFFF00FF, 0.7, 3, 0.95, 2, 1.0),
+    ('hate_speech', 'Attacks on protected groups', 0x660000FF, 0.4, 3, 0.75, 4, 2.0),
+    ('self_promotion', 'Excessive self promotion', 0x00AAFFFF, 0.7, 1, 0.95, 0, 0.5),
+    ('helpfulness', 'Helpful, on-topic contributions', 0x00FF00FF, 0.7, 0, 0.9, 0, 1.0),
+]
+ALWAYS_SCORED = 4  # every community has the first four categories; the rest are optional
+POSITIVE_CATEGORIES = {'helpfulness'}
+# Score columns are sampled per chunk from precomputed quantiles of their distribution, already
+# rounded to the 4 decimals stored, instead of drawing and rounding every value
+POOL_SIZE = 4096
+UNIFORM_POOL = [round((n + 0.5) / POOL_SIZE, 4) for n in range(POOL_SIZE)]
+BENIGN_POOL = [round(0.45 * ((n + 0.5) / POOL_SIZE) ** 3, 4) for n in range(POOL_SIZE)]  # most categories of most posts
+HIGH_POOL = [round(0.5 + 0.5 * (n + 0.5) / POOL_SIZE, 4) for n in range(POOL_SIZE)]  # violations and confidences
+LABELLED_POOL = [True] + [False] * 19  # 5% of the scores have a training label
+WORD_COUNT_POOL = [min(55, 3 + int(-18 * math.log(1 - (n + 0.5) / POOL_SIZE))) for n in range(POOL_SIZE)]  # words per text
+SCORE_MODEL = ('grok', 'grok-beta')  # (model_type, model_version) of every generated score
+MODEL_COLUMNS = ('model_id', 'model_type', 'model_version')  # post_moderation_scores columns naming the model
+ACTIONS = {1: 'FLAG_POST', 2: 'HIDE_POST', 3: 'NOTIFY_MODERATORS', 4: 'BAN_USER'}
+
+CONTENT_TEXT, CONTENT_IMAGE, CONTENT_VIDEO, CONTENT_AUDIO = 1, 2, 4, 8
+EMBEDDING_MODELS = ['all-mpnet-base-v2', 'clip-vit-base', 'x-clip-base', 'clap-htsat']
+EMBEDDING_SLOTS = 8  # text, up to four images, video, audio
+MAX_IMAGES = 4
+MODERATORS = 3  # per community
+
+WORDS = (
+    "the a to and of in is it for on that this with you be are was have not but just so what like about "
+    "community post thread reply moderation rule spam link free click today new update release bug fix code "
+    "python rust database query index migration server deploy build test review merge branch issue feature "
+    "great thanks help question answer please check out my video stream follow subscribe giveaway crypto "
+    "deal offer win now limited time breaking news report source claim fact wrong right agree disagree"
+).split()
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn']
+LAST_NAMES = ['Smith', 'Chen', 'Garcia', 'Okafor', 'Novak', 'Silva', 'Kim', 'Patel', 'Berg', 'Rossi']
+
+class ScoreDraws(NamedTuple):
+    """Random columns of a chunk's scores, `len(CATEGORIES)` slots per post."""
+    benign: List[float]
+    high: List[float]
+    uniform: List[float]
+    confidence: List[float]
+    labelled: List[bool]
+    violation: List[float]  # one per post
+
+class Plan(NamedTuple):
+    """Everything that determines the generated rows; the same plan always produces the same files."""
+    seed: int
+    scale: float
+    end: int  # UNIX time of the newest post
+    communities: int
+    users: int
+    posts: int
+    offsets: Dict[str, int]  # ids of each table start after these (the target's current MAX(id))
+    model_id: int  # moderation_models id of SCORE_MODEL; a new row is written when it is past the offset
+    model_columns: Tuple[str, ...]  # MODEL_COLUMNS the target's post_moderation_scores has
+
+    @classmethod
+    def create(cls, scale: float, seed: int = 1, end: Optional[datetime] = None,
+               offsets: Optional[Dict[str, int]] = None, model_id: Optional[int] = None,
+               model_columns: Tuple[str, ...] = ('model_id',)) -> 'Plan':
+        """Derive table sizes from the scale factor."""
+        if scale <= 0:
+            raise ValueError("Scale must be positive")
+        if not set(model_columns) & {'model_id', 'model_version'}:
+            raise ValueError("post_moderation_scores has neither model_id nor model_version")
+        end = end or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        offsets = {t: (offsets or {}).get(t, 0) for t in TABLES}
+        return cls(
+            seed, scale, int(end.timestamp()),
+            max(1, round(COMMUNITIES_PER_SCALE * scale ** 0.5)),
+            max(MODERATORS, int(USERS_PER_SCALE * scale)),
+            max(1, int(POSTS_PER_SCALE * scale)),
+            offsets,
+            model_id or offsets['moderation_models'] + 1,
+            tuple(c for c in MODEL_COLUMNS if c in model_columns),
+        )
+
+    def tables(self) -> Dict[str, List[str]]:
+        """
+        Columns written per table. Before moderation_models existed the scores named their model
+        with model_type/model_version; no models rows are written then.
+        """
+        tables = {}
+        for table, columns in TABLES.items():
+            if table == 'moderation_models' and 'model_id' not in self.model_columns:
+                continue
+            if table == 'post_moderation_scores':
+                at = columns.index('model_id')
+                columns = columns[:at] + list(self.model_columns) + columns[at + 1:]
+            tables[table] = columns
+        return tables
+
+    def tasks(self) -> List[Tuple[str, int]]:
+        """Independent units of work: (kind, chunk number)."""
+        return ([('communities', 0)]
+                + [('users', n) for n in range((self.users + USERS_PER_CHUNK - 1) // USERS_PER_CHUNK)]
+                + [('posts', n) for n in range((self.posts + POSTS_PER_CHUNK - 1) // POSTS_PER_CHUNK)])
+
+def zipf_cum_weights(count: int, exponent: float) -> List[float]:
+    """Cumulative weights of a Zipf distribution over `count` ranks."""
+    return list(accumulate(1.0 / (rank + 1) ** exponent for rank in range(count)))
+
+def timestamp(seconds: float) -> str:
+    """Format a UNIX time as a UTC DATETIME literal (imports run with time_zone = '+00:00')."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(seconds))
+
+class Generator:
+    """
+    Builds the rows of one task at a time. Shared state (community sizes, every user's home
+    community, moderators and categories) is derived from the seed alone, so each worker
+    process rebuilds the same state and chunks can be generated in any order. Child rows get
+    ids derived from their post's id (gaps are left where a post has fewer children), which keeps
+    chunks independent of one another.
+    """
+
+    def __init__(self, plan: Plan, directory: Path):
+        self.plan = plan
+        self.directory = Path(directory)
+        self.tables = plan.tables()
+        model = dict(zip(MODEL_COLUMNS, (plan.model_id, *SCORE_MODEL)))
+        self.model_values = tuple(model[column] for column in plan.model_columns)
+        self.community_weights = zipf_cum_weights(plan.communities, 1.2)
+        self.user_weights = zipf_cum_weights(plan.users, 0.9)  # a few users post most of the content
+        rng = random.Random(f"{plan.seed}:users")
+        self.home = rng.choices(range(plan.communities), cum_weights=self.community_weights, k=plan.users)
+        self.moderators: List[List[int]] = [[] for _ in range(plan.communities)]
+        for user, community in enumerate(self.home):
+            if len(self.moderators[community]) < MODERATORS:
+                self.moderators[community].append(user)
+        for community, moderators in enumerate(self.moderators):
+            if not moderators:
+                moderators.append(community % plan.users)
+        self.categories: List[List[Tuple[int, tuple, bool]]] = []  # per community: (category id, definition, active)
+        self.toxicity: List[float] = []
+        for community in range(plan.communities):
+            rng = random.Random(f"{plan.seed}:community:{community}")
+            chosen = []
+            for slot, definition in enumerate(CATEGORIES):
+                if slot < ALWAYS_SCORED or rng.random() < 0.5:
+                    chosen.append((self.category_id(community, slot), definition, slot < ALWAYS_SCORED or rng.random() > 0.05))
+            self.categories.append(chosen)
+            self.toxicity.append(0.5 + 1.5 * rng.random())
+
+    def id(self, table: str, number: int) -> int:
+        """Id of the `number`-th (0-based) row slot of a table."""
+        return self.plan.offsets[table] + number + 1
+
+    def community_id(self, community: int) -> int:
+        """Id of a generated community."""
+        return self.id('communities', community)
+
+    def user_id(self, user: int) -> int:
+        """Id of a generated user."""
+        return self.id('users', user)
+
+    def category_id(self, community: int, slot: int) -> int:
+        """Id of a community's category."""
+        return self.id('moderation_categories', community * len(CATEGORIES) + slot)
+
+    def run(self, task: Tuple[str, int]) -> Dict[str, Tuple[str, int]]:
+        """Generate one task and write its files; returns {table: (file, rows)}."""
+        kind, number = task
+        rng = random.Random(f"{self.plan.seed}:{kind}:{number}")
+        rows = getattr(self, f"generate_{kind}")(rng, number)
+        written = {}
+        for table, table_rows in rows.items():
+            if not table_rows:
+                continue
+            name = f"{table}/{table}.{kind}{number:06d}.tsv.gz"
+            path = self.directory / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=COMPRESS_LEVEL) as stream:
+                # Same layout as the --export TSV files: a header line, then one line per row
+                stream.write('\t'.join(self.tables[table]) + '\n')
+                stream.writelines('\t'.join(map(str, row)) + '\n' for row in table_rows)
+            written[table] = (name, len(table_rows))
+        return written
+
+    def generate_communities(self, rng: random.Random, number: int) -> Dict[str, List[tuple]]:
+        """Communities, their moderation categories and the scoring model, unless the target has it."""
+        created = timestamp(self.plan.end - (DAYS + 365) * 86400)
+        communities, categories = [], []
+        models = []
+        if 'moderation_models' in self.tables and self.plan.model_id > self.plan.offsets['moderation_models']:
+            models.append((self.plan.model_id, *SCORE_MODEL, created))
+        for community in range(self.plan.communities):
+            cid = self.community_id(community)
+            communities.append((cid, str(1700000000000000000 + cid), f"Synthetic Community {cid}",
+                                f"Generated community {community + 1} of {self.plan.communities}", '[]', created))
+            for category_id, (name, description, color, soft, soft_action, hard, hard_action, weight), active in self.categories[community]:
+                categories.append((category_id, cid, name, description, color, soft, soft_action, hard, hard_action,
+                                   weight, int(active), created))
+        return {'communities': communities, 'moderation_categories': categories, 'moderation_models': models}
+
+    def generate_users(self, rng: random.Random, number: int) -> Dict[str, List[tuple]]:
+        """A range of users, each with a role in their home community."""
+        start = self.plan.end - DAYS * 86400
+        users, roles = [], []
+        for user in range(number * USERS_PER_CHUNK, min(self.plan.users, (number + 1) * USERS_PER_CHUNK)):
+            uid, community = self.user_id(user), self.home[user]
+            created = timestamp(start - rng.random() * 365 * 86400)
+            badge = 1 if rng.random() < 0.05 else 8 if rng.random() < 0.01 else 0
+            users.append((uid, str(1500000000000000000 + uid), f"u{uid}"[:15],
+                          f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", badge, self.community_id(community),
+                          timestamp(self.plan.end - rng.expovariate(1 / (7 * 86400))), created))
+            moderators = self.moderators[community]
+            role = 2 if user == moderators[0] else 1 if user in moderators else 0
+            flag = 0 if rng.random() < 0.97 else rng.choice((1, 2))
+            roles.append((self.id('user_roles', user), self.community_id(community), uid, role, 1, flag,
+                          round(rng.uniform(-0.2, 0.6), 4), created))
+        return {'users': users, 'user_roles': roles}
+
+    def generate_posts(self, rng: random.Random, number: int) -> Dict[str, List[tuple]]:
+        """A range of posts with their text, media, scores, embeddings and the moderation they triggered."""
+        plan = self.plan
+        first, last = number * POSTS_PER_CHUNK, min(plan.posts, (number + 1) * POSTS_PER_CHUNK)
+        count = last - first
+        # Column-wise sampling for the whole chunk; the per-post loop only assembles rows
+        authors = rng.choices(range(plan.users), cum_weights=self.user_weights, k=count)
+        strays = rng.choices(range(plan.communities), cum_weights=self.community_weights, k=count)
+        draws = self.draw_scores(rng, count)
+        # Words of every post's text, drawn together and sliced off in order
+        lengths = rng.choices(WORD_COUNT_POOL, k=count)
+        words, position = rng.choices(WORDS, k=sum(lengths)), 0
+        rows: Dict[str, List[tuple]] = {t: [] for t in TABLES if t not in ('communities', 'users', 'user_roles', 'moderation_categories', 'moderation_models')}
+        recent: Dict[int, List[int]] = {}
+        span = DAYS * 86400
+        for offset in range(count):
+            post = first + offset
+            user = authors[offset]
+            community = self.home[user] if rng.random() < 0.85 else strays[offset]
+            pid, cid, uid = self.id('posts', post), self.community_id(community), self.user_id(user)
+            # Ids follow time, with volume growing towards the end date
+            created_at = plan.end - span + span * ((post + rng.random()) / plan.posts) ** 0.5
+            created = timestamp(created_at)
+            thread = recent.setdefault(community, [])
+            parent = rng.choice(thread) if thread and rng.random() < 0.25 else NULL
+            thread.append(pid)
+            if len(thread) > 50:
+                thread.pop(0)
+            content = CONTENT_TEXT if rng.random() < 0.9 else 0
+            images = 0
+            if rng.random() < 0.3:
+                content |= CONTENT_IMAGE
+                images = min(MAX_IMAGES, 1 + int(rng.expovariate(1.5)))
+            if rng.random() < 0.05:
+                content |= CONTENT_VIDEO
+            if rng.random() < 0.02:
+                content |= CONTENT_AUDIO
+            content = content or CONTENT_TEXT
+            slot = post * EMBEDDING_SLOTS
+            if content & CONTENT_TEXT:
+                text_id = self.id('post_text', post)
+                rows['post_text'].append((text_id, cid, pid, ' '.join(words[position:position + lengths[offset]]), created))
+                position += lengths[offset]
+                rows['embeddings'].append(self.embedding(rng, slot, cid, text_id, 0, created))
+            for ordinal in range(images):
+                image_id = self.id('post_images', post * MAX_IMAGES + ordinal)
+                width = rng.choice((640, 1080, 1200, 2048))
+                rows['post_images'].append((image_id, cid, pid, f"https://pbs.twimg.com/media/{image_id:x}.jpg", width,
+                                            int(width * rng.choice((0.5625, 0.75, 1.0, 1.25))), rng.choice(('image/jpeg', 'image/png', 'image/webp')),
+                                            int(rng.lognormvariate(12, 1)), NULL, 0, NULL, ordinal, created))
+                rows['embeddings'].append(self.embedding(rng, slot + 1 + ordinal, cid, image_id, 1, created))
+            if content & CONTENT_VIDEO:
+                video_id = self.id('post_videos', post)
+                rows['post_videos'].append((video_id, cid, pid, f"https://video.twimg.com/{video_id:x}.mp4", 1280, 720, 'video/mp4',
+                                            int(rng.lognormvariate(15, 1)), 1 + int(rng.expovariate(1 / 60)), 0, NULL, 0, created))
+                rows['embeddings'].append(self.embedding(rng, slot + 5, cid, video_id, 2, created))
+            if content & CONTENT_AUDIO:
+                audio_id = self.id('post_audios', post)
+                rows['post_audios'].append((audio_id, cid, pid, f"https://audio.twimg.com/{audio_id:x}.mp3", 'audio/mpeg',
+                                            int(rng.lognormvariate(13, 1)), 1 + int(rng.expovariate(1 / 120)), 0, NULL, 0, created))
+                rows['embeddings'].append(self.embedding(rng, slot + 6, cid, audio_id, 3, created))
+            action, reason = self.score(rng, draws, offset, post, pid, community, created, rows['post_moderation_scores'])
+            if action:
+                acted = created_at + rng.expovariate(1 / 3600)
+                rows['moderation_logs'].append((self.id('moderation_logs', post), cid, self.user_id(rng.choice(self.moderators[community])),
+                                                uid, pid, ACTIONS[action], reason, timestamp(acted)))
+                if action == 4:
+                    expiry = NULL if rng.random() < 0.3 else timestamp(acted + rng.choice((1, 7, 30)) * 86400)
+                    rows['user_bans'].append((self.id('user_bans', post), cid, uid, reason, expiry, timestamp(acted)))
+            review_status = 1 if action else 0
+            moderation_status = 2 if action in (2, 4) else 1 if created_at < plan.end - 86400 else 0
+            likes = int(rng.paretovariate(1.2)) - 1
+            rows['posts'].append((pid, str(1800000000000000000 + pid), cid, uid, parent, content,
+                                  f"https://x.com/i/status/{1800000000000000000 + pid}", likes,
+                                  int(likes * rng.random() * 0.3), review_status, moderation_status, created))
+        return rows
+
+    def embedding(self, rng: random.Random, slot: int, community_id: int, content_id: int, kind: int, created: str) -> tuple:
+        """One embeddings row referencing a content row."""
+        return (self.id('embeddings', slot), community_id, content_id, kind, EMBEDDING_MODELS[kind],
+                str(uuid.UUID(int=rng.getrandbits(128), version=4)), created)
+
+    def draw_scores(self, rng: random.Random, count: int) -> ScoreDraws:
+        """Sample the score columns of `count` posts at once."""
+        slots = count * len(CATEGORIES)
+        return ScoreDraws(
+            rng.choices(BENIGN_POOL, k=slots), rng.choices(HIGH_POOL, k=slots), rng.choices(UNIFORM_POOL, k=slots),
+            rng.choices(HIGH_POOL, k=slots), rng.choices(LABELLED_POOL, k=slots), rng.choices(UNIFORM_POOL, k=count)
+        )
+
+    def score(self, rng: random.Random, draws: ScoreDraws, offset: int, post: int, pid: int, community: int, created: str,
+              scores: List[tuple]) -> Tuple[int, Optional[str]]:
+        """
+        Score the `offset`-th post of the chunk against its community's categories, taking the
+        values from `draws`; returns the strongest action triggered and why.
+        """
+        action, reason = 0, None
+        categories = self.categories[community]
+        # Most posts are benign; a few (more in toxic communities) score high in one category
+        violation = rng.randrange(len(categories)) if draws.violation[offset] < 0.03 * self.toxicity[community] else None
+        base = offset * len(CATEGORIES)
+        first_id = self.id('post_moderation_scores', post * len(CATEGORIES))
+        for slot, (category_id, definition, active) in enumerate(categories):
+            name, _, _, soft, soft_action, hard, hard_action, weight = definition
+            n = base + slot
+            if name in POSITIVE_CATEGORIES:
+                value = draws.uniform[n]
+                delta = min(1.0, value * weight)
+            else:
+                value = draws.high[n] if slot == violation else draws.benign[n]
+                delta = max(-1.0, -value * weight)
+            label = int(value >= soft) if draws.labelled[n] else NULL
+            scores.append((first_id + slot, pid, category_id, value, draws.confidence[n], round(delta, 4),
+                           *self.model_values, label, int(active), created))
+            triggered = hard_action if value >= hard else soft_action if value >= soft else 0
+            if active and triggered > action:
+                action, reason = triggered, f"{name} score={value:.2f}"
+        return action, reason
+
+# Per-process generator of pool workers
+worker_generator: Optional[Generator] = None
+
+def init_worker(plan: Plan, directory: str) -> None:
+    """Rebuild the shared state from the plan."""
+    global worker_generator
+    worker_generator = Generator(plan, Path(directory))
+
+def generate_task(task: Tuple[str, int]) -> Dict[str, Tuple[str, int]]:
+    """Generate one task in a pool worker."""
+    return worker_generator.run(task)
+
+class SyntheticDataset:
+    """Writes a synthetic dataset as an --export directory, so --import can load it."""
+
+    def __init__(self, plan: Plan, directory: Path, jobs: int = 4):
+        self.plan = plan
+        self.directory = Path(directory)
+        self.jobs = max(1, jobs)
+
+    def run(self, schema_version: Optional[str] = None) -> Dict:
+        """Generate every task over a pool of processes and write the manifest; returns it."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tasks = self.plan.tasks()
+        logger.info(f"Generating {self.plan.communities} communities, {self.plan.users} users and {self.plan.posts} posts "
+                    f"(scale {self.plan.scale:g}, seed {self.plan.seed}) in {len(tasks)} tasks with {self.jobs} workers")
+        started = time.monotonic()
+        chunks: Dict[str, List[Dict]] = {t: [] for t in TABLES}
+        with multiprocessing.Pool(self.jobs, initializer=init_worker, initargs=(self.plan, str(self.directory))) as pool:
+            for written in pool.imap_unordered(generate_task, tasks):
+                for table, (name, rows) in written.items():
+                    chunks[table].append({'file': name, 'rows': rows})
+        manifest = {
+            'format': FORMAT_VERSION,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'database': None,
+            'schema_version': schema_version,
+            'community_id': None,
+            'consistent': True,
+            'synthetic': dict(self.plan._asdict(), end=timestamp(self.plan.end)),
+            'tables': [
+                {'name': table, 'columns': columns, 'binary_columns': [],
+                 'chunks': sorted(chunks[table], key=lambda c: c['file'])}
+                for table, columns in self.plan.tables().items()
+            ],
+        }
+        (self.directory / MANIFEST).write_text(json.dumps(manifest, indent=2))
+        total = sum(c['rows'] for t in manifest['tables'] for c in t['chunks'])
+        elapsed = time.monotonic() - started
+        logger.info(f"Generated {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s) in {self.directory}")
+        return manifest
@@ -0,0 +1,67 @@
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SET_RE = re.compile(r'^SET\s+(?:SESSION\s+)?(@?\w+)\s*:?=\s*(\S+?);?$', re.IGNORECASE)
+
+class FakeCursor:
+    """Cursor that logs each statement with the session variables it ran under; statements starting with BROKEN fail."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.with_rows = False
+        self.rowcount = 0
+        self.warning_count = 0
+
+    def execute(self, sql, params=None):
+        if sql.startswith('BROKEN'):
+            raise RuntimeError('syntax error')
+        match = SET_RE.match(sql)
+        if match:
+            self.connection.session[match.group(1).lower()] = match.group(2)
+        self.connection.statements.append(sql)
+        self.connection.server.executed.append((sql, params, dict(self.connection.session)))
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    """Connection of a FakeServer; close() hands it to `on_close`, as a pool takes its connections back."""
+
+    def __init__(self, server, connection_id, on_close=None):
+        self.server = server
+        self.connection_id = connection_id
+        self.on_close = on_close
+        self.session = {}
+        self.statements = []
+
+    def cursor(self, prepared=False, dictionary=False):
+        return FakeCursor(self)
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        if self.on_close is not None:
+            self.on_close(self)
+
+class FakeServer:
+    """Opens FakeConnections that log to one list of (sql, params, session variables) entries."""
+
+    def __init__(self):
+        self.executed = []
+        self.connections = []
+
+    def connect(self, on_close=None):
+        connection = FakeConnection(self, len(self.connections) + 1, on_close)
+        self.connections.append(connection)
+        return connection
+
+@pytest.fixture
+def server():
+    """A FakeServer to open connections to."""
+    return FakeServer()
@@ -0,0 +1,12 @@
+from checkpoints import StatementCheckpoints, statement_hash
+
+def test_session_statements_are_never_checkpointed(server):
+    """SET and USE are neither recorded nor reported as done, so a resume runs them again."""
+    connection = server.connect()
+    checkpoints = StatementCheckpoints(connection, '100', 'up')
+    checkpoints.record([(1, "SET foreign_key_checks = 0"), (2, "ALTER TABLE t ADD COLUMN c INT")])
+    (sql, params, _), = server.executed
+    assert params == (100, 'up', 2, statement_hash("ALTER TABLE t ADD COLUMN c INT"))
+    checkpoints.completed = {1: statement_hash("SET foreign_key_checks = 0"), 2: params[3]}
+    assert not checkpoints.is_done(1, "SET foreign_key_checks = 0")
+    assert checkpoints.is_done(2, "ALTER TABLE t ADD COLUMN c INT")
@@ -0,0 +1,116 @@
+import logging
+
+import pytest
+from mysql.connector import Error
+from executor import BatchExecutor, ParallelExecutor, analyze_statement, build_dependencies, coalesce_batches
+
+def test_session_statements_are_barriers():
+    """SET is classified as a session statement and orders the statements around it."""
+    statements = ["CREATE TABLE a (id INT)", "SET foreign_key_checks = 0", "ALTER TABLE b ADD FOREIGN KEY (a_id) REFERENCES a(id)"]
+    assert analyze_statement(statements[1]).kind == 'session'
+    assert analyze_statement("SET GLOBAL max_connections = 10").kind == 'barrier'
+    assert build_dependencies(statements) == [set(), {0}, {1}]
+
+def test_session_statements_run_on_every_worker(server):
+    """Every worker connection sees SET foreign_key_checks = 0 before the statements after it."""
+    executor = ParallelExecutor(server.connect, 3)
+    executor.open()
+    statements = ["SET foreign_key_checks = 0"] + [f"ALTER TABLE t{n} ADD FOREIGN KEY (x) REFERENCES p(id)" for n in range(6)]
+    executor.run(statements)
+    assert sum(1 for sql, _, _ in server.executed if sql.startswith('SET')) == 3
+    assert all(session['foreign_key_checks'] == '0' for sql, _, session in server.executed if sql.startswith('ALTER'))
+
+def test_failure_counts_only_pending_statements(server, caplog):
+    """Statements completed before a resume are not counted as pending."""
+    executor = ParallelExecutor(server.connect, 2)
+    executor.open()
+    statements = ["CREATE TABLE a (id INT)", "CREATE TABLE b (id INT)", "CREATE TABLE c (id INT)", "BROKEN"]
+    with caplog.at_level(logging.ERROR), pytest.raises(RuntimeError):
+        executor.run(statements, done={1, 2})
+    assert "Statement 4 failed after 1/2 statements completed" in caplog.text
+
+def test_resume_reruns_session_statements_first(server):
+    """On resume the SET runs again on every worker before the statements that were not done."""
+    executor = ParallelExecutor(server.connect, 2)
+    executor.open()
+    statements = ["SET foreign_key_checks = 0"] + [f"ALTER TABLE t{n} ADD FOREIGN KEY (x) REFERENCES p(id)" for n in range(4)]
+    executor.run(statements, done={2, 3})
+    assert [sql for sql, _, _ in server.executed if sql.startswith('SET')] == ["SET foreign_key_checks = 0"] * 2
+    assert [sql for sql, _, _ in server.executed if sql.startswith('ALTER')] == statements[3:]
+    assert all(session['foreign_key_checks'] == '0' for sql, _, session in server.executed if sql.startswith('ALTER'))
+
+class MultiStatementCursor:
+    """Cursor running ';'-separated queries that fails on the one mentioning `broken`."""
+
+    def __init__(self, queries):
+        self.queries = queries
+        self.rowcount = 0
+        self.warning_count = 0
+
+    def execute(self, sql):
+        self.pending = sql.split(';\n')
+        self.nextset()
+
+    def nextset(self):
+        if not self.pending:
+            return None
+        query = self.pending.pop(0)
+        if 'broken' in query:
+            raise Error(msg='Deadlock found')
+        self.queries.append(query)
+        self.rowcount = 1
+        return True
+
+    def close(self):
+        pass
+
+class MultiStatementConnection:
+    def __init__(self):
+        self.queries = []
+
+    def cursor(self):
+        return MultiStatementCursor(self.queries)
+
+def test_batch_fallback_runs_through_execute_single():
+    """After a failed batch the rest of it goes through the serial callback, the applied prefix is reported once."""
+    connection = MultiStatementConnection()
+    single, succeeded = [], []
+    batches = BatchExecutor(connection, lambda i, statement: single.append(i), on_success=succeeded.append)
+    statements = [(1, "UPDATE a SET x = 1"), (2, "UPDATE a SET x = 2 WHERE broken"), (3, "DELETE FROM a WHERE id = 3")]
+    batch, = coalesce_batches(statements, 10)
+    batches.execute(batch)
+    assert connection.queries == ["UPDATE a SET x = 1"]
+    assert succeeded == [[(1, "UPDATE a SET x = 1")]]
+    assert single == [2, 3]
+
+def test_inserts_before_last_insert_id_keep_their_own_statement():
+    """A statement reading LAST_INSERT_ID() follows the single INSERT it followed in the script."""
+    statements = list(enumerate([
+        "INSERT INTO communities (name) VALUES ('a')",
+        "INSERT INTO communities (name) VALUES ('b')",
+        "INSERT INTO settings (community_id, name) VALUES (LAST_INSERT_ID(), 'x')",
+        "INSERT INTO settings (community_id, name) VALUES (@@identity, 'y')",
+        "INSERT INTO communities (name) VALUES ('c')",
+        "INSERT INTO communities (name) VALUES ('d')",
+        "SET @id = LAST_INSERT_ID()",
+        "INSERT INTO settings (community_id, name) VALUES (@id, 'z')",
+        "INSERT INTO settings (community_id, name) VALUES (1, 'LAST_INSERT_ID()')",
+        "INSERT INTO settings (community_id, name) VALUES (2, 'w')",
+    ], start=1))
+    batches = list(coalesce_batches(statements, 10))
+    assert [batch.queries for batch in batches] == [
+        [
+            "INSERT INTO communities (name) VALUES ('a')",
+            "INSERT INTO communities (name) VALUES ('b')",
+            "INSERT INTO settings (community_id, name) VALUES (LAST_INSERT_ID(), 'x')",
+            "INSERT INTO settings (community_id, name) VALUES (@@identity, 'y')",
+            "INSERT INTO communities (name) VALUES ('c')",
+            "INSERT INTO communities (name) VALUES ('d')",
+        ],
+        ["SET @id = LAST_INSERT_ID()"],
+        [
+            "INSERT INTO settings (community_id, name) VALUES (@id, 'z')",
+            "INSERT INTO settings (community_id, name) VALUES (1, 'LAST_INSERT_ID()'),\n(2, 'w')",
+        ],
+    ]
+    assert [member for batch in batches for member in batch.members] == [[0], [1], [2], [3], [4], [5], [0], [0], [1, 2]]
@@ -0,0 +1,14 @@
+from metrics import RunReport, StatementMetrics
+
+def test_retried_migration_is_exported_once():
+    """A failed attempt followed by a successful retry yields one sample per series, from the retry."""
+    report = RunReport('moderator')
+    for success in (False, True):
+        metrics = report.start('100', 'first', 'up')
+        metrics.add(StatementMetrics(1, 1, 'ALTER TABLE t ADD COLUMN c INT', 'serial', 0.5, 0, 0, {}))
+        metrics.finish(success)
+    report.start('200', 'second', 'up').finish(True)
+    series = [line.rsplit(' ', 1)[0] for line in report.prometheus().splitlines() if not line.startswith('#')]
+    assert len(series) == len(set(series))
+    assert 'migrator_migration_success{database="moderator",migration="100_first",direction="up"} 1' in report.prometheus()
+    assert report.success
@@ -0,0 +1,89 @@
+import time
+import asyncio
+import service
+from mysql.connector.errors import OperationalError
+
+class FakeAsyncCursor:
+    """asyncio cursor answering the lock functions from its connection."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    async def execute(self, sql, params=()):
+        self.connection.statements.append(sql)
+        if sql.startswith('SELECT IS_USED_LOCK(%s) = CONNECTION_ID()'):
+            self.connection.checks += 1
+            if self.connection.checks > self.connection.drop_after:
+                raise OperationalError("Lost connection to MariaDB server during query")
+            self.rows = [(1,)]
+        elif sql.startswith('SELECT IS_USED_LOCK'):
+            self.rows = [(None,)]
+        elif sql.startswith(('SELECT GET_LOCK', 'SELECT RELEASE_LOCK')):
+            self.rows = [(1,)]
+        else:
+            self.rows = []
+
+    async def fetchall(self):
+        return self.rows
+
+    async def close(self):
+        pass
+
+class FakeAsyncConnection:
+    """Lock connection that drops after `drop_after` lock checks."""
+
+    def __init__(self, drop_after):
+        self.drop_after = drop_after
+        self.checks = 0
+        self.statements = []
+
+    async def cursor(self, dictionary=False):
+        return FakeAsyncCursor(self)
+
+class FakeMigrator:
+    """Migrator whose run() blocks its thread for `seconds`."""
+
+    db_config = {'database': 'xmod'}
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.finished = False
+
+    def run(self, **options):
+        time.sleep(self.seconds)
+        self.finished = True
+
+def run_lifecycle(monkeypatch, drop_after):
+    """Run one lifecycle against a fake lock connection and return the service and connection."""
+    monkeypatch.setattr(service, 'LOCK_CHECK', 0.05)
+    connection = FakeAsyncConnection(drop_after)
+    instance = service.MigratorService(FakeMigrator(0.5))
+
+    async def connect():
+        return connection
+
+    async def main():
+        instance.ready = asyncio.Event()
+        monkeypatch.setattr(instance, 'connect', connect)
+        await instance.lifecycle()
+
+    asyncio.run(main())
+    return instance, connection
+
+def test_lock_session_is_kept_open_and_checked(monkeypatch):
+    """The lock session gets a long wait_timeout and is checked while the migration runs."""
+    instance, connection = run_lifecycle(monkeypatch, drop_after=1000)
+    assert instance.state == service.READY
+    assert instance.ready.is_set()
+    assert connection.statements[0] == "SET SESSION wait_timeout = %s"
+    assert connection.checks >= 2
+
+def test_dropped_lock_connection_fails_the_instance(monkeypatch):
+    """Losing the lock connection mid-migration marks the instance failed, never ready."""
+    instance, connection = run_lifecycle(monkeypatch, drop_after=2)
+    assert instance.state == service.FAILED
+    assert 'migration lock lost' in instance.error
+    assert not instance.ready.is_set()
+    assert instance.migrator.finished
+    assert connection.statements[-1].startswith('SELECT RELEASE_LOCK')
@@ -0,0 +1,41 @@
+import queue
+import shell
+from mysql.connector.errors import PoolError
+
+class FakePool:
+    """FIFO pool, as MySQLConnectionPool."""
+
+    def __init__(self, server, pool_size):
+        self.pool_size = pool_size
+        self.queue = queue.Queue()
+        self.connections = [server.connect(on_close=self.queue.put) for _ in range(pool_size)]
+        for connection in self.connections:
+            self.queue.put(connection)
+
+    def get_connection(self):
+        try:
+            return self.queue.get(block=False)
+        except queue.Empty:
+            raise PoolError("Failed getting connection; pool exhausted")
+
+    def _remove_connections(self):
+        pass
+
+class FakeMigrator:
+    db_config = {}
+    connection = None
+
+    def ensure_connected(self):
+        return True
+
+def test_statements_share_one_connection(server, monkeypatch):
+    """Session state set by one statement is seen by the next: every statement runs on one connection."""
+    monkeypatch.setattr(shell, 'MySQLConnectionPool', lambda pool_name, pool_size, **config: FakePool(server, pool_size))
+    session = shell.Session(FakeMigrator(), pool_size=2, ignore_warnings=True)
+    for statement in ("SET @x := 1", "START TRANSACTION", "UPDATE t SET a = 1", "ROLLBACK"):
+        assert session.execute(statement).error is None
+    first, second = session.pool.connections
+    assert first.statements == ["SET @x := 1", "START TRANSACTION", "UPDATE t SET a = 1", "ROLLBACK"]
+    assert first.session == {'@x': '1'}
+    assert second.statements == []
+    assert session.pool.get_connection() is second  # the spare stays available for KILL QUERY
@@ -0,0 +1,65 @@
+import migrator as cli
+
+class FakeScratch:
+    """ScratchSchema without a server."""
+
+    def __init__(self, connection, source, name=None):
+        self.name = name
+
+    def create_empty(self):
+        pass
+
+    def drop(self):
+        pass
+
+class FakeDump:
+    """SchemaDump returning fixed statements."""
+
+    def __init__(self, connection, database):
+        pass
+
+    def statements(self):
+        return ["CREATE TABLE t (id INT PRIMARY KEY)"]
+
+class FakeMigrator:
+    """Scratch migrator that records what it is asked to do."""
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.connection = object()
+
+    def apply_migration(self, timestamp, name, direction, ignore_warnings=False):
+        self.calls.append(('apply', timestamp))
+
+    def apply_baseline(self, path, covered):
+        self.calls.append(('baseline', path.read_text()))
+
+    def close(self):
+        pass
+
+def test_squash_writes_the_baseline(tmp_path, monkeypatch):
+    """squash() runs past write_baseline (squash's, not lint's) and verifies the written file."""
+    for timestamp, name in (('100', 'first'), ('200', 'second'), ('300', 'third')):
+        (tmp_path / 'migrations' / f"{timestamp}_{name}").mkdir(parents=True)
+        for script in ('up.sql', 'down.sql'):
+            (tmp_path / 'migrations' / f"{timestamp}_{name}" / script).write_text('SELECT 1;\n')
+    calls = []
+    monkeypatch.setattr(cli, 'ScratchSchema', FakeScratch)
+    monkeypatch.setattr(cli, 'SchemaDump', FakeDump)
+    monkeypatch.setattr(cli, 'live_fingerprint', lambda connection, database: 'abc')
+    migrator = cli.Migrator()
+    migrator.migrations_dir = tmp_path / 'migrations'
+    migrator.baselines_dir = tmp_path / 'baselines'
+    migrator.ensure_connected = lambda: True
+    migrator.connection = object()
+    migrator.scratch_migrator = lambda database: FakeMigrator(calls)
+    migrator.list_migrations = migrator.list_available_migrations
+
+    path = migrator.squash('200')
+
+    assert path == tmp_path / 'baselines' / '200.sql'
+    assert calls[:2] == [('apply', '100'), ('apply', '200')]
+    assert calls[2][0] == 'baseline'
+    text = path.read_text()
+    assert '-- migrator:baseline covers=100,200' in text
+    assert 'CREATE TABLE t (id INT PRIMARY KEY);' in text
@@ -0,0 +1,35 @@
+import gzip
+from datetime import datetime, timezone
+from pathlib import Path
+from synthetic import TABLES, Generator, Plan
+
+END = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+def read_rows(directory: Path, written):
+    """Header and rows of each written file."""
+    tables = {}
+    for table, (name, _) in written.items():
+        with gzip.open(directory / name, 'rt') as stream:
+            lines = stream.read().splitlines()
+        tables[table] = ([lines[0].split('\t')], [line.split('\t') for line in lines[1:]])
+    return tables
+
+def test_latest_schema_writes_model_ids(tmp_path):
+    """By default scores reference a moderation_models row."""
+    plan = Plan.create(0.001, end=END)
+    assert plan.tables() == TABLES
+    generator = Generator(plan, tmp_path)
+    tables = read_rows(tmp_path, generator.run(('communities', 0)))
+    assert tables['moderation_models'][1] == [['1', 'grok', 'grok-beta', tables['moderation_models'][1][0][3]]]
+
+def test_schema_without_model_id_writes_model_strings(tmp_path):
+    """Before moderation_models existed the scores carry model_type/model_version and no models rows are written."""
+    plan = Plan.create(0.001, end=END, model_columns=('model_type', 'model_version'))
+    assert 'moderation_models' not in plan.tables()
+    generator = Generator(plan, tmp_path)
+    assert 'moderation_models' not in generator.run(('communities', 0))
+    tables = read_rows(tmp_path, generator.run(('posts', 0)))
+    (header,), rows = tables['post_moderation_scores']
+    assert 'model_id' not in header
+    assert {(row[header.index('model_type')], row[header.index('model_version')]) for row in rows} == {('grok', 'grok-beta')}
+    assert all(len(row) == len(header) for row in rows)
@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import pytest
+from tokenizer import SQLTokenizer, iter_sql_statements, read_directives
+
+MIGRATIONS = Path(__file__).resolve().parent.parent / 'migrations'
+
+def split_in_chunks(sql, size):
+    """Feed `sql` to a tokenizer `size` characters at a time."""
+    tokenizer = SQLTokenizer()
+    statements = []
+    for start in range(0, len(sql), size):
+        statements.extend(tokenizer.feed(sql[start:start + size]))
+    statements.extend(tokenizer.close())
+    return statements
+
+def test_quotes_do_not_end_statements():
+    """Delimiters and comment markers inside strings and identifiers are text."""
+    sql = (
+        "INSERT INTO t VALUES ('a;b', 'it''s', 'back\\'slash; -- no', \"say \\\"hi\\\";\");\n"
+        "SELECT `odd;``name` FROM t;\n"
+    )
+    assert list(iter_sql_statements(sql)) == [
+        "INSERT INTO t VALUES ('a;b', 'it''s', 'back\\'slash; -- no', \"say \\\"hi\\\";\");",
+        "SELECT `odd;``name` FROM t;",
+    ]
+
+def test_comments_are_dropped_but_versioned_comments_kept():
+    """--, # and /* */ comments go, /*! */, /*M! */ and /*+ */ stay verbatim."""
+    sql = (
+        "-- leading comment; with a semicolon\n"
+        "# hash comment;\n"
+        "CREATE TABLE t (id INT) /* plain; */ /*!50100 ENGINE=InnoDB */;\n"
+        "SELECT /*+ MAX_EXECUTION_TIME(1) */ 1 /*M!100100 , 2 */;\n"
+        "SELECT 1--2 AS x;\n"
+        "SELECT 3; -- trailing\n"
+    )
+    assert list(iter_sql_statements(sql)) == [
+        "CREATE TABLE t (id INT)   /*!50100 ENGINE=InnoDB */;",
+        "SELECT /*+ MAX_EXECUTION_TIME(1) */ 1 /*M!100100 , 2 */;",
+        "SELECT 1--2 AS x;",
+        "SELECT 3;",
+    ]
+
+def test_delimiter_blocks():
+    """DELIMITER $$ keeps the triggers of a migration whole, with the custom delimiter stripped."""
+    with open(MIGRATIONS / '1792198532_admiring-archimedes' / 'up.sql', encoding='utf-8') as f:
+        statements = list(iter_sql_statements(f))
+    triggers = [s for s in statements if s.startswith('CREATE TRIGGER')]
+    assert len(triggers) == 2
+    assert all(t.endswith('END') and t.count('END IF;') >= 2 for t in triggers)
+    assert not any('DELIMITER' in s or '$$' in s for s in statements)
+    assert statements[-1].startswith('CREATE OR REPLACE VIEW post_moderation_scores_compat')
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64])
+def test_statements_split_across_chunks(size):
+    """Any chunking gives the same statements as reading the script at once."""
+    sql = (
+        "INSERT INTO t VALUES ('a\\'b;', 'c''d');\n"
+        "-- comment\nSELECT /*! 1 */ /* x; */ 2;\n"
+        "DELIMITER $$\nCREATE PROCEDURE p() BEGIN SELECT 1; END$$\nDELIMITER ;\n"
+        "SELECT `a``b` # tail\n;"
+    )
+    expected = [
+        "INSERT INTO t VALUES ('a\\'b;', 'c''d');",
+        "SELECT /*! 1 */   2;",
+        "CREATE PROCEDURE p() BEGIN SELECT 1; END",
+        "SELECT `a``b` \n;",
+    ]
+    assert list(iter_sql_statements(sql)) == expected
+    assert split_in_chunks(sql, size) == expected
+
+def test_trailing_statement_without_delimiter():
+    """The last statement is yielded even without a closing delimiter."""
+    assert list(iter_sql_statements("SELECT 1;\nSELECT 2\n")) == ["SELECT 1;", "SELECT 2"]
+
+def test_read_directives():
+    """-- migrator: lines give each directive its options, bare words map to ''."""
+    lines = [
+        "-- Migration: example\n",
+        "-- migrator:online tables=posts,users\n",
+        "--migrator: Serial\n",
+        "-- migrator:baseline covers=1,2 Strict\n",
+        "SELECT 1; -- migrator:ignored\n",
+    ]
+    assert read_directives(lines) == {
+        'online': {'tables': 'posts,users'},
+        'serial': {},
+        'baseline': {'covers': '1,2', 'strict': ''},
+    }
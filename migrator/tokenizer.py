@@ -0,0 +1,224 @@
+import re
+from typing import Dict, Iterable, Iterator, List, Union
+
+# Scanner states
+NORMAL = 0
+QUOTED = 1
+LINE_COMMENT = 2
+BLOCK_COMMENT = 3
+KEPT_COMMENT = 4  # /*! ... */, /*M! ... */ and /*+ ... */ are interpreted by the server
+
+# Next interesting character inside a quoted string or identifier. Single and double
+# quoted strings honor backslash escapes; backtick identifiers only support doubling.
+QUOTE_PATTERNS = {
+    "'": re.compile(r"[\\']"),
+    '"': re.compile(r'[\\"]'),
+    '`': re.compile(r'`'),
+}
+
+DELIMITER_RE = re.compile(r'\s*DELIMITER[ \t]+(\S+)[^\n]*(?:\n|$)', re.IGNORECASE)
+DELIMITER_START_RE = re.compile(r'\s*(?:D(?:E(?:L(?:I(?:M(?:I(?:T(?:E(?:R[^\n]*)?)?)?)?)?)?)?)?)?$', re.IGNORECASE)
+KEPT_COMMENT_PREFIXES = ('!', 'M!', '+')
+
+def normal_pattern(delimiter: str) -> 're.Pattern':
+    """Build the pattern matching the next token of interest outside quotes and comments."""
+    return re.compile(r"""['"`#]|--(?=\s|$)|/\*|""" + re.escape(delimiter))
+
+class SQLTokenizer:
+    """
+    Single-pass, incremental SQL statement splitter.
+    Text is fed in chunks (typically the lines of a file) and each statement is yielded as
+    soon as its delimiter is seen. Comments are dropped, except version comments and
+    optimizer hints which are kept verbatim. Quoted strings, backtick identifiers, escaped
+    quotes and mysql client style DELIMITER changes are handled. Statements ending in ';'
+    keep their semicolon; custom delimiters (e.g. $$) are stripped. Chunks may split a token
+    anywhere: an incomplete one at the end of a chunk is carried over to the next.
+    """
+
+    def __init__(self, delimiter: str = ';'):
+        self.state = NORMAL
+        self.quote = ''
+        self.parts: List[str] = []
+        self.blank = True
+        self.escape_pending = False
+        self.carry = ''  # end of the previous chunk that may be the start of a token
+        self.set_delimiter(delimiter)
+
+    def set_delimiter(self, delimiter: str) -> None:
+        """Switch the statement delimiter, as done by the DELIMITER command."""
+        self.delimiter = delimiter
+        self.pattern = normal_pattern(delimiter)
+
+    def append(self, segment: str) -> None:
+        """Add a slice of statement text to the buffer."""
+        self.parts.append(segment)
+        if self.blank and not segment.isspace():
+            self.blank = False
+
+    def flush(self) -> str:
+        """Return the buffered statement (if any) and reset the buffer."""
+        statement = '' if self.blank else ''.join(self.parts).strip()
+        self.parts = []
+        self.blank = True
+        return statement
+
+    def partial_token(self, text: str) -> int:
+        """Length of the end of `text` that may be the start of a comment marker or the delimiter."""
+        for length in range(min(len(text), len(self.delimiter), 2), 0, -1):
+            tail = text[-length:]
+            if any(token.startswith(tail) for token in ('/*', '--', self.delimiter)):
+                return length
+        return 0
+
+    def feed(self, text: str, final: bool = False) -> Iterator[str]:
+        """Consume a chunk of SQL text and yield every statement it completes."""
+        text = self.carry + text
+        self.carry = ''
+        pos = 0
+        end = len(text)
+        if self.escape_pending and end:
+            # Backslash was the last character of the previous chunk
+            self.append(text[0])
+            self.escape_pending = False
+            pos = 1
+        while pos < end:
+            state = self.state
+            if state == NORMAL:
+                if self.blank:
+                    match = DELIMITER_RE.match(text, pos)
+                    if match and (final or match.group().endswith('\n')):
+                        self.parts = []
+                        self.set_delimiter(match.group(1))
+                        pos = match.end()
+                        continue
+                    if not final and not text[pos:].isspace() and DELIMITER_START_RE.match(text, pos):
+                        self.carry = text[pos:]
+                        break
+                match = self.pattern.search(text, pos)
+                if match is None:
+                    hold = 0 if final else self.partial_token(text[pos:])
+                    self.append(text[pos:end - hold])
+                    self.carry = text[end - hold:]
+                    break
+                start = match.start()
+                token = match.group()
+                if not final and ((token == '/*' and end - match.end() < 2) or (token == '--' and match.end() == end)):
+                    # Too close to the end of the chunk to tell what the token is
+                    self.append(text[pos:start])
+                    self.carry = text[start:]
+                    break
+                if start > pos:
+                    self.append(text[pos:start])
+                pos = match.end()
+                if token == self.delimiter:
+                    if token == ';':
+                        self.append(token)
+                    statement = self.flush()
+                    if statement:
+                        yield statement
+                elif token in QUOTE_PATTERNS:
+                    self.append(token)
+                    self.quote = token
+                    self.state = QUOTED
+                elif token == '/*':
+                    if text.startswith(KEPT_COMMENT_PREFIXES, pos):
+                        self.append(token)
+                        self.state = KEPT_COMMENT
+                    else:
+                        self.state = BLOCK_COMMENT
+                else:  # '--' or '#'
+                    self.state = LINE_COMMENT
+            elif state == QUOTED:
+                quote = self.quote
+                match = QUOTE_PATTERNS[quote].search(text, pos)
+                if match is None:
+                    self.append(text[pos:])
+                    break
+                stop = match.end()
+                if match.group() == '\\':
+                    if stop >= end:
+                        self.append(text[pos:])
+                        self.escape_pending = True
+                        break
+                    self.append(text[pos:stop + 1])
+                    pos = stop + 1
+                elif text.startswith(quote, stop):
+                    # Doubled quote is an escaped quote character
+                    self.append(text[pos:stop + 1])
+                    pos = stop + 1
+                else:
+                    self.append(text[pos:stop])
+                    self.state = NORMAL
+                    pos = stop
+            elif state == LINE_COMMENT:
+                newline = text.find('\n', pos)
+                if newline < 0:
+                    break
+                self.state = NORMAL
+                pos = newline
+            else:  # BLOCK_COMMENT or KEPT_COMMENT
+                close = text.find('*/', pos)
+                if close < 0:
+                    hold = 1 if not final and text.endswith('*') else 0
+                    if state == KEPT_COMMENT:
+                        self.append(text[pos:end - hold])
+                    self.carry = text[end - hold:]
+                    break
+                if state == KEPT_COMMENT:
+                    self.append(text[pos:close + 2])
+                else:
+                    self.append(' ')
+                self.state = NORMAL
+                pos = close + 2
+
+    def close(self) -> Iterator[str]:
+        """Yield the trailing statement that was not terminated by a delimiter."""
+        yield from self.feed('', final=True)
+        statement = self.flush()
+        if statement:
+            yield statement
+
+def iter_sql_statements(source: Union[str, Iterable[str]], delimiter: str = ';') -> Iterator[str]:
+    """
+    Lazily split SQL into statements in a single pass.
+    `source` is either a complete SQL string or an iterable of chunks such as an open file,
+    which is then read line by line so large scripts are never held in memory twice.
+    """
+    tokenizer = SQLTokenizer(delimiter)
+    if isinstance(source, str):
+        yield from tokenizer.feed(source)
+    else:
+        for chunk in source:
+            yield from tokenizer.feed(chunk)
+    yield from tokenizer.close()
+
+DIRECTIVE_RE = re.compile(r'^\s*--\s*migrator:\s*([a-z_-]+)(.*)$', re.IGNORECASE)
+
+def read_directives(lines: Iterable[str]) -> Dict[str, Dict[str, str]]:
+    """
+    Collect `-- migrator:<name> key=value ...` directives from a migration script.
+    Returns a mapping of directive name to its options (bare words map to '').
+    """
+    directives: Dict[str, Dict[str, str]] = {}
+    for line in lines:
+        match = DIRECTIVE_RE.match(line)
+        if not match:
+            continue
+        options = directives.setdefault(match.group(1).lower(), {})
+        for option in match.group(2).split():
+            key, _, value = option.partition('=')
+            options[key.lower()] = value
+    return directives
+
+def quote_identifier(name: str) -> str:
+    """Quote a table or column name with backticks."""
+    return '`' + name.replace('`', '``') + '`'
+
+IDENTIFIER_RE = re.compile(r'(?:`((?:[^`]|``)+)`|([^.`\s]+))\s*$')
+
+def unquote_identifier(name: str) -> str:
+    """Return the bare name of an identifier as written in SQL, dropping backticks and any schema prefix."""
+    match = IDENTIFIER_RE.search(name.strip())
+    if not match:
+        return name.strip()
+    return match.group(1).replace('``', '`') if match.group(1) is not None else match.group(2)
@@ -0,0 +1,473 @@
+import os
+import gzip
+import json
+import shutil
+import logging
+import tempfile
+import threading
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from mysql.connector import Error, connect
+from tokenizer import quote_identifier
+from output import RowWriter
+from db import run_statement
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+DEFERRED_INDEXES = 'deferred-indexes.json'
+FORMAT_VERSION = 1
+# Bookkeeping tables describe the target's own migration state and are never copied
+EXCLUDED_TABLES = {'migrations', 'migration_statements', 'migration_backfills'}
+BINARY_TYPES = {'binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob'}
+INTEGER_TYPES = {'tinyint', 'smallint', 'mediumint', 'int', 'bigint'}
+BARRIER_TIMEOUT = 60
+
+# Per-process state of pool workers
+worker_connection = None
+worker_error: Optional[Exception] = None
+
+def session_setup(connection) -> None:
+    """Use UTC so TIMESTAMP values round-trip unchanged between servers."""
+    cursor = connection.cursor()
+    cursor.execute("SET SESSION time_zone = '+00:00'")
+    cursor.close()
+
+def open_snapshot(connection) -> None:
+    """Start a consistent-snapshot transaction; taken under the read lock, every snapshot sees the same point."""
+    cursor = connection.cursor()
+    cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+    cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+    cursor.close()
+
+def init_export_worker(db_config: Dict, barrier) -> None:
+    """Open the worker's connection and join the shared snapshot before the read lock is released."""
+    global worker_connection, worker_error
+    try:
+        worker_connection = connect(**db_config)
+        session_setup(worker_connection)
+        open_snapshot(worker_connection)
+    except Error as e:
+        worker_error = e
+    try:
+        barrier.wait(BARRIER_TIMEOUT)
+    except threading.BrokenBarrierError:
+        pass
+
+def init_import_worker(db_config: Dict) -> None:
+    """Open the worker's connection with the bulk load session settings."""
+    global worker_connection, worker_error
+    try:
+        worker_connection = connect(**db_config, allow_local_infile=True, autocommit=True)
+        session_setup(worker_connection)
+        cursor = worker_connection.cursor()
+        cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        cursor.close()
+    except Error as e:
+        worker_error = e
+
+def export_chunk(task: Dict) -> Tuple[str, str, int]:
+    """Write one primary-key range of a table to a gzip TSV file; returns (table, file, rows)."""
+    if worker_error:
+        raise worker_error
+    select = ', '.join(
+        f"HEX({quote_identifier(c)})" if c in task['binary_columns'] else quote_identifier(c)
+        for c in task['columns']
+    )
+    conditions, params = [], []
+    if task['pk'] and task['range']:
+        conditions.append(f"{quote_identifier(task['pk'])} >= %s AND {quote_identifier(task['pk'])} < %s")
+        params.extend(task['range'])
+    if task['filter']:
+        conditions.append(f"({task['filter']})")
+        params.extend(task['filter_params'])
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = f" ORDER BY {quote_identifier(task['pk'])}" if task['pk'] else ""
+    cursor = worker_connection.cursor()
+    cursor.execute(f"SELECT {select} FROM {quote_identifier(task['table'])}{where}{order}", tuple(params))
+    path = Path(task['path'])
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as stream:
+        writer = RowWriter(stream, 'tsv', task['columns'])
+        while True:
+            rows = cursor.fetchmany(5000)
+            if not rows:
+                break
+            writer.write(rows)
+    cursor.close()
+    if writer.rows == 0:
+        path.unlink()
+    return task['table'], path.name, writer.rows
+
+def import_chunk(task: Dict) -> Tuple[str, int]:
+    """Load one chunk file with LOAD DATA LOCAL INFILE; returns (table, rows)."""
+    if worker_error:
+        raise worker_error
+    columns, assignments = [], []
+    for column in task['columns']:
+        if column in task['binary_columns']:
+            variable = f"@{len(assignments)}"
+            columns.append(variable)
+            assignments.append(f"{quote_identifier(column)} = UNHEX({variable})")
+        else:
+            columns.append(quote_identifier(column))
+    with tempfile.NamedTemporaryFile(suffix='.tsv', delete=False) as plain:
+        with gzip.open(task['path'], 'rb') as compressed:
+            shutil.copyfileobj(compressed, plain)
+    try:
+        cursor = worker_connection.cursor()
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s REPLACE INTO TABLE {quote_identifier(task['table'])} "
+            f"CHARACTER SET utf8mb4 IGNORE 1 LINES ({', '.join(columns)})"
+            + (f" SET {', '.join(assignments)}" if assignments else ""),
+            (plain.name,)
+        )
+        rows = max(cursor.rowcount, 0)
+        cursor.close()
+        return task['table'], rows
+    finally:
+        os.unlink(plain.name)
+
+class Schema:
+    """Tables, columns, primary keys and foreign keys of a database, read from information_schema."""
+
+    def __init__(self, connection, database: str):
+        self.connection = connection
+        self.database = database
+        self.columns: Dict[str, List[Tuple[str, str, bool]]] = {}  # name, data type, nullable
+        self.primary_keys: Dict[str, List[str]] = {}
+        self.foreign_keys: List[Dict] = []
+        self.load()
+
+    def query(self, sql: str) -> List[tuple]:
+        """Run an information_schema query for this database."""
+        return run_statement(self.connection, sql, (self.database,))
+
+    def load(self) -> None:
+        """Read the schema in three bulk queries."""
+        for table, column, data_type, nullable in self.query(
+            "SELECT c.TABLE_NAME, c.COLUMN_NAME, c.DATA_TYPE, c.IS_NULLABLE FROM information_schema.COLUMNS c "
+            "JOIN information_schema.TABLES t ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME "
+            "WHERE c.TABLE_SCHEMA = %s AND t.TABLE_TYPE = 'BASE TABLE' ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION"
+        ):
+            if table not in EXCLUDED_TABLES:
+                self.columns.setdefault(table, []).append((column, data_type.lower(), nullable == 'YES'))
+        for table, column in self.query(
+            "SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = %s AND INDEX_NAME = 'PRIMARY' ORDER BY TABLE_NAME, SEQ_IN_INDEX"
+        ):
+            self.primary_keys.setdefault(table, []).append(column)
+        keys: Dict[Tuple[str, str], Dict] = {}
+        for table, name, column, ref_table, ref_column in self.query(
+            "SELECT TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME "
+            "FROM information_schema.KEY_COLUMN_USAGE WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL "
+            "ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION"
+        ):
+            key = keys.setdefault((table, name), {'table': table, 'name': name, 'columns': [],
+                                                  'ref_table': ref_table, 'ref_columns': []})
+            key['columns'].append(column)
+            key['ref_columns'].append(ref_column)
+        self.foreign_keys = [k for k in keys.values() if k['table'] in self.columns and k['ref_table'] in self.columns]
+
+    def column_names(self, table: str) -> List[str]:
+        """Column names of a table in ordinal order."""
+        return [c[0] for c in self.columns[table]]
+
+    def binary_columns(self, table: str) -> List[str]:
+        """Columns exported as hex, since their bytes are not text."""
+        return [name for name, data_type, _ in self.columns[table] if data_type in BINARY_TYPES]
+
+    def chunk_key(self, table: str) -> Optional[str]:
+        """The leading primary key column used for range chunks, if it is an integer."""
+        pk = self.primary_keys.get(table, [])
+        types = {name: data_type for name, data_type, _ in self.columns[table]}
+        return pk[0] if pk and types.get(pk[0]) in INTEGER_TYPES else None
+
+    def levels(self) -> List[List[str]]:
+        """Group tables into foreign-key levels: each table only references tables of earlier levels."""
+        parents: Dict[str, Set[str]] = {t: set() for t in self.columns}
+        for fk in self.foreign_keys:
+            if fk['ref_table'] != fk['table']:
+                parents[fk['table']].add(fk['ref_table'])
+        levels, placed = [], set()
+        while len(placed) < len(parents):
+            level = sorted(t for t, refs in parents.items() if t not in placed and refs <= placed)
+            if not level:
+                cycle = sorted(t for t in parents if t not in placed)
+                logger.warning(f"Foreign key cycle between {', '.join(cycle)}; loading them together")
+                level = cycle
+            levels.append(level)
+            placed.update(level)
+        return levels
+
+    def community_filters(self, community_id: int) -> Dict[str, Tuple[str, List]]:
+        """
+        Row filters extracting one community: rows of the community itself, of tables with a
+        community_id (including global rows where it is NULL), the users taking part in it (plus
+        global admins) and, transitively, rows hanging off those through a foreign key. Tables
+        related to none of them are exported whole.
+        """
+        filters: Dict[str, Tuple[str, List]] = {'communities': ("`id` = %s", [community_id])}
+        for table in self.columns:
+            nullable = {name: is_null for name, _, is_null in self.columns[table]}
+            if table != 'communities' and 'community_id' in nullable:
+                if nullable['community_id']:
+                    filters[table] = ("(`community_id` = %s OR `community_id` IS NULL)", [community_id])
+                else:
+                    filters[table] = ("`community_id` = %s", [community_id])
+        if 'users' in self.columns:
+            members = [t for t in filters if t != 'communities' and 'user_id' in self.column_names(t)]
+            subquery = ' UNION '.join(f"SELECT `user_id` FROM {quote_identifier(t)} WHERE `community_id` = %s" for t in members)
+            users_filter = "`is_global_admin` = 1" if 'is_global_admin' in self.column_names('users') else "FALSE"
+            if members:
+                users_filter = f"`id` IN ({subquery}) OR {users_filter}"
+            filters['users'] = (users_filter, [community_id] * len(members))
+        for level in self.levels():
+            for table in level:
+                if table in filters:
+                    continue
+                nullable = {name: is_null for name, _, is_null in self.columns[table]}
+                candidates = [fk for fk in self.foreign_keys if fk['table'] == table and fk['ref_table'] in filters
+                              and len(fk['columns']) == 1 and fk['ref_table'] != table]
+                # Prefer a mandatory reference; it defines which rows belong to the subset
+                candidates.sort(key=lambda fk: nullable.get(fk['columns'][0], True))
+                if candidates:
+                    fk = candidates[0]
+                    parent_filter, parent_params = filters[fk['ref_table']]
+                    filters[table] = (
+                        f"{quote_identifier(fk['columns'][0])} IN (SELECT {quote_identifier(fk['ref_columns'][0])} "
+                        f"FROM {quote_identifier(fk['ref_table'])} WHERE {parent_filter})",
+                        list(parent_params)
+                    )
+        return filters
+
+class Exporter:
+    """Parallel, chunked export of every table to gzip-compressed TSV files plus a manifest."""
+
+    def __init__(self, db_config: Dict, directory: Path, jobs: int = 4, chunk_rows: int = 100000,
+                 community_id: Optional[int] = None):
+        self.db_config = db_config
+        self.directory = Path(directory)
+        self.jobs = max(1, jobs)
+        self.chunk_rows = max(1, chunk_rows)
+        self.community_id = community_id
+
+    def plan(self, connection, schema: Schema) -> List[Dict]:
+        """Split every table into primary-key range tasks, reading MIN/MAX on `connection`'s snapshot."""
+        filters = schema.community_filters(self.community_id) if self.community_id is not None else {}
+        tasks = []
+        for table in [t for level in schema.levels() for t in level]:
+            (self.directory / table).mkdir(parents=True, exist_ok=True)
+            pk = schema.chunk_key(table)
+            ranges: List[Optional[Tuple[int, int]]] = [None]
+            if pk:
+                low, high = run_statement(
+                    connection, f"SELECT MIN({quote_identifier(pk)}), MAX({quote_identifier(pk)}) FROM {quote_identifier(table)}"
+                )[0]
+                if low is None:
+                    continue
+                ranges = [(start, start + self.chunk_rows) for start in range(int(low), int(high) + 1, self.chunk_rows)]
+            filter_sql, filter_params = filters.get(table, (None, []))
+            for number, id_range in enumerate(ranges):
+                tasks.append({
+                    'table': table, 'columns': schema.column_names(table),
+                    'binary_columns': schema.binary_columns(table), 'pk': pk, 'range': id_range,
+                    'filter': filter_sql, 'filter_params': filter_params,
+                    'path': str(self.directory / table / f"{table}.{number:06d}.tsv.gz"),
+                })
+        return tasks
+
+    def run(self, schema_version: Optional[str] = None) -> Dict:
+        """Export all tables and write the manifest; returns it."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        connection = connect(**self.db_config)
+        consistent = True
+        try:
+            session_setup(connection)
+            schema = Schema(connection, self.db_config['database'])
+            cursor = connection.cursor()
+            try:
+                # Hold writes for the moment it takes every worker to open its snapshot
+                cursor.execute("FLUSH TABLES WITH READ LOCK")
+            except Error as e:
+                consistent = False
+                logger.warning(f"Could not take a global read lock ({e}); tables are exported from separate snapshots")
+            # The chunk ranges come from the same snapshot as the workers' reads, so rows
+            # deleted after the lock is released cannot shrink the planned ranges
+            open_snapshot(connection)
+            barrier = multiprocessing.Barrier(self.jobs + 1)
+            pool = multiprocessing.Pool(self.jobs, initializer=init_export_worker, initargs=(self.db_config, barrier))
+            try:
+                try:
+                    barrier.wait(BARRIER_TIMEOUT)
+                finally:
+                    if consistent:
+                        cursor.execute("UNLOCK TABLES")
+                    cursor.close()
+                tasks = self.plan(connection, schema)
+                connection.commit()
+                logger.info(f"Exporting {len(schema.columns)} tables in {len(tasks)} chunks with {self.jobs} workers")
+                counts: Dict[str, Dict[str, int]] = {}
+                for table, name, rows in pool.imap_unordered(export_chunk, tasks):
+                    if rows:
+                        counts.setdefault(table, {})[name] = rows
+                        logger.debug(f"Exported {rows} rows of {table} to {name}")
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+            manifest = {
+                'format': FORMAT_VERSION,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'database': self.db_config['database'],
+                'schema_version': schema_version,
+                'community_id': self.community_id,
+                'consistent': consistent,
+                'tables': [
+                    {
+                        'name': table, 'columns': schema.column_names(table),
+                        'binary_columns': schema.binary_columns(table),
+                        'chunks': [{'file': f"{table}/{name}", 'rows': rows} for name, rows in sorted(counts.get(table, {}).items())],
+                    }
+                    for level in schema.levels() for table in level
+                ],
+            }
+            (self.directory / MANIFEST).write_text(json.dumps(manifest, indent=2))
+            total = sum(c['rows'] for t in manifest['tables'] for c in t['chunks'])
+            logger.info(f"Exported {total} rows to {self.directory}")
+            return manifest
+        finally:
+            connection.close()
+
+class Importer:
+    """Loads an export in foreign-key order with deferred secondary indexes."""
+
+    def __init__(self, db_config: Dict, directory: Path, jobs: int = 4):
+        self.db_config = db_config
+        self.directory = Path(directory)
+        self.jobs = max(1, jobs)
+
+    def deferrable_indexes(self, connection, schema: Schema, table: str) -> List[Dict]:
+        """
+        Non-unique secondary indexes that can be dropped during the load. Unique keys stay (REPLACE
+        relies on them) and so does one index per foreign key, which InnoDB will not drop.
+        """
+        rows = run_statement(
+            connection,
+            "SELECT INDEX_NAME, NON_UNIQUE, INDEX_TYPE, COLUMN_NAME, SUB_PART FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+            (self.db_config['database'], table)
+        )
+        indexes: Dict[str, Dict] = {}
+        for name, non_unique, index_type, column, sub_part in rows:
+            index = indexes.setdefault(name, {'name': name, 'unique': not int(non_unique), 'type': index_type, 'columns': []})
+            index['columns'].append((column, sub_part))
+        kept: Set[str] = {name for name, index in indexes.items() if name == 'PRIMARY' or index['unique']}
+        for fk in [fk for fk in schema.foreign_keys if fk['table'] == table]:
+            covering = [name for name, index in sorted(indexes.items())
+                        if [c for c, _ in index['columns'][:len(fk['columns'])]] == fk['columns']]
+            if covering and not set(covering) & kept:
+                kept.add(covering[0])
+        return [index for name, index in sorted(indexes.items()) if name not in kept]
+
+    @staticmethod
+    def index_clause(index: Dict) -> str:
+        """Build the ADD INDEX clause recreating a deferred index."""
+        columns = ', '.join(quote_identifier(c) + (f"({int(sub)})" if sub else "") for c, sub in index['columns'])
+        kind = 'FULLTEXT INDEX' if index['type'] == 'FULLTEXT' else 'SPATIAL INDEX' if index['type'] == 'SPATIAL' else 'INDEX'
+        return f"ADD {kind} {quote_identifier(index['name'])} ({columns})"
+
+    def restore_indexes(self, connection, deferred: Dict[str, List[Dict]]) -> None:
+        """Recreate deferred indexes, one ALTER TABLE (one rebuild) per table."""
+        for table, indexes in deferred.items():
+            existing = {row[0] for row in run_statement(
+                connection,
+                "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+                (self.db_config['database'], table)
+            )}
+            missing = [index for index in indexes if index['name'] not in existing]
+            if missing:
+                logger.info(f"Building {len(missing)} secondary indexes on {table}")
+                run_statement(connection, f"ALTER TABLE {quote_identifier(table)} {', '.join(self.index_clause(i) for i in missing)}")
+        (self.directory / DEFERRED_INDEXES).unlink(missing_ok=True)
+
+    def repair_orphans(self, connection, schema: Schema) -> None:
+        """
+        After a community-filtered load, apply the foreign key rules by hand: references to rows
+        outside the subset are set to NULL where allowed, otherwise the referencing row is removed.
+        """
+        nullable = {(t, name): is_null for t, columns in schema.columns.items() for name, _, is_null in columns}
+        for level in schema.levels():
+            for fk in [fk for fk in schema.foreign_keys if fk['table'] in level and len(fk['columns']) == 1]:
+                child, parent = quote_identifier(fk['table']), quote_identifier(fk['ref_table'])
+                column, ref_column = quote_identifier(fk['columns'][0]), quote_identifier(fk['ref_columns'][0])
+                orphan = (f"c.{column} IS NOT NULL AND NOT EXISTS "
+                          f"(SELECT 1 FROM {parent} p WHERE p.{ref_column} = c.{column})")
+                if nullable.get((fk['table'], fk['columns'][0])):
+                    sql = f"UPDATE {child} c SET c.{column} = NULL WHERE {orphan}"
+                else:
+                    sql = f"DELETE c FROM {child} c WHERE {orphan}"
+                cursor = connection.cursor()
+                cursor.execute(sql)
+                if cursor.rowcount:
+                    logger.info(f"Fixed {cursor.rowcount} rows of {fk['table']} referencing {fk['ref_table']} outside the subset")
+                cursor.close()
+
+    def run(self, schema_version: Optional[str] = None, force: bool = False) -> None:
+        """Load the export into the current database."""
+        manifest = json.loads((self.directory / MANIFEST).read_text())
+        if manifest.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported export format {manifest.get('format')} in {self.directory}")
+        if manifest.get('schema_version') != schema_version and not force:
+            raise ValueError(
+                f"Export was taken at schema version {manifest.get('schema_version')} but the database is at "
+                f"{schema_version}; migrate to the same version first (or pass --ignore-warnings)"
+            )
+        connection = connect(**self.db_config, autocommit=True)
+        try:
+            session_setup(connection)
+            schema = Schema(connection, self.db_config['database'])
+            tables = [t for t in manifest['tables'] if t['name'] in schema.columns]
+            skipped = [t['name'] for t in manifest['tables'] if t['name'] not in schema.columns]
+            if skipped:
+                logger.warning(f"Tables missing from the target database are skipped: {', '.join(skipped)}")
+            deferred_path = self.directory / DEFERRED_INDEXES
+            deferred: Dict[str, List[Dict]] = json.loads(deferred_path.read_text()) if deferred_path.exists() else {}
+            if deferred:
+                logger.info("Restoring indexes deferred by an interrupted import")
+                self.restore_indexes(connection, deferred)
+            deferred = {}
+            for entry in tables:
+                indexes = self.deferrable_indexes(connection, schema, entry['name'])
+                if indexes and entry['chunks']:
+                    deferred[entry['name']] = indexes
+            # Record what is dropped first, so an interrupted import can put it back
+            deferred_path.write_text(json.dumps(deferred, indent=2))
+            for table, indexes in deferred.items():
+                run_statement(connection, f"ALTER TABLE {quote_identifier(table)} "
+                                         + ', '.join(f"DROP INDEX {quote_identifier(i['name'])}" for i in indexes))
+            levels = {t: i for i, level in enumerate(schema.levels()) for t in level}
+            by_level: Dict[int, List[Dict]] = {}
+            for entry in tables:
+                for chunk in entry['chunks']:
+                    by_level.setdefault(levels[entry['name']], []).append({
+                        'table': entry['name'], 'columns': entry['columns'],
+                        'binary_columns': entry['binary_columns'], 'path': str(self.directory / chunk['file']),
+                    })
+            loaded: Dict[str, int] = {}
+            with multiprocessing.Pool(self.jobs, initializer=init_import_worker, initargs=(self.db_config,)) as pool:
+                for level in sorted(by_level):
+                    # Parents are complete before any child of theirs starts loading
+                    for table, rows in pool.imap_unordered(import_chunk, by_level[level]):
+                        loaded[table] = loaded.get(table, 0) + rows
+                    logger.info("Loaded " + ', '.join(f"{t}={loaded.get(t, 0)}" for t in sorted({c['table'] for c in by_level[level]})))
+            self.restore_indexes(connection, deferred)
+            if manifest.get('community_id') is not None:
+                self.repair_orphans(connection, schema)
+            for entry in tables:
+                if entry['chunks']:
+                    run_statement(connection, f"ANALYZE TABLE {quote_identifier(entry['name'])}")
+            logger.info(f"Imported {sum(loaded.values())} rows into {len(loaded)} tables from {self.directory}")
+        finally:
+            connection.close()